@@ -1,54 +1,59 @@
-import pandas as pd
-import emoji
-import matplotlib.pyplot as plt
-from collections import Counter
-
-# Force the TkAgg backend (simplified for now)  2019-05-27 2019-11-23
-plt.switch_backend('TkAgg')
-
-# Function to extract all emojis from a text
-def extract_emojis(text):
-    text = str(text)  # Ensure text is a string
-    return [e['emoji'] for e in emoji.emoji_list(text)]
-
-# Read the filtered CSV file
-try:
-    filtered_df = pd.read_csv('filtered_file.csv', low_memory=False)  # Suppress DtypeWarning
-except FileNotFoundError:
-    print("Filtered file 'filtered_file.csv' not found.")
-    exit()
-
-# Initialize a counter for emojis
-emoji_counter = Counter()
-
-# Extract and count emojis from the 'text' column
-for text in filtered_df['text']:
-    emojis = extract_emojis(text)
-    emoji_counter.update(emojis)
-
-# Get the top 20 most common emojis
-top_20_emojis = emoji_counter.most_common(20)
-
-# Separate emojis and their counts for plotting
-emojis, counts = zip(*top_20_emojis)
-
-# Plot the data with numeric x-axis
-plt.figure(figsize=(12, 8))
-plt.bar(range(len(emojis)), counts, color='skyblue')
-plt.xlabel('Emoji Index')
-plt.ylabel('Count')
-plt.title('Top 20 Emojis in Filtered Tweets')
-
-# Set x-axis ticks to use numbers (1 to 20)
-plt.xticks(range(len(emojis)), range(1, len(emojis) + 1))
-
-# Avoid tight_layout to prevent rendering issues
-# plt.tight_layout()  # Keep commented out for now
-
-# Display the plot
-plt.show()
-
-# Print the mapping of indices to emojis and their counts
-print("Mapping of Emoji Indices to Emojis and Counts:")
-for i, (emoji_char, count) in enumerate(top_20_emojis, 1):
-    print(f"Index {i}: Emoji = {emoji_char}, Count = {count}")
\ No newline at end of file
+from datasets import Datasets
+from emoji_index import top_emojis
+from render import show_figure, use_gui_backend
+
+# Inputs this analysis reads from Datasets (loaded up front by pipeline.py)
+INPUTS = ['emoji_index']
+
+
+# Function to get the `n` most common emojis of the filtered tweets as (emoji, count) pairs
+def emoji_counts(data, n=20):
+    # Load the precomputed (tweet row, emoji id) index of the filtered CSV file
+    emoji_rows, emoji_ids, vocab = data.emoji_index()
+
+    # Get the top n most common emojis
+    top_ids, top_counts = top_emojis(emoji_ids, n)
+    return [(vocab[i], int(count)) for i, count in zip(top_ids, top_counts)]
+
+
+# Run the analysis on the shared inputs (loaded on demand when run on its own)
+def run(data=None):
+    data = data or Datasets()
+
+    try:
+        top_20_emojis = emoji_counts(data, 20)
+    except FileNotFoundError:
+        print("Filtered file 'filtered_file.csv' not found.")
+        return
+
+    # Separate emojis and their counts for plotting
+    emojis, counts = zip(*top_20_emojis)
+
+    # Plot the data with numeric x-axis (matplotlib is only imported to draw)
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 8))
+    plt.bar(range(len(emojis)), counts, color='skyblue')
+    plt.xlabel('Emoji Index')
+    plt.ylabel('Count')
+    plt.title('Top 20 Emojis in Filtered Tweets')
+
+    # Set x-axis ticks to use numbers (1 to 20)
+    plt.xticks(range(len(emojis)), range(1, len(emojis) + 1))
+
+    # Avoid tight_layout to prevent rendering issues
+    # plt.tight_layout()  # Keep commented out for now
+
+    # Display the plot (saved to a file in batch mode, see render.py)
+    show_figure('Emoji_Count')
+
+    # Print the mapping of indices to emojis and their counts
+    print("Mapping of Emoji Indices to Emojis and Counts:")
+    for i, (emoji_char, count) in enumerate(top_20_emojis, 1):
+        print(f"Index {i}: Emoji = {emoji_char}, Count = {count}")
+
+
+if __name__ == '__main__':
+    # Force the TkAgg backend for interactive runs (simplified for now)  2019-05-27 2019-11-23
+    use_gui_backend('TkAgg')
+    run()
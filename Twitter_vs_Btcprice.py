@@ -1,62 +1,109 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-
-# Step 1: Load the datasets
-try:
-    twitter_df = pd.read_csv('filtered_file.csv')
-except FileNotFoundError:
-    print("File 'twitter_data.csv' not found.")
-    exit()
-
-try:
-    btc_df = pd.read_csv('./BTC/BTC-2019min.csv')
-except FileNotFoundError:
-    print("File 'btc_data.csv' not found.")
-    exit()
-
-# Step 2: Convert date columns to datetime and filter by date range
-# Twitter data
-twitter_df['Date'] = pd.to_datetime(twitter_df['Date'])
-twitter_df = twitter_df[(twitter_df['Date'] >= '2019-05-27') & (twitter_df['Date'] <= '2019-11-23')]
-
-# BTC data
-btc_df['date'] = pd.to_datetime(btc_df['date'])
-btc_df = btc_df[(btc_df['date'] >= '2019-05-27') & (btc_df['date'] <= '2019-11-23')]
-
-# Step 3: Aggregate BTC data to daily level (average close price per day)
-btc_daily = btc_df.groupby(btc_df['date'].dt.date)['close'].mean().reset_index()
-btc_daily['date'] = pd.to_datetime(btc_daily['date'])
-
-# Step 4: Summarize Twitter sentiment per day
-# Count the number of Positive, Negative, etc. sentiments per day
-sentiment_counts = twitter_df.groupby(['Date', 'Sentiment']).size().unstack(fill_value=0).reset_index()
-sentiment_counts['Date'] = pd.to_datetime(sentiment_counts['Date'])
-
-# Step 5: Merge the BTC and Twitter data on date
-merged_df = pd.merge(btc_daily, sentiment_counts, left_on='date', right_on='Date', how='inner')
-
-# Step 6: Prepare data for plotting
-# Let's assume Sentiment has 'Positive' and 'Negative' values (adjust based on your data)
-# We'll calculate a simple sentiment score: (Positive - Negative) / Total
-if 'Positive' in merged_df.columns and 'Negative' in merged_df.columns:
-    merged_df['Total_Tweets'] = merged_df['Positive'] + merged_df['Negative']
-    # Avoid division by zero
-    merged_df['Sentiment_Score'] = (merged_df['Positive'] - merged_df['Negative']) / merged_df['Total_Tweets'].replace(0, 1)
-else:
-    # If you have different sentiment labels, adjust accordingly
-    print("Sentiment labels not as expected. Found columns:", merged_df.columns)
-    # For simplicity, let's use Positive tweet count as the "sentiment" if Negative isn't present
-    merged_df['Sentiment_Score'] = merged_df.get('Positive', 0)
-
-# Step 7: Plot the data
-plt.figure(figsize=(12, 6))
-plt.scatter(merged_df['Sentiment_Score'], merged_df['close'], color='blue', alpha=0.5)
-plt.title('Bitcoin Price vs Twitter Sentiment (2019-05-27 to 2019-11-23)', fontsize=16)
-plt.xlabel('Sentiment Score (Positive - Negative / Total Tweets)', fontsize=12)
-plt.ylabel('BTC Close Price (USD)', fontsize=12)
-plt.grid(True, linestyle='--', linewidth=0.5)
-plt.tight_layout()
-plt.show()
-
-# Optional: Print the merged data for inspection
-print(merged_df[['date', 'close', 'Sentiment_Score']])
\ No newline at end of file
+
+from datasets import Datasets
+from influencers import FOLLOWERS_COLUMN, influence_weights, weighted_daily_sentiment
+from render import show_figure
+
+# Inputs this analysis reads from Datasets (loaded up front by pipeline.py)
+INPUTS = ['rollup', 'btc_daily', 'emoji_cube', 'influence', 'authors']
+
+
+# Function to merge the average daily BTC close with the daily sentiment
+# counts of the rollup and score each day: (Positive - Negative) / (Positive + Negative)
+def sentiment_vs_close(sentiment_counts, btc_daily):
+    # Step 3: Use the average close price per day from the daily bars
+    btc_daily = btc_daily[['date', 'close_mean']].rename(columns={'close_mean': 'close'})
+
+    # Step 4: Summarize Twitter sentiment per day
+    # The rollup already holds the number of Positive, Neutral and Negative tweets per day
+    sentiment_counts = sentiment_counts[['Date', 'Positive', 'Neutral', 'Negative']]
+
+    # Step 5: Merge the BTC and Twitter data on date
+    merged_df = pd.merge(btc_daily, sentiment_counts, left_on='date', right_on='Date', how='inner')
+
+    # Step 6: Prepare data for plotting
+    # Let's assume Sentiment has 'Positive' and 'Negative' values (adjust based on your data)
+    # We'll calculate a simple sentiment score: (Positive - Negative) / Total
+    if 'Positive' in merged_df.columns and 'Negative' in merged_df.columns:
+        merged_df['Total_Tweets'] = merged_df['Positive'] + merged_df['Negative']
+        # Avoid division by zero
+        merged_df['Sentiment_Score'] = (merged_df['Positive'] - merged_df['Negative']) / merged_df['Total_Tweets'].replace(0, 1)
+    else:
+        # If you have different sentiment labels, adjust accordingly
+        print("Sentiment labels not as expected. Found columns:", merged_df.columns)
+        # For simplicity, let's use Positive tweet count as the "sentiment" if Negative isn't present
+        merged_df['Sentiment_Score'] = merged_df.get('Positive', 0)
+
+    return merged_df
+
+
+# Run the analysis on the shared inputs (loaded on demand when run on its own)
+def run(data=None):
+    data = data or Datasets()
+
+    # Step 1: Load the datasets
+    try:
+        sentiment_counts = data.rollup()  # Daily counts per sentiment, 2019-05-27 to 2019-11-23
+    except FileNotFoundError:
+        print("File 'twitter_data.csv' not found.")
+        return
+
+    try:
+        btc_daily = data.btc_daily()  # Daily bars built once from './BTC/BTC-2019min.csv'
+    except FileNotFoundError:
+        print("File 'btc_data.csv' not found.")
+        return
+
+    # Step 2: Both datasets are already limited to 2019-05-27 to 2019-11-23 and 'Date' is parsed
+
+    # Steps 3-6: Daily sentiment score next to the average daily close
+    merged_df = sentiment_vs_close(sentiment_counts, btc_daily)
+
+    # Step 7: Plot the data (matplotlib is only imported to draw)
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 6))
+    plt.scatter(merged_df['Sentiment_Score'], merged_df['close'], color='blue', alpha=0.5)
+    plt.title('Bitcoin Price vs Twitter Sentiment (2019-05-27 to 2019-11-23)', fontsize=16)
+    plt.xlabel('Sentiment Score (Positive - Negative / Total Tweets)', fontsize=12)
+    plt.ylabel('BTC Close Price (USD)', fontsize=12)
+    plt.grid(True, linestyle='--', linewidth=0.5)
+    plt.tight_layout()
+    show_figure('Twitter_vs_Btcprice')
+
+    # Optional: Print the merged data for inspection
+    print(merged_df[['date', 'close', 'Sentiment_Score']])
+
+    # Step 8: Correlate the daily use of the top emojis with the price, straight from the emoji cube
+    close = merged_df.set_index('date')['close']
+    try:
+        cube = data.emoji_cube()
+    except FileNotFoundError:
+        return
+    top = cube.top_k(5, data.start, data.end)['emoji']
+    daily_emojis = cube.daily_counts(top, data.start, data.end)
+    print("Correlation of daily top-emoji counts with the BTC close price:")
+    print(daily_emojis.reindex(close.index).corrwith(close))
+
+    # Step 9: Correlate influence-weighted sentiment with the price: all tweets
+    # weighted by log(1 + followers), then only the tweets of the 20 authors
+    # with the most followers (their rows come from the author index)
+    tweets = data.influence()
+    if FOLLOWERS_COLUMN not in tweets.columns:
+        return
+    weighted = weighted_daily_sentiment(tweets, influence_weights(tweets, 'followers')).set_index('Date')
+    print("Correlation of influence-weighted daily sentiment with the BTC close price:",
+          round(weighted['Weighted_Score'].reindex(close.index).corr(close), 4))
+    try:
+        authors = data.authors()
+    except ValueError:
+        return
+    top_rows = authors.rows_of(authors.top(20, 'followers'))
+    top_tweets = tweets[tweets['row_id'].isin(top_rows)]
+    top_daily = weighted_daily_sentiment(top_tweets, influence_weights(top_tweets, 'followers')).set_index('Date')
+    print("Correlation of the top 20 influencers' daily sentiment with the BTC close price:",
+          round(top_daily['Weighted_Score'].reindex(close.index).corr(close), 4))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,269 @@
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+from synthetic_data import make_dataset
+
+# Function to delete cached artifacts (all of them when no name is given)
+def clear_cache(*names):
+    from cache_utils import CACHE_DIR
+    if not names:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        return
+    for name in names:
+        path = os.path.join(CACHE_DIR, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+# Benchmark cases as (name, rows processed, setup, run). `setup` brings the
+# working directory into the state the case starts from (e.g. a cold cache)
+# and is not timed.
+def benchmark_cases(n_tweets, n_minutes, workers):
+    from btc_bars import load_btc_bars, load_btc_minutes
+    from calendar_buckets import BUCKETS, sentiment_breakdown
+    from emoji_cube import load_emoji_cube
+    from emoji_index import load_emoji_index, top_emojis
+    from emoji_sentiment import sentiment_contingency
+    from filter import run_filter
+    from sentiment_rollup import load_hourly_rollup, load_rollup
+    from tweet_store import load_tweets
+
+    def filtered_rows():
+        return len(load_tweets(['row_id']))
+
+    def contingency():
+        rows, ids, vocab = load_emoji_index()
+        return sentiment_contingency(rows, ids, load_tweets(['Sentiment'])['Sentiment'], len(vocab))
+
+    def cube_queries():
+        cube = load_emoji_cube()
+        for emoji_char in cube.top_k(20, '2019-05-27', '2019-11-23')['emoji']:
+            cube.series(emoji_char)
+            cube.by_sentiment(emoji_char, '2019-05-27', '2019-11-23')
+
+    def calendar_breakdowns():
+        for by in BUCKETS:
+            sentiment_breakdown(load_hourly_rollup() if by == 'hour' else load_rollup(), by)
+
+    def merge_daily():
+        rollup = load_rollup()
+        bars = load_btc_bars('1D')[['date', 'close_mean']]
+        vcrix = pd.read_csv('./BTCVCRIX/2024-01-27 vcrix.csv', parse_dates=['date'])
+        merged = pd.merge(bars, rollup, left_on='date', right_on='Date', how='inner')
+        return pd.merge(merged, vcrix, on='date', how='inner')
+
+    return [
+        ('filter_serial', lambda: n_tweets, lambda: None,
+         lambda: run_filter('Bitcointweets.csv', 'filtered_file.csv', workers=1, engine='python')),
+        ('filter_arrow', lambda: n_tweets, lambda: None,
+         lambda: run_filter('Bitcointweets.csv', 'filtered_file.csv', workers=1, engine='arrow')),
+        (f'filter_parallel_{workers}', lambda: n_tweets, lambda: None,
+         lambda: run_filter('Bitcointweets.csv', 'filtered_file.csv', workers=workers, engine='python')),
+        ('tweet_store_build', filtered_rows, lambda: clear_cache(),
+         lambda: load_tweets(['Date'])),
+        ('tweet_store_load', filtered_rows, lambda: load_tweets(['Date']),
+         lambda: load_tweets(['Date', 'Sentiment'])),
+        ('emoji_index_build', filtered_rows, lambda: (load_tweets(['Date']), clear_cache(
+            'filtered_file.emoji_index.npy', 'filtered_file.emoji_vocab.json', 'filtered_file.emoji_index.meta.json')),
+         load_emoji_index),
+        ('emoji_top20', filtered_rows, load_emoji_index,
+         lambda: top_emojis(load_emoji_index()[1], 20)),
+        ('emoji_sentiment_contingency', filtered_rows, load_emoji_index, contingency),
+        ('emoji_cube_build', filtered_rows, lambda: (load_emoji_index(), clear_cache(
+            'filtered_file.emoji_cube.npz', 'filtered_file.emoji_cube.meta.json')), load_emoji_cube),
+        ('emoji_cube_queries', filtered_rows, load_emoji_cube, cube_queries),
+        ('daily_rollup_build', filtered_rows, lambda: clear_cache('filtered_file.rollup.parquet',
+                                                                  'filtered_file.rollup.meta.json'),
+         load_rollup),
+        ('calendar_breakdowns', filtered_rows, lambda: (load_rollup(), load_hourly_rollup()), calendar_breakdowns),
+        ('btc_daily_bars_build', lambda: n_minutes, lambda: clear_cache('BTC-2019min.bars_1D.parquet',
+                                                                        'BTC-2019min.bars_1D.meta.json'),
+         lambda: load_btc_bars('1D')),
+        ('btc_minute_store_build', lambda: n_minutes, lambda: clear_cache('BTC-2019min.minutes',
+                                                                          'BTC-2019min.minutes.meta.json'),
+         lambda: load_btc_minutes(columns=['close'], start='2019-05-27', end='2019-11-23')),
+        ('merge_daily', lambda: n_minutes, lambda: (load_rollup(), load_btc_bars('1D')), merge_daily),
+    ]
+
+# Time one case, then (optionally) run it again under tracemalloc for its peak
+# allocation; tracemalloc slows Python code down, so it never affects the timing
+def measure(name, rows, setup, run, memory=True):
+    with redirect_stdout(io.StringIO()):
+        setup()
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+
+        peak_mb = None
+        if memory:
+            setup()
+            tracemalloc.start()
+            run()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+    n = rows()
+    return {'case': name, 'rows': n, 'seconds': round(seconds, 4),
+            'rows_per_sec': round(n / seconds) if seconds > 0 else None,
+            'peak_mb': None if peak_mb is None else round(peak_mb, 1)}
+
+# Libraries too heavy to import by accident, checked after every startup probe
+HEAVY_MODULES = ['pandas', 'matplotlib', 'emoji', 'scipy']
+
+# Startup budget of each entry point as (code run at startup, heavy libraries
+# it may import, milliseconds allowed on top of importing those libraries).
+# Data modules need pandas; matplotlib is only imported to draw and the
+# `emoji` package is replaced by emoji_table.py, so no entry point imports them.
+STARTUP_BUDGETS = {
+    'pipeline.py': ('import pipeline', [], 100),
+    'render.py': ('import render', [], 50),
+    'instrument.py': ('import instrument', [], 50),
+    'live.py': ('import live', [], 150),
+    'emoji_table': ('import emoji_table; emoji_table.emoji_table()', [], 60),
+    'datasets.py': ('import datasets', ['pandas'], 200),
+    'filter.py': ('import filter', ['pandas'], 100),
+    'twitter.py': ('import twitter', ['pandas'], 100),
+    'sentiment_rollup.py': ('import sentiment_rollup', ['pandas'], 100),
+    'emoji_cube.py': ('import emoji_cube', ['pandas'], 100),
+    'calendar_buckets.py': ('import calendar_buckets', ['pandas'], 100),
+    'lag_scan.py': ('import lag_scan', ['pandas'], 250),
+    'btcChart.py': ('import btcChart', ['pandas'], 250),
+    'BTC_VCRI.py': ('import BTC_VCRI', ['pandas'], 250),
+    'Emoji_Count.py': ('import Emoji_Count', ['pandas'], 250),
+    'MostFrq_baseoneSentiment.py': ('import MostFrq_baseoneSentiment', ['pandas'], 250),
+    'sentiment_momentum.py': ('import sentiment_momentum', ['pandas'], 250),
+    'Twitter_vs_Btcprice.py': ('import Twitter_vs_Btcprice', ['pandas'], 250),
+    'VolumeBTCVCRIX.py': ('import VolumeBTCVCRIX', ['pandas'], 250),
+    'weekdaysorweekends.py': ('import weekdaysorweekends', ['pandas'], 250),
+}
+
+# Function to time `code` in a fresh interpreter started from this directory,
+# after importing the `preload` libraries outside the timed part. Returns the
+# median of `repeat` runs in seconds and the heavy libraries loaded.
+def probe_startup(code, repeat=5, preload=()):
+    probe = (f"import sys, time\n{''.join(f'import {m}; ' for m in preload)}\nstart = time.perf_counter()\n{code}\n"
+             f"print(time.perf_counter() - start, *[m for m in {HEAVY_MODULES!r} if m in sys.modules])")
+    here = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', probe], cwd=here, capture_output=True, text=True, check=True)
+        seconds, *loaded = out.stdout.split()
+        timings.append(float(seconds))
+    return statistics.median(timings), loaded
+
+# Measure the startup of every entry point against its budget: its own time
+# with the heavy libraries it may use already imported (timed in the same
+# interpreter, so no noisy difference of two runs), and any heavy library it
+# should not import
+def measure_startup(budgets=STARTUP_BUDGETS, repeat=7):
+    results = []
+    for name, (code, allowed, budget_ms) in budgets.items():
+        seconds, loaded = probe_startup(code, repeat)
+        own_ms = max(probe_startup(code, repeat, preload=allowed)[0] * 1000, 0)
+        unexpected = [m for m in loaded if m not in allowed]
+        results.append({'entry_point': name, 'ms': round(seconds * 1000, 1), 'own_ms': round(own_ms, 1),
+                        'budget_ms': budget_ms, 'loaded': loaded, 'unexpected': unexpected,
+                        'ok': own_ms <= budget_ms and not unexpected})
+        print(f"{name:32} {seconds * 1000:8.0f} ms {own_ms:8.0f} ms own (budget {budget_ms:4} ms)"
+              f"  {'ok' if results[-1]['ok'] else 'OVER BUDGET'}"
+              f"{'  imports ' + ', '.join(unexpected) if unexpected else ''}")
+    return results
+
+# Generate a dataset of each size and run every case on it
+def run_benchmarks(sizes, minutes, work_dir, seed=0, workers=None, memory=True, only=None):
+    workers = workers or max(os.cpu_count(), 2)
+    results = []
+    home = os.getcwd()
+    for size in sizes:
+        data_dir = os.path.join(work_dir, f'tweets_{size}')
+        if not os.path.exists(os.path.join(data_dir, 'Bitcointweets.csv')):
+            make_dataset(data_dir, tweets=size, minutes=minutes, seed=seed)
+        os.chdir(data_dir)
+        try:
+            for name, rows, setup, run in benchmark_cases(size, minutes, workers):
+                if only and not any(name.startswith(prefix) for prefix in only):
+                    continue
+                result = measure(name, rows, setup, run, memory)
+                result['size'] = size
+                results.append(result)
+                print(f"{size:>12,} {name:32} {result['seconds']:9.3f}s {result['rows_per_sec'] or 0:>14,} rows/s"
+                      f" {result['peak_mb'] if result['peak_mb'] is not None else '-':>8} MB")
+        finally:
+            os.chdir(home)
+    return results
+
+# Function to describe the machine and library versions the results come from
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+# Function to list the cases that got slower than the baseline by more than `tolerance`
+def find_regressions(results, baseline, tolerance):
+    previous = {(r['size'], r['case']): r['seconds'] for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['size'], result['case']))
+        if before and result['seconds'] > before * (1 + tolerance):
+            regressions.append((result['size'], result['case'], before, result['seconds']))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000],
+                        help="Raw tweet counts to benchmark (10k to 100M)")
+    parser.add_argument('--minutes', type=int, default=525_600, help="BTC minutes in every dataset")
+    parser.add_argument('--work-dir', default='bench_data', help="Where the synthetic datasets are kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=0, help="Workers for the parallel filter (0 = CPUs)")
+    parser.add_argument('--cases', nargs='+', help="Only run cases whose name starts with one of these")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--out', default='bench_results.json', help="Machine-readable results")
+    parser.add_argument('--compare', help="Earlier results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown vs --compare")
+    parser.add_argument('--startup', action='store_true',
+                        help="Only check the startup time of every entry point against its budget")
+    args = parser.parse_args()
+
+    if args.startup:
+        results = measure_startup()
+        with open(args.out, 'w') as f:
+            json.dump({'environment': environment(), 'startup': results}, f, indent=2)
+        print(f"Results saved to '{args.out}'.")
+        sys.exit(0 if all(result['ok'] for result in results) else 1)
+
+    work_dir = os.path.abspath(args.work_dir)
+    results = run_benchmarks(args.sizes, args.minutes, work_dir, args.seed, args.workers,
+                             not args.no_memory, args.cases)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    with open(args.out, 'w') as f:
+        json.dump({'environment': environment(), 'max_rss_mb': round(max_rss, 1), 'results': results}, f, indent=2)
+    print(f"Results saved to '{args.out}'.")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for size, case, before, after in regressions:
+            print(f"REGRESSION {case} at {size:,} rows: {before:.3f}s -> {after:.3f}s")
+        if regressions:
+            sys.exit(1)
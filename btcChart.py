@@ -1,40 +1,56 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-
-# Step 1: Load the dataset
-# Assuming your dataset is in a CSV file named 'btc_data.csv'
-try:
-    df = pd.read_csv('./BTC/BTC-2019min.csv')
-except FileNotFoundError:
-    print("File 'btc_data.csv' not found. Please ensure the file exists in the correct directory.")
-    exit()
-
-# Step 2: Convert the 'date' column to datetime format
-df['date'] = pd.to_datetime(df['date'])
-
-# Step 3: Plot the data
-plt.figure(figsize=(12, 6))
-plt.plot(df['date'], df['close'], label='Close Price', color='blue')
-
-# Step 4: Format the plot
-plt.title('BTC/USD Close Price Over Time', fontsize=16)
-plt.xlabel('Time', fontsize=12)
-plt.ylabel('Price (USD)', fontsize=12)
-
-# Format the x-axis to show dates nicely
-plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d %H:%M'))
-plt.gca().xaxis.set_major_locator(mdates.AutoDateLocator())  # Automatically adjust the date ticks
-plt.xticks(rotation=45)
-
-# Add a grid for better readability
-plt.grid(True, which='both', linestyle='--', linewidth=0.5)
-
-# Add a legend
-plt.legend()
-
-# Adjust layout to prevent label cutoff
-plt.tight_layout()
-
-# Display the plot
-plt.show()
\ No newline at end of file
+from datasets import Datasets
+from decimate import plot_decimated
+from render import show_figure
+
+# Inputs this analysis reads from Datasets (loaded up front by pipeline.py)
+INPUTS = ['btc_close_levels']
+
+
+# Run the analysis on the shared inputs (loaded on demand when run on its own)
+def run(data=None):
+    data = data or Datasets()
+
+    # Step 1: Load the dataset
+    # Assuming your dataset is in a CSV file named 'btc_data.csv'
+    try:
+        # Min/max levels of every minute close, precomputed once from the minute store
+        levels = data.btc_close_levels()
+    except FileNotFoundError:
+        print("File 'btc_data.csv' not found. Please ensure the file exists in the correct directory.")
+        return
+
+    # Step 2: Plot the data, decimated to the first, last, lowest and highest close of
+    # each pixel column (the line covers the same pixels as one through every minute;
+    # zooming in an interactive window redraws it with minute detail; matplotlib
+    # is only imported to draw)
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    plt.figure(figsize=(12, 6))
+    plot_decimated(plt.gca(), levels, label='Close Price', color='blue')
+
+    # Step 3: Format the plot
+    plt.title('BTC/USD Close Price Over Time', fontsize=16)
+    plt.xlabel('Time', fontsize=12)
+    plt.ylabel('Price (USD)', fontsize=12)
+
+    # Format the x-axis to show dates nicely
+    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d %H:%M'))
+    plt.gca().xaxis.set_major_locator(mdates.AutoDateLocator())  # Automatically adjust the date ticks
+    plt.xticks(rotation=45)
+
+    # Add a grid for better readability
+    plt.grid(True, which='both', linestyle='--', linewidth=0.5)
+
+    # Add a legend
+    plt.legend()
+
+    # Adjust layout to prevent label cutoff
+    plt.tight_layout()
+
+    # Display the plot (saved to a file in batch mode, see render.py)
+    show_figure('btcChart')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,220 @@
+import os
+from functools import partial
+
+import pandas as pd
+
+from cache_utils import cache_path, is_fresh, source_name, tmp_path, write_meta
+from decimate import SeriesLevels
+from instrument import traced
+from partitions import finish_partitions, read_range, start_partitions, write_partitions
+from shards import is_sharded, list_shards, map_shards
+
+# Default location of the minute-level BTC/USD file
+BTC_CSV = './BTC/BTC-2019min.csv'
+
+# Explicit dtypes so the parser never has to infer them chunk by chunk
+BTC_DTYPES = {
+    'unix': 'int64',
+    'date': 'str',
+    'symbol': 'category',
+    'open': 'float64',
+    'high': 'float64',
+    'low': 'float64',
+    'close': 'float64',
+    'Volume BTC': 'float64',
+    'Volume USD': 'float64',
+}
+BTC_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# How each bar column is aggregated, from minute rows and from partial bars
+MINUTE_AGGREGATIONS = {
+    'first_ts': ('date', 'first'),
+    'last_ts': ('date', 'last'),
+    'open': ('open', 'first'),
+    'high': ('high', 'max'),
+    'low': ('low', 'min'),
+    'close': ('close', 'last'),
+    'volume_btc': ('Volume BTC', 'sum'),
+    'volume_usd': ('Volume USD', 'sum'),
+    'close_sum': ('close', 'sum'),
+    'minutes': ('close', 'size'),
+}
+
+# Function to parse the minute timestamps with the fixed format, or from the
+# 'unix' column (seconds or milliseconds) when there is no 'date' column
+def parse_minute_dates(chunk):
+    if 'date' in chunk.columns:
+        return pd.to_datetime(chunk['date'], format=BTC_DATE_FORMAT)
+    unix = chunk['unix']
+    unit = 'ms' if unix.abs().max() > 10**11 else 's'
+    return pd.to_datetime(unix, unit=unit)
+
+# Read the minute file in chunks with explicit dtypes. Only `columns` (plus the
+# timestamp) are parsed; each chunk comes back with 'date' as datetime64.
+def read_btc_minutes(path=BTC_CSV, columns=None, chunksize=500_000):
+    header = pd.read_csv(path, nrows=0).columns
+    if 'date' not in header and 'unix' not in header:
+        raise ValueError(f"Neither 'date' nor 'unix' column found in '{path}'.")
+
+    usecols = list(header) if columns is None else [c for c in header if c in columns or c in ('date', 'unix')]
+    if 'date' in usecols and 'unix' in usecols and columns is not None and 'unix' not in columns:
+        usecols.remove('unix')
+    dtype = {c: t for c, t in BTC_DTYPES.items() if c in usecols}
+
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize):
+        chunk['date'] = parse_minute_dates(chunk)
+        yield chunk
+
+# Function to get the paths of the partitioned minute store and its metadata
+def minutes_paths(path):
+    name = source_name(path)
+    return cache_path(f'{name}.minutes'), cache_path(f'{name}.minutes.meta.json')
+
+# Function to stream the minute file into one Parquet file per month and chunk
+@traced('btc:build_minute_store')
+def build_minute_store(path=BTC_CSV, chunksize=500_000):
+    store, meta = minutes_paths(path)
+    tmp_dir = start_partitions(store, 'date', freq='M')
+    rows = 0
+    for part, chunk in enumerate(read_btc_minutes(path, chunksize=chunksize)):
+        write_partitions(chunk, tmp_dir, part)
+        rows += len(chunk)
+    finish_partitions(tmp_dir, store)
+    write_meta(meta, path, rows=rows)
+
+# Function to check whether the minute store of a file is up to date
+def minutes_fresh(path):
+    store, meta = minutes_paths(path)
+    return os.path.isdir(store) and is_fresh(meta, path)
+
+# Load the minute rows with start <= date <= end (either may be None), sorted
+# by time, with 'date' plus the requested columns. Only the monthly partitions
+# overlapping the range are read once the minute store has been built. For a
+# directory or glob of shards (see shards.py) the stores of new shards are
+# built in parallel and the rows of all shards are returned together.
+def load_btc_minutes(path=BTC_CSV, columns=None, start=None, end=None):
+    if is_sharded(path):
+        parts = map_shards(partial(load_btc_minutes, columns=columns, start=start, end=end), list_shards(path),
+                           fresh=minutes_fresh)
+        df = pd.concat([part for part in parts if len(part)] or parts[:1], ignore_index=True)
+        return df.sort_values('date', kind='stable').reset_index(drop=True)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File '{path}' not found.")
+    columns = None if columns is None else ['date'] + [c for c in columns if c != 'date']
+
+    try:
+        import pyarrow  # noqa: F401  (needed by pandas for Parquet)
+    except ImportError:
+        df = pd.concat(read_btc_minutes(path, columns), ignore_index=True)
+        if start is not None:
+            df = df[df['date'] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df['date'] <= pd.Timestamp(end)]
+        return df.sort_values('date', kind='stable').reset_index(drop=True)
+
+    if not minutes_fresh(path):
+        build_minute_store(path)
+    return read_range(minutes_paths(path)[0], start, end, columns, sort_by='date')
+
+# Function to aggregate one chunk of minute rows into partial OHLCV bars.
+# The file can be in any order, so open/close are taken by timestamp.
+def partial_bars(chunk, freq):
+    chunk = chunk.sort_values('date')
+    aggregations = {name: agg for name, agg in MINUTE_AGGREGATIONS.items() if agg[0] in chunk.columns}
+    return chunk.groupby(chunk['date'].dt.floor(freq)).agg(**aggregations)
+
+# Function to merge partial bars that may overlap in time (e.g. a day split
+# across two chunks). Combining is associative, so partials can come from any
+# chunking or from different files.
+def combine_bars(partials):
+    bars = pd.concat(partials).sort_values('first_ts')
+    grouped = bars.groupby(level=0)
+    combined = grouped.agg(first_ts=('first_ts', 'min'), last_ts=('last_ts', 'max'), open=('open', 'first'),
+                           high=('high', 'max'), low=('low', 'min'))
+    combined['close'] = bars.sort_values('last_ts').groupby(level=0)['close'].last()
+    for col in ['volume_btc', 'volume_usd', 'close_sum', 'minutes']:
+        if col in bars.columns:
+            combined[col] = grouped[col].sum()
+    combined['close_mean'] = combined['close_sum'] / combined['minutes']
+    combined.index.name = 'date'
+    return combined
+
+# Build bars for every frequency in `freqs` (e.g. '1D', '1h', '15min') in a
+# single pass over the minute file. Memory is bounded by the chunk size plus
+# the bars themselves.
+@traced('btc:build_bars')
+def build_bars(path=BTC_CSV, freqs=('1D',), chunksize=500_000):
+    partials = {freq: [] for freq in freqs}
+    columns = ['open', 'high', 'low', 'close', 'Volume BTC', 'Volume USD']
+    for chunk in read_btc_minutes(path, columns, chunksize):
+        for freq in freqs:
+            partials[freq].append(partial_bars(chunk, freq))
+    return {freq: combine_bars(parts) for freq, parts in partials.items()}
+
+# Function to get the paths of the saved bars and their metadata
+def bars_paths(path, freq):
+    name = source_name(path)
+    return cache_path(f'{name}.bars_{freq}.parquet'), cache_path(f'{name}.bars_{freq}.meta.json')
+
+# Function to check whether the saved bars of a file are up to date
+def bars_fresh(path, freq):
+    bars_file, meta = bars_paths(path, freq)
+    return os.path.exists(bars_file) and is_fresh(meta, path)
+
+# Load OHLCV bars at `freq` with 'date' as a column, optionally limited to bars
+# starting within [start, end]. 'close_mean' is the average minute close of the
+# bar, which is what the daily charts plot. Bars are saved under cache/ so later
+# runs skip the minute file until it changes. The bars of a directory or glob
+# of shards are combined from the saved bars of each shard, so a bar split
+# across two shards comes out the same as from one file.
+def load_btc_bars(freq='1D', path=BTC_CSV, start=None, end=None):
+    bars_file, meta = bars_paths(path, freq)
+    if is_sharded(path):
+        parts = map_shards(partial(load_btc_bars, freq), list_shards(path), fresh=lambda shard: bars_fresh(shard, freq))
+        bars = combine_bars([part.set_index('date') for part in parts]).reset_index()
+    elif not os.path.exists(path):
+        raise FileNotFoundError(f"File '{path}' not found.")
+    elif bars_fresh(path, freq):
+        bars = pd.read_parquet(bars_file)
+    else:
+        bars = build_bars(path, (freq,))[freq].reset_index()
+        tmp = tmp_path(bars_file)
+        bars.to_parquet(tmp, index=False)
+        os.replace(tmp, bars_file)
+        write_meta(meta, path, freq=freq, bars=len(bars))
+
+    if start is not None:
+        bars = bars[bars['date'] >= pd.Timestamp(start)]
+    if end is not None:
+        bars = bars[bars['date'] <= pd.Timestamp(end)]
+    return bars.reset_index(drop=True)
+
+# Function to get the paths of the saved plot levels of a column and their metadata
+def levels_paths(path, column):
+    name = source_name(path)
+    column = column.replace(' ', '_')
+    return cache_path(f'{name}.levels_{column}.npz'), cache_path(f'{name}.levels_{column}.meta.json')
+
+# Function to check whether the saved plot levels of a column are up to date
+def levels_fresh(path, column):
+    levels_file, meta = levels_paths(path, column)
+    return os.path.exists(levels_file) and is_fresh(meta, path)
+
+# Load the precomputed min/max plot levels of one minute column (see
+# decimate.SeriesLevels), built from the minute store on first use. The levels
+# of a directory or glob of shards are joined from the levels of each shard.
+def load_btc_levels(column='close', path=BTC_CSV):
+    if is_sharded(path):
+        return SeriesLevels.concat(map_shards(partial(load_btc_levels, column), list_shards(path),
+                                              fresh=lambda shard: levels_fresh(shard, column)))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File '{path}' not found.")
+
+    levels_file, meta = levels_paths(path, column)
+    if levels_fresh(path, column):
+        return SeriesLevels.load(levels_file)
+    minutes = load_btc_minutes(path, [column])
+    levels = SeriesLevels.build(minutes['date'].to_numpy(), minutes[column].to_numpy())
+    levels.save(levels_file)
+    write_meta(meta, path, column=column, levels=len(levels.levels))
+    return levels
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+
+# All derived data (columnar stores, indexes, rollups) lives here
+CACHE_DIR = 'cache'
+
+# Compression extensions dropped from a source's name (pandas infers the
+# compression of a CSV from them)
+COMPRESSION_EXTENSIONS = ('.gz', '.zst', '.bz2', '.xz', '.zip')
+
+# Function to get the name the cached artifacts of a source file are saved
+# under: its file name without the extension ('tweets.csv.gz' -> 'tweets')
+def source_name(source):
+    name = os.path.basename(source)
+    if name.endswith(COMPRESSION_EXTENSIONS):
+        name = os.path.splitext(name)[0]
+    return os.path.splitext(name)[0]
+
+# Function to build the path of a cached artifact, creating the cache directory if needed
+def cache_path(name, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, name)
+
+# Function to get a temporary path next to `path` that is unique to this
+# process, so concurrent builds of the same artifact never share a file
+def tmp_path(path):
+    return f'{path}.{os.getpid()}.tmp'
+
+# Function to hash a file's content in 1 MB blocks
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to describe the current version of a source file
+def fingerprint(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': file_hash(path)}
+
+# Function to record which version of `source` a cached artifact was built from
+def write_meta(meta_path, source, **extra):
+    meta = {'source': os.path.abspath(source), 'fingerprint': fingerprint(source)}
+    meta.update(extra)
+    write_json(meta_path, meta)
+
+# Function to write a JSON file atomically
+def write_json(path, data):
+    tmp = tmp_path(path)
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+# Function to read the metadata of a cached artifact (None if it was never built)
+def read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+# Returns True when the artifact described by `meta_path` was built from the
+# current version of `source`. The cheap size/mtime check is tried first; the
+# content hash is only computed when the mtime moved (e.g. the file was copied
+# or touched), and the stored mtime is refreshed if the content is unchanged.
+def is_fresh(meta_path, source):
+    meta = read_meta(meta_path)
+    if meta is None or meta.get('source') != os.path.abspath(source):
+        return False
+
+    stat = os.stat(source)
+    stored = meta['fingerprint']
+    if stat.st_size != stored['size']:
+        return False
+    if stat.st_mtime_ns == stored['mtime_ns']:
+        return True
+
+    if file_hash(source) != stored['hash']:
+        return False
+    stored['mtime_ns'] = stat.st_mtime_ns
+    write_json(meta_path, meta)
+    return True
@@ -0,0 +1,155 @@
+import argparse
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Calendar breakdowns the module knows, and the labels of their buckets
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
+               'October', 'November', 'December']
+BUCKETS = {
+    'dayofweek': DAY_NAMES,
+    'weekend': ['Weekday', 'Weekend'],
+    'hour': list(range(24)),
+    'month': MONTH_NAMES,
+    'holiday': ['Regular', 'Holiday'],
+}
+
+# Bootstrap resamples and confidence level of the intervals
+N_BOOT = 1000
+CONFIDENCE = 0.95
+
+# Resampled values held in memory at once (resamples x rows x columns)
+BOOT_CELLS = 4_000_000
+
+# Function to get the holidays between start and end: 'us' for the US federal
+# holidays, or the path of a file with one date per line
+@lru_cache(maxsize=32)
+def holiday_dates(holidays='us', start='2000-01-01', end='2100-12-31'):
+    if holidays == 'us':
+        from pandas.tseries.holiday import USFederalHolidayCalendar
+        return USFederalHolidayCalendar().holidays(start, end)
+    with open(holidays) as f:
+        return pd.DatetimeIndex(pd.to_datetime([line.strip() for line in f if line.strip()])).normalize()
+
+# Function to label each date with its bucket: (bucket codes, bucket labels).
+# Everything is computed on the whole index at once.
+def bucket_codes(dates, by, holidays='us'):
+    dates = pd.DatetimeIndex(dates)
+    if by == 'dayofweek':
+        codes = dates.dayofweek
+    elif by == 'weekend':
+        codes = dates.dayofweek >= 5
+    elif by == 'hour':
+        codes = dates.hour
+    elif by == 'month':
+        codes = dates.month - 1
+    elif by == 'holiday':
+        days = dates.normalize()
+        codes = days.isin(holiday_dates(holidays, days.min(), days.max()) if len(days) else [])
+    else:
+        raise ValueError(f"Unknown calendar bucket '{by}'. Choose from {', '.join(BUCKETS)}.")
+    return np.asarray(codes, dtype=np.int64), BUCKETS[by]
+
+# Ratios sum(numerator) / sum(denominator) per bucket, with percentile
+# bootstrap intervals. The rows (days or hours of a rollup) are resampled with
+# replacement within each bucket, so the intervals account for rows being
+# correlated inside. All `n_boot` resamples are drawn and summed as arrays.
+# `numerators` may hold several columns (rows x m) sharing one denominator.
+# Returns (ratios, low, high, rows per bucket); ratios are buckets x m.
+def bucket_ratios(codes, numerators, denominators, n_buckets, n_boot=N_BOOT, confidence=CONFIDENCE, seed=0):
+    numerators = np.asarray(numerators, dtype=float).reshape(len(codes), -1)
+    denominators = np.asarray(denominators, dtype=float)
+    sizes = np.bincount(codes, minlength=n_buckets)
+    totals = np.zeros((n_buckets, numerators.shape[1]))
+    np.add.at(totals, codes, numerators)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratios = totals / np.bincount(codes, weights=denominators, minlength=n_buckets)[:, None]
+
+    low, high = np.full_like(ratios, np.nan), np.full_like(ratios, np.nan)
+    if n_boot and len(codes):
+        # Rows sorted by bucket: slot j of bucket b is resampled from the rows of b
+        order = np.argsort(codes, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        slot_bucket = codes[order]
+        present = np.flatnonzero(sizes)
+        rng = np.random.default_rng(seed)
+        boot = []
+        step = max(1, BOOT_CELLS // (len(codes) * numerators.shape[1]))  # Resamples drawn at a time
+        for first in range(0, n_boot, step):
+            draws = rng.random((min(step, n_boot - first), len(codes)))
+            picks = order[starts[slot_bucket] + (draws * sizes[slot_bucket]).astype(np.int64)]
+            boot_den = np.add.reduceat(denominators[picks], starts[present], axis=1)
+            boot_num = np.add.reduceat(numerators[picks], starts[present], axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                boot.append(boot_num / boot_den[:, :, None])
+        tail = (1 - confidence) / 2 * 100
+        low[present], high[present] = np.percentile(np.concatenate(boot), [tail, 100 - tail], axis=0)
+    return ratios, low, high, sizes
+
+# Function to drop the buckets without rows from a per-bucket frame
+def present_buckets(frame):
+    return frame[frame['Rows'] > 0]
+
+# Mean sentiment score per calendar bucket from a rollup (daily, or hourly for
+# by='hour'): sum of scores over tweets, as if averaged tweet by tweet, next to
+# the share of each sentiment, the tweet and row counts and a bootstrap
+# interval of the score.
+def sentiment_breakdown(rollup, by, n_boot=N_BOOT, confidence=CONFIDENCE, holidays='us', seed=0):
+    codes, labels = bucket_codes(rollup['Date'], by, holidays)
+    columns = ['Score_Sum', 'Positive', 'Neutral', 'Negative']
+    ratios, low, high, sizes = bucket_ratios(codes, rollup[columns].to_numpy(), rollup['Total'].to_numpy(),
+                                             len(labels), n_boot, confidence, seed)
+    breakdown = pd.DataFrame({
+        'Score': ratios[:, 0], 'CI_Low': low[:, 0], 'CI_High': high[:, 0],
+        'Positive_Share': ratios[:, 1], 'Neutral_Share': ratios[:, 2], 'Negative_Share': ratios[:, 3],
+        'Tweets': np.bincount(codes, weights=rollup['Total'].to_numpy(), minlength=len(labels)).astype(np.int64),
+        'Rows': sizes,
+    }, index=pd.Index(labels, name=by))
+    return present_buckets(breakdown)
+
+# Share of all emoji uses per calendar bucket for each of `emojis`, from the
+# emoji cube between start and end, with bootstrap intervals (resampling days)
+def emoji_breakdown(cube, emojis, by, start=None, end=None, n_boot=N_BOOT, confidence=CONFIDENCE, holidays='us',
+                    seed=0):
+    if by == 'hour':
+        raise ValueError("The emoji cube counts days; an hour-of-day breakdown needs tweet times.")
+    emojis = list(emojis)
+    counts = cube.daily_counts(emojis, start, end)
+    uses = cube.by_sentiment(None, start, end).sum(axis=1)
+    codes, labels = bucket_codes(counts.index, by, holidays)
+    ratios, low, high, sizes = bucket_ratios(codes, counts.to_numpy(), uses.to_numpy(), len(labels), n_boot,
+                                             confidence, seed)
+    index = pd.Index(labels, name=by)
+    share = pd.DataFrame(ratios, index=index, columns=emojis)
+    breakdown = pd.concat({'Share': share, 'CI_Low': pd.DataFrame(low, index=index, columns=emojis),
+                           'CI_High': pd.DataFrame(high, index=index, columns=emojis)}, axis=1)
+    return breakdown[sizes > 0]
+
+
+if __name__ == '__main__':
+    from emoji_cube import load_emoji_cube
+    from sentiment_rollup import load_hourly_rollup, load_rollup
+
+    parser = argparse.ArgumentParser(description='Sentiment and emoji use by calendar bucket.')
+    parser.add_argument('by', choices=list(BUCKETS))
+    parser.add_argument('--start', default='2019-05-27')
+    parser.add_argument('--end', default='2019-11-23')
+    parser.add_argument('--emojis', type=int, default=5, help='top emojis to break down (0 = none)')
+    parser.add_argument('--boot', type=int, default=N_BOOT, help='bootstrap resamples (0 = no intervals)')
+    parser.add_argument('--holidays', default='us', help="'us' or a file with one date per line")
+    args = parser.parse_args()
+
+    try:
+        load = load_hourly_rollup if args.by == 'hour' else load_rollup
+        rollup = load(start=args.start, end=args.end)
+    except FileNotFoundError as e:
+        print(e)
+        exit()
+    print(sentiment_breakdown(rollup, args.by, args.boot, holidays=args.holidays).to_string())
+    if args.emojis and args.by != 'hour':
+        cube = load_emoji_cube()
+        top = cube.top_k(args.emojis, args.start, args.end)['emoji']
+        print(emoji_breakdown(cube, top, args.by, args.start, args.end, args.boot, holidays=args.holidays)
+              .to_string())
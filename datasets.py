@@ -0,0 +1,124 @@
+import time
+
+import pandas as pd
+
+from btc_bars import BTC_CSV, load_btc_bars, load_btc_levels, load_btc_minutes
+from emoji_cube import load_emoji_cube
+from emoji_index import load_emoji_index
+from influencers import available_influence_columns, load_author_index
+from instrument import count_rows, span
+from onchain import load_onchain
+from sentiment_rollup import load_rollup
+from shards import is_sharded, list_shards
+from tweet_store import TWEETS_CSV, load_tweets
+
+# Default location of the daily VCRIX file
+VCRIX_CSV = './BTCVCRIX/2024-01-27 vcrix.csv'
+
+# Date range studied by the analyses
+STUDY_START = '2019-05-27'
+STUDY_END = '2019-11-23'
+
+# Function to read the daily VCRIX file, or every file of a directory or glob
+# of shards (the later file wins when two cover the same day)
+def read_vcrix(source=VCRIX_CSV):
+    if not is_sharded(source):
+        return pd.read_csv(source)
+    df = pd.concat([pd.read_csv(path) for path in list_shards(source)], ignore_index=True)
+    if 'date' in df.columns:
+        df = df.drop_duplicates('date', keep='last').sort_values('date', kind='stable').reset_index(drop=True)
+    return df
+
+# Shared inputs of the analysis stages. Each input is loaded the first time a
+# stage asks for it and the same object is handed to every later stage, so
+# stages must copy a frame before modifying it. Each source may be one file or
+# a directory or glob of shards, e.g. one file per year (see shards.py).
+class Datasets:
+    def __init__(self, start=STUDY_START, end=STUDY_END, tweets_csv=TWEETS_CSV, btc_csv=BTC_CSV, vcrix_csv=VCRIX_CSV):
+        self.start = start
+        self.end = end
+        self.tweets_csv = tweets_csv
+        self.btc_csv = btc_csv
+        self.vcrix_csv = vcrix_csv
+        self.load_times = {}
+        self._loaded = {}
+
+    # Function to load an input once and remember how long it took
+    def _get(self, name, loader):
+        if name not in self._loaded:
+            start = time.perf_counter()
+            with span(f'load:{name}') as s:
+                self._loaded[name] = loader()
+                s.rows = count_rows(self._loaded[name])
+            self.load_times[name] = time.perf_counter() - start
+        return self._loaded[name]
+
+    # Filtered tweets in the date range: 'row_id', 'Date' and 'Sentiment'
+    def tweets(self):
+        return self._get('tweets', lambda: load_tweets(['row_id', 'Date', 'Sentiment'], self.tweets_csv,
+                                                       start=self.start, end=self.end))
+
+    # Filtered tweets in the date range with the author and follower/engagement
+    # columns the source has (see influence_columns.INFLUENCE_COLUMNS) next to
+    # 'row_id', 'Date' and 'Sentiment'
+    def influence(self):
+        return self._get('influence', lambda: load_tweets(
+            ['row_id', 'Date', 'Sentiment'] + available_influence_columns(self.tweets_csv), self.tweets_csv,
+            start=self.start, end=self.end))
+
+    # The same columns for every filtered tweet up to the end of the date range,
+    # so an EMA over them carries over from earlier days like the rollup's
+    def influence_history(self):
+        return self._get('influence_history', lambda: load_tweets(
+            ['row_id', 'Date', 'Sentiment'] + available_influence_columns(self.tweets_csv), self.tweets_csv,
+            end=self.end))
+
+    # Per-author index of every filtered tweet (ValueError without an author column)
+    def authors(self):
+        return self._get('authors', lambda: load_author_index(self.tweets_csv))
+
+    # (rows, emoji_ids, vocab) of every filtered tweet
+    def emoji_index(self):
+        return self._get('emoji_index', lambda: load_emoji_index(self.tweets_csv))
+
+    # Emoji x day x sentiment counts of every filtered tweet (slice it with start/end)
+    def emoji_cube(self):
+        return self._get('emoji_cube', lambda: load_emoji_cube(self.tweets_csv))
+
+    # Daily sentiment rollup in the date range
+    def rollup(self):
+        return self._get('rollup', lambda: load_rollup(self.tweets_csv, start=self.start, end=self.end))
+
+    # Daily BTC bars in the date range
+    def btc_daily(self):
+        return self._get('btc_daily', lambda: load_btc_bars('1D', self.btc_csv, start=self.start, end=self.end))
+
+    # BTC minutes in the date range with 'close' and 'Volume BTC'
+    def btc_minutes(self):
+        return self._get('btc_minutes', lambda: load_btc_minutes(self.btc_csv, ['close', 'Volume BTC'],
+                                                                 start=self.start, end=self.end))
+
+    # Every BTC minute close in the file
+    def btc_minutes_all(self):
+        return self._get('btc_minutes_all', lambda: load_btc_minutes(self.btc_csv, ['close']))
+
+    # Min/max plot levels of every BTC minute close, for decimated minute charts
+    def btc_close_levels(self):
+        return self._get('btc_close_levels', lambda: load_btc_levels('close', self.btc_csv))
+
+    # The raw daily VCRIX file (its shards joined)
+    def vcrix(self):
+        return self._get('vcrix', lambda: read_vcrix(self.vcrix_csv))
+
+    # Daily on-chain metrics in the date range from $ONCHAIN_SOURCE (None when unset)
+    def onchain(self):
+        return self._get('onchain', lambda: load_onchain(self.start, self.end))
+
+    # Function to load the given inputs up front. Failures are left for the
+    # stages that need the input, which report them in their own way.
+    def preload(self, names):
+        for name in names:
+            try:
+                getattr(self, name)()
+            except (FileNotFoundError, ValueError):
+                pass
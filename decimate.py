@@ -0,0 +1,211 @@
+import os
+
+import numpy as np
+
+from cache_utils import tmp_path
+from render import SAVE_DPI
+
+# Ratio of the bucket widths of two consecutive precomputed levels
+LEVEL_FACTOR = 16
+
+# Buckets per screen pixel when decimating for a plot: more than one keeps the
+# extremes inside each pixel column in place
+BUCKETS_PER_PIXEL = 4
+
+# Function to turn timestamps (or plain numbers) into int64/float arrays the
+# bucketing can work on, remembering the dtype to turn them back
+def as_numbers(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64), 'datetime64[ns]'
+    return x.astype(float), None
+
+# Function to turn numbers from as_numbers back into the original values
+def from_numbers(x, dtype):
+    return x.astype(dtype) if dtype is not None else x
+
+# Indices of the points to keep when every bucket is drawn as one pixel
+# column: the first, last, lowest and highest point of each bucket (M4). The
+# line through them covers exactly the pixels the line through all points
+# covers. `bucket` holds each point's bucket id and must not decrease.
+def minmax_indices(bucket, y):
+    n = len(y)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    lengths = np.diff(np.r_[starts, n])
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    keep = [starts, starts + lengths - 1]
+    for extreme in (np.fmin.reduceat(y, starts), np.fmax.reduceat(y, starts)):
+        hits = np.flatnonzero(y == extreme[segment])
+        keep.append(hits[np.r_[True, segment[hits][1:] != segment[hits][:-1]]])  # First hit per bucket
+    return np.unique(np.concatenate(keep))
+
+# Min/max decimation of a sorted series into `n_buckets` equal-width buckets
+# between its first and last x. Returns the kept (x, y).
+def minmax_decimate(x, y, n_buckets):
+    xs, dtype = as_numbers(x)
+    y = np.asarray(y, dtype=float)
+    if len(xs) <= 4 * n_buckets:
+        return np.asarray(x), y
+    span = max(xs[-1] - xs[0], 1)
+    bucket = ((xs - xs[0]) * (n_buckets / span)).astype(np.int64)
+    keep = minmax_indices(bucket, y)
+    return from_numbers(xs[keep], dtype), y[keep]
+
+# Largest-Triangle-Three-Buckets downsampling of a sorted series to `n_out`
+# points: keeps the first and last point and, from each bucket in between,
+# the point forming the largest triangle with the point kept before it and
+# the mean of the next bucket. Smoother than min/max for line shapes, but
+# may drop single-point spikes.
+def lttb(x, y, n_out):
+    xs, dtype = as_numbers(x)
+    y = np.asarray(y, dtype=float)
+    n = len(xs)
+    if n_out >= n or n_out < 3:
+        return np.asarray(x), y
+    xf = (xs - xs[0]).astype(float)  # Relative x keeps float precision for timestamps
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = xf[hi:next_hi].mean(), y[hi:next_hi].mean()
+        a = keep[i]
+        area = np.abs((xf[a] - next_x) * (y[lo:hi] - y[a]) - (xf[a] - xf[lo:hi]) * (next_y - y[a]))
+        keep[i + 1] = lo + int(np.argmax(area))
+    return from_numbers(xs[keep], dtype), y[keep]
+
+# Function to decimate a series for a plot `pixels` wide ('minmax' or 'lttb')
+def decimate(x, y, pixels, method='minmax'):
+    if method == 'lttb':
+        return lttb(x, y, int(pixels) * BUCKETS_PER_PIXEL)
+    if method == 'minmax':
+        return minmax_decimate(x, y, int(pixels) * BUCKETS_PER_PIXEL)
+    raise ValueError(f"Unknown decimation method '{method}'.")
+
+
+# A sorted series with precomputed min/max levels: level k keeps the M4 points
+# of buckets LEVEL_FACTOR**k times as wide as the typical step (level 0 is the
+# series itself). Buckets are aligned to multiples of their width, so every
+# bucket of a level is a union of buckets of the level below, and the M4
+# points of a level can be built from the level below instead of the raw data.
+# A plot of any range reads the coarsest level that is still finer than its
+# pixels, so the work depends on the plot width, not on the series length.
+class SeriesLevels:
+    def __init__(self, levels, dtype=None):
+        self.levels = levels  # [(bucket width, x, y)], finest first
+        self.dtype = dtype
+
+    @classmethod
+    def build(cls, x, y, min_points=4096):
+        xs, dtype = as_numbers(x)
+        y = np.asarray(y, dtype=float)
+        step = np.median(np.diff(xs)) if len(xs) > 1 else 1
+        levels = [(0, xs, y)]
+        width = step * LEVEL_FACTOR
+        while len(levels[-1][1]) > min_points:
+            _, lx, ly = levels[-1]
+            keep = minmax_indices((lx // width).astype(np.int64), ly)
+            levels.append((width, lx[keep], ly[keep]))
+            width *= LEVEL_FACTOR
+        return cls(levels, dtype)
+
+    # Function to join the levels of consecutive parts of one series (e.g. the
+    # shards of a file). Level k keeps the level-k points of every part, or the
+    # coarsest level of a part that has fewer; both include the min/max of
+    # every level-k bucket, so the joined series draws like one built whole.
+    @classmethod
+    def concat(cls, parts):
+        levels = []
+        for k in range(max(len(part.levels) for part in parts)):
+            chosen = [part.levels[min(k, len(part.levels) - 1)] for part in parts]
+            x = np.concatenate([lx for _, lx, _ in chosen])
+            y = np.concatenate([ly for _, _, ly in chosen])
+            order = np.argsort(x, kind='stable')
+            levels.append((max(width for width, _, _ in chosen), x[order], y[order]))
+        return cls(levels, parts[0].dtype)
+
+    # Function to turn a bound (a timestamp for time series) into the stored numbers
+    def _number(self, value):
+        if self.dtype is None:
+            return float(value)
+        return np.datetime64(value, 'ns').astype(np.int64)
+
+    # Function to get the points of one level between start and end, plus
+    # the nearest point on either side so the line runs to the plot edges
+    def _range(self, level, start, end):
+        _, x, y = self.levels[level]
+        lo = max(np.searchsorted(x, start, side='left') - 1, 0)
+        hi = min(np.searchsorted(x, end, side='right') + 1, len(x))
+        return x[lo:hi], y[lo:hi]
+
+    # Decimated (x, y) of start <= x <= end (None = the whole series) for a
+    # plot `pixels` wide
+    def select(self, pixels, start=None, end=None):
+        x = self.levels[0][1]
+        start = (x[0] if len(x) else 0) if start is None else self._number(start)
+        end = (x[-1] if len(x) else 0) if end is None else self._number(end)
+        n_buckets = int(pixels) * BUCKETS_PER_PIXEL
+        bucket_width = max(end - start, 1) / n_buckets
+
+        # The coarsest level whose buckets still fit several times in one output bucket
+        level = 0
+        while level + 1 < len(self.levels) and self.levels[level + 1][0] * 4 <= bucket_width:
+            level += 1
+        x, y = self._range(level, start, end)
+        if len(x) > 4 * n_buckets:
+            keep = minmax_indices(((x - start) // bucket_width).astype(np.int64), y)
+            x, y = x[keep], y[keep]
+        return from_numbers(x, self.dtype), y
+
+    # Function to save the levels as one .npz file, atomically
+    def save(self, path):
+        arrays = {'dtype': np.array(self.dtype or '')}
+        for k, (width, x, y) in enumerate(self.levels):
+            arrays[f'width_{k}'], arrays[f'x_{k}'], arrays[f'y_{k}'] = np.array(width), x, y
+        tmp = tmp_path(path)
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            count = sum(1 for name in f.files if name.startswith('width_'))
+            levels = [(f[f'width_{k}'].item(), f[f'x_{k}'], f[f'y_{k}']) for k in range(count)]
+            return cls(levels, str(f['dtype']) or None)
+
+
+# Function to get the width in pixels of an axes' plotting area, on screen or
+# in a saved file, whichever has more pixels
+def axes_pixels(ax):
+    fig = ax.get_figure()
+    inches = ax.get_position().width * fig.get_figwidth()
+    return max(int(inches * max(fig.dpi, SAVE_DPI)), 1)
+
+# Function to turn matplotlib x-limits into values of the series' type
+def limits_to_values(ax, levels):
+    import matplotlib.dates as mdates
+
+    lo, hi = ax.get_xlim()
+    if levels.dtype is None:
+        return lo, hi
+    return tuple(np.datetime64(mdates.num2date(v).replace(tzinfo=None), 'ns') for v in (lo, hi))
+
+# Plot a series decimated to the axes' pixel width. The line is redrawn from
+# the precomputed levels whenever the x-limits change (zooming or panning in
+# an interactive window), so it always shows minute detail where it fits.
+# `series` is a SeriesLevels or an (x, y) pair. Returns the line.
+def plot_decimated(ax, series, **kwargs):
+    levels = series if isinstance(series, SeriesLevels) else SeriesLevels.build(*series)
+    x, y = levels.select(axes_pixels(ax))
+    line, = ax.plot(x, y, **kwargs)
+
+    def redraw(ax):
+        x, y = levels.select(axes_pixels(ax), *limits_to_values(ax, levels))
+        line.set_data(x, y)
+
+    ax.callbacks.connect('xlim_changed', redraw)
+    return line
@@ -0,0 +1,235 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import cache_path, file_hash, is_fresh, read_meta, source_name, tmp_path, write_json, write_meta
+from emoji_index import extract_emojis, load_emoji_index
+from shards import combine_shards, is_sharded, list_shards, map_shards
+from tweet_store import TWEETS_CSV, load_tweets
+
+# Sentiment labels listed first in the cube; any other labels follow in sorted
+# order, and tweets without a label are counted under MISSING_LABEL
+SENTIMENT_LABELS = ['Positive', 'Neutral', 'Negative']
+MISSING_LABEL = 'Other'
+
+# Function to get the paths of the saved cube and its metadata
+def cube_paths(source=TWEETS_CSV):
+    name = source_name(source)
+    return cache_path(f'{name}.emoji_cube.npz'), cache_path(f'{name}.emoji_cube.meta.json')
+
+# Function to get the labels of a set of per-tweet sentiments in cube order
+def cube_labels(sentiments):
+    found = set(sentiments.astype(object).fillna(MISSING_LABEL).unique())
+    return SENTIMENT_LABELS + sorted(found - set(SENTIMENT_LABELS))
+
+
+# Emoji x day x sentiment counts of emoji uses (one per (tweet, emoji) pair, so
+# a tweet with an emoji twice counts twice), kept sparse: one entry per (day,
+# emoji, label) that occurs, sorted by day, then emoji, then label. A day's entries
+# are one contiguous slice, so any date window is a slice; per-emoji lookups
+# use a second ordering by emoji that is built on first use.
+class EmojiCube:
+    def __init__(self, days, vocab, labels, day, emoji, label, count):
+        self.days = pd.DatetimeIndex(days)
+        self.vocab = list(vocab)
+        self.labels = list(labels)
+        self.day = np.asarray(day, dtype=np.int32)
+        self.emoji = np.asarray(emoji, dtype=np.int32)
+        self.label = np.asarray(label, dtype=np.int8)
+        self.count = np.asarray(count, dtype=np.int64)
+        self.day_ptr = np.searchsorted(self.day, np.arange(len(self.days) + 1))
+        self._emoji_ids = {emoji_char: i for i, emoji_char in enumerate(self.vocab)}
+        self._by_emoji = None
+
+    # Function to build a cube from per-pair day, emoji and label codes
+    @classmethod
+    def from_codes(cls, days, vocab, labels, day, emoji, label, weights=None):
+        n_emojis, n_labels = len(vocab), len(labels)
+        keys = (np.asarray(day, dtype=np.int64) * n_emojis + emoji) * n_labels + label
+        keys, inverse = np.unique(keys, return_inverse=True)
+        count = np.bincount(inverse, weights=weights, minlength=len(keys)).astype(np.int64)
+        return cls(days, vocab, labels, keys // (n_emojis * n_labels), keys // n_labels % n_emojis,
+                   keys % n_labels, count)
+
+    # Function to add another cube's counts (new days, emojis and labels are appended)
+    def merge(self, other):
+        days = self.days.union(other.days)
+        vocab = self.vocab + [e for e in other.vocab if e not in self._emoji_ids]
+        labels = self.labels + [l for l in other.labels if l not in self.labels]
+        emoji_map = {e: i for i, e in enumerate(vocab)}
+
+        def codes(cube):
+            return (days.get_indexer(cube.days)[cube.day],
+                    np.array([emoji_map[e] for e in cube.vocab], dtype=np.int64)[cube.emoji],
+                    np.array([labels.index(l) for l in cube.labels], dtype=np.int64)[cube.label])
+
+        parts = [codes(self), codes(other)]
+        return EmojiCube.from_codes(days, vocab, labels, *[np.concatenate(c) for c in zip(*parts)],
+                                    weights=np.concatenate([self.count, other.count]))
+
+    # Function to get the entry slice and day range of start <= day <= end
+    def _window(self, start=None, end=None):
+        lo = 0 if start is None else self.days.searchsorted(pd.Timestamp(start))
+        hi = len(self.days) if end is None else self.days.searchsorted(pd.Timestamp(end), side='right')
+        return slice(self.day_ptr[lo], self.day_ptr[hi]), lo, hi
+
+    # Function to get the entries of one emoji (sorted by day), in the window
+    def _emoji_entries(self, emoji_char, start=None, end=None):
+        if self._by_emoji is None:
+            self._by_emoji = np.argsort(self.emoji, kind='stable')
+            self._emoji_ptr = np.searchsorted(self.emoji[self._by_emoji], np.arange(len(self.vocab) + 1))
+        e = self._emoji_ids.get(emoji_char)
+        if e is None:
+            return np.empty(0, dtype=np.int64)
+        entries = self._by_emoji[self._emoji_ptr[e]:self._emoji_ptr[e + 1]]
+        _, lo, hi = self._window(start, end)
+        days = self.day[entries]
+        return entries[(days >= lo) & (days < hi)]
+
+    # Function to get the label code of a sentiment (None = all labels)
+    def _label_code(self, label):
+        return None if label is None else self.labels.index(label)
+
+    # Total count of every emoji id in the window, for one label or all of them
+    def totals(self, start=None, end=None, label=None):
+        window, _, _ = self._window(start, end)
+        emoji, count = self.emoji[window], self.count[window]
+        if label is not None:
+            keep = self.label[window] == self._label_code(label)
+            emoji, count = emoji[keep], count[keep]
+        return np.bincount(emoji, weights=count, minlength=len(self.vocab)).astype(np.int64)
+
+    # The `k` most used emojis in the window as a frame of 'emoji' and 'count'.
+    # Ties are broken by first appearance, like Counter.most_common().
+    def top_k(self, k, start=None, end=None, label=None):
+        totals = self.totals(start, end, label)
+        order = np.argsort(-totals, kind='stable')[:k]
+        order = order[totals[order] > 0]
+        return pd.DataFrame({'emoji': [self.vocab[i] for i in order], 'count': totals[order]})
+
+    # Daily count series of one emoji in the window (0 on days without it)
+    def series(self, emoji_char, start=None, end=None, label=None):
+        entries = self._emoji_entries(emoji_char, start, end)
+        if label is not None:
+            entries = entries[self.label[entries] == self._label_code(label)]
+        _, lo, hi = self._window(start, end)
+        counts = np.bincount(self.day[entries] - lo, weights=self.count[entries], minlength=hi - lo)
+        return pd.Series(counts.astype(np.int64), index=self.days[lo:hi], name=emoji_char)
+
+    # Daily counts per sentiment of one emoji (or of all emojis) in the window
+    def by_sentiment(self, emoji_char=None, start=None, end=None):
+        if emoji_char is None:
+            window, lo, hi = self._window(start, end)
+            entries = np.arange(window.start, window.stop)
+        else:
+            entries = self._emoji_entries(emoji_char, start, end)
+            _, lo, hi = self._window(start, end)
+        n_labels = len(self.labels)
+        flat = (self.day[entries].astype(np.int64) - lo) * n_labels + self.label[entries]
+        counts = np.bincount(flat, weights=self.count[entries], minlength=(hi - lo) * n_labels)
+        return pd.DataFrame(counts.reshape(hi - lo, n_labels).astype(np.int64), index=self.days[lo:hi],
+                            columns=self.labels)
+
+    # Daily counts of several emojis side by side (days x emojis)
+    def daily_counts(self, emojis, start=None, end=None, label=None):
+        return pd.concat([self.series(e, start, end, label) for e in emojis], axis=1)
+
+    # Function to save the cube as a compressed .npz file, atomically
+    def save(self, path):
+        tmp = tmp_path(path)
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, days=self.days.values.astype('datetime64[ns]'), vocab=np.array(self.vocab),
+                                labels=np.array(self.labels), day=self.day, emoji=self.emoji,
+                                label=self.label, count=self.count)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['days'], f['vocab'].tolist(), f['labels'].tolist(), f['day'], f['emoji'],
+                       f['label'], f['count'])
+
+
+# Function to build a cube from tweets ('Date' and 'Sentiment') and their
+# (row, emoji id) pairs, where rows are positions in `tweets`
+def cube_from_pairs(tweets, emoji_rows, emoji_ids, vocab):
+    day_codes, days = pd.factorize(pd.to_datetime(tweets['Date']).dt.normalize(), sort=True)
+    sentiments = tweets['Sentiment'].astype(object).fillna(MISSING_LABEL)
+    labels = cube_labels(tweets['Sentiment'])
+    label_codes = pd.Categorical(sentiments, categories=labels).codes
+    emoji_rows = np.asarray(emoji_rows)
+    return EmojiCube.from_codes(days, vocab, labels, day_codes[emoji_rows], np.asarray(emoji_ids),
+                                label_codes[emoji_rows])
+
+# Function to build the cube from scratch from the filtered tweets and their emoji index
+def build_cube(source=TWEETS_CSV):
+    cube_file, meta = cube_paths(source)
+    tweets = load_tweets(['Date', 'Sentiment'], source)
+    emoji_rows, emoji_ids, vocab = load_emoji_index(source)
+    cube = cube_from_pairs(tweets, emoji_rows, emoji_ids, vocab)
+    cube.save(cube_file)
+    write_meta(meta, source, batches=[])
+    return cube
+
+# Function to check whether the saved cube of a source file was built from the
+# current version of the file (batches ingested since keep it fresh)
+def cube_fresh(source):
+    cube_file, meta = cube_paths(source)
+    return os.path.exists(cube_file) and is_fresh(meta, source)
+
+# Function to load the cube of one shard, rebuilt when the shard changes
+# (runs in the shard workers)
+def load_shard_cube(shard):
+    return EmojiCube.load(cube_paths(shard)[0]) if cube_fresh(shard) else build_cube(shard)
+
+# Load the emoji cube (built from the emoji index on first use and whenever the
+# source changes). The cube of a directory or glob of shards is merged from the
+# saved cubes of each shard.
+def load_emoji_cube(source=TWEETS_CSV):
+    if is_sharded(source):
+        shards = list_shards(source)
+        return combine_shards(map_shards(load_shard_cube, shards, fresh=cube_fresh), EmojiCube.merge)
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Filtered file '{source}' not found.")
+    if cube_fresh(source):
+        return EmojiCube.load(cube_paths(source)[0])
+    return build_cube(source)
+
+# Add a batch of new tweets ('Date', 'Sentiment' and 'text') to the saved cube.
+# Only the batch text is scanned for emojis. `batch_id` (e.g. the hash of the
+# batch file) makes re-ingesting a no-op.
+def ingest_batch(tweets, source=TWEETS_CSV, batch_id=None):
+    cube = load_emoji_cube(source)
+    cube_file, meta = cube_paths(source)
+    meta_data = read_meta(meta)
+    batches = meta_data['batches']
+    if batch_id is not None and batch_id in batches:
+        return cube
+
+    vocab, pair_rows, pair_ids = {}, [], []
+    for row, text in enumerate(tweets['text'].astype(str)):
+        for emoji_char in extract_emojis(text):
+            pair_rows.append(row)
+            pair_ids.append(vocab.setdefault(emoji_char, len(vocab)))
+    if pair_rows:
+        cube = cube.merge(cube_from_pairs(tweets, pair_rows, pair_ids, list(vocab)))
+        cube.save(cube_file)
+    # Keep the source fingerprint, so the cube stays fresh until the source changes
+    meta_data['batches'] = batches + ([batch_id] if batch_id is not None else [])
+    write_json(meta, meta_data)
+    return cube
+
+
+if __name__ == '__main__':
+    # Usage: python emoji_cube.py new_tweets.csv [more_tweets.csv ...]
+    if len(sys.argv) < 2:
+        print("Usage: python emoji_cube.py NEW_TWEETS.csv [...]")
+        exit()
+
+    for batch_file in sys.argv[1:]:
+        batch = pd.read_csv(batch_file, usecols=['Date', 'Sentiment', 'text'], low_memory=False)
+        cube = ingest_batch(batch, batch_id=file_hash(batch_file))
+        print(f"Ingested {len(batch)} tweets from '{batch_file}'. Cube covers {len(cube.days)} days, "
+              f"{len(cube.vocab)} emojis and {int(cube.count.sum())} emoji uses.")
@@ -0,0 +1,104 @@
+import json
+import os
+
+import numpy as np
+
+from cache_utils import cache_path, is_fresh, source_name, tmp_path, write_meta
+from emoji_table import extract_emojis
+from instrument import span
+from shards import is_sharded, list_shards, map_shards
+from tweet_store import TWEETS_CSV, load_tweets, shard_offsets
+
+# Function to scan the tweets once and turn them into (row id, emoji id) pairs.
+# Emoji ids are assigned in order of first appearance, so the vocabulary order
+# doubles as the tie-break order of Counter.most_common().
+def build_emoji_index(texts):
+    vocab = {}
+    rows = []
+    emoji_ids = []
+    with span('emoji_index:extract', rows=len(texts)):
+        for row, text in enumerate(texts):
+            for emoji_char in extract_emojis(text):
+                rows.append(row)
+                emoji_ids.append(vocab.setdefault(emoji_char, len(vocab)))
+    pairs = np.empty((len(rows), 2), dtype=np.int32)
+    pairs[:, 0] = rows
+    pairs[:, 1] = emoji_ids
+    return pairs, list(vocab)
+
+# Function to get the paths of the saved index, vocabulary and metadata for a source CSV
+def index_paths(source):
+    name = source_name(source)
+    return (cache_path(f'{name}.emoji_index.npy'),
+            cache_path(f'{name}.emoji_vocab.json'),
+            cache_path(f'{name}.emoji_index.meta.json'))
+
+# Function to check whether the saved index of a source file is up to date
+def index_fresh(source):
+    index_file, vocab_file, meta = index_paths(source)
+    return os.path.exists(index_file) and os.path.exists(vocab_file) and is_fresh(meta, source)
+
+# Load the emoji index of a sharded source (see shards.py): the saved indexes
+# of its shards, with new ones built in parallel, rows counted across the
+# shards and every emoji id pointing into one vocabulary in order of first use
+def load_sharded_emoji_index(source):
+    shards = list_shards(source)
+    offsets = shard_offsets(shards)
+    vocab, rows, ids = {}, [], []
+    for (shard_rows, shard_ids, shard_vocab), offset in zip(map_shards(load_emoji_index, shards, fresh=index_fresh),
+                                                            offsets):
+        codes = np.array([vocab.setdefault(e, len(vocab)) for e in shard_vocab], dtype=np.int32)
+        rows.append(np.asarray(shard_rows, dtype=np.int64) + offset)
+        ids.append(codes[np.asarray(shard_ids)])
+    return np.concatenate(rows), np.concatenate(ids), list(vocab)
+
+# Load the emoji index of the filtered tweets as (rows, emoji_ids, vocab).
+# `rows` are positions in load_tweets() order and `emoji_ids` point into `vocab`.
+# The tweet text is only scanned when the index is missing or the source changed.
+def load_emoji_index(source=TWEETS_CSV):
+    if is_sharded(source):
+        return load_sharded_emoji_index(source)
+    index_file, vocab_file, meta = index_paths(source)
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Filtered file '{source}' not found.")
+
+    if index_fresh(source):
+        pairs = np.load(index_file, mmap_mode='r')
+        with open(vocab_file, encoding='utf-8') as f:
+            vocab = json.load(f)
+    else:
+        pairs, vocab = build_emoji_index(load_tweets(['text'], source)['text'])
+        tmp = tmp_path(index_file)
+        with open(tmp, 'wb') as f:
+            np.save(f, pairs)
+        os.replace(tmp, index_file)
+        tmp = tmp_path(vocab_file)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        os.replace(tmp, vocab_file)
+        write_meta(meta, source, pairs=len(pairs), vocab=len(vocab))
+
+    return pairs[:, 0], pairs[:, 1], vocab
+
+# Function to keep only the emoji pairs of the tweets in `row_ids` (sorted, as
+# returned by load_tweets(['row_id', ...])). Returns the positions of those
+# tweets within `row_ids` together with the matching emoji ids.
+def select_pairs(emoji_rows, emoji_ids, row_ids):
+    row_ids = np.asarray(row_ids)
+    if len(row_ids) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+    positions = np.minimum(np.searchsorted(row_ids, emoji_rows), len(row_ids) - 1)
+    keep = row_ids[positions] == emoji_rows
+    return positions[keep], np.asarray(emoji_ids)[keep]
+
+# Function to get the `n` most common emoji ids with their counts. Ties are
+# broken by first appearance in `emoji_ids`, matching Counter.most_common().
+def top_emojis(emoji_ids, n):
+    emoji_ids = np.asarray(emoji_ids)
+    if len(emoji_ids) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    counts = np.bincount(emoji_ids)
+    present, first_seen = np.unique(emoji_ids, return_index=True)
+    order = np.lexsort((first_seen, -counts[present]))[:n]
+    return present[order], counts[present[order]]
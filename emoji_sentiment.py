@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+# Function to turn per-tweet labels into integer codes (-1 for labels outside `labels`).
+# Without an explicit label set, the categories (or sorted unique values) are used.
+def label_codes(row_labels, labels=None):
+    if labels is None:
+        if isinstance(row_labels.dtype, pd.CategoricalDtype):
+            labels = list(row_labels.cat.categories)
+        else:
+            labels = sorted(pd.unique(row_labels.dropna()))
+    codes = pd.Categorical(row_labels, categories=labels).codes.astype(np.int64)
+    return codes, list(labels)
+
+# Build the full emoji x label count matrix in one vectorized pass over the
+# emoji index. `emoji_rows`/`emoji_ids` come from emoji_index.load_emoji_index()
+# (optionally pre-filtered), `row_labels` holds one label per tweet row.
+# Returns (matrix of shape (n_emojis, len(labels)), labels).
+def sentiment_contingency(emoji_rows, emoji_ids, row_labels, n_emojis, labels=None):
+    row_codes, labels = label_codes(row_labels, labels)
+    pair_codes = row_codes[emoji_rows]
+    keep = pair_codes >= 0
+
+    n_labels = len(labels)
+    flat = np.asarray(emoji_ids)[keep].astype(np.int64) * n_labels + pair_codes[keep]
+    matrix = np.bincount(flat, minlength=n_emojis * n_labels).reshape(n_emojis, n_labels)
+    return matrix, labels
+
+# Function to get the ids of the `k` emojis with the highest count, either over
+# all labels (by=None) or within one label. Ties keep emoji id order.
+def top_k(matrix, labels, k, by=None):
+    counts = matrix.sum(axis=1) if by is None else matrix[:, labels.index(by)]
+    order = np.argsort(-counts, kind='stable')[:k]
+    return order[counts[order] > 0]
+
+# Function to get the top `k` emoji ids of every label
+def top_k_per_label(matrix, labels, k):
+    return {label: top_k(matrix, labels, k, by=label) for label in labels}
+
+# Function to assign each emoji the label it appears with most often.
+# Ties go to the label listed first, like max() over a dict in label order.
+def dominant_sentiment(matrix, labels):
+    return np.asarray(labels, dtype=object)[matrix.argmax(axis=1)]
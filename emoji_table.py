@@ -0,0 +1,140 @@
+import json
+import os
+import re
+
+# Every emoji the `emoji` package knows, precompiled into a small JSON file
+# shipped next to this module, so finding emojis in text does not import the
+# package and its multi-MB data tables. Rebuild it with `python emoji_table.py`
+# after upgrading `emoji`.
+EMOJI_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'emoji_table.json')
+
+ZWJ = '‍'
+
+# Runs of non-ASCII text (plus the ASCII character a keycap emoji starts
+# with): emojis only occur inside them, so the rest of a tweet is skipped
+EMOJI_RUN = re.compile(r'[#*0-9]?[^\x00-\x7f]+')
+
+_table = None
+
+# Function to build the table from the `emoji` package: its version, every
+# emoji sequence and the components (skin tones, hair styles)
+def build_table():
+    import emoji
+    from emoji import unicode_codes
+
+    component = unicode_codes.STATUS['component']
+    return {
+        'version': emoji.__version__,
+        'emojis': sorted(unicode_codes.EMOJI_DATA),
+        'components': sorted(e for e, data in unicode_codes.EMOJI_DATA.items() if data['status'] == component),
+    }
+
+# Function to save the table, atomically
+def save_table(table, path=EMOJI_TABLE):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(table, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+# Emoji lookup on the precompiled table: a prefix tree of the emoji sequences,
+# walked the same way the `emoji` package's tokenizer walks its own, so the
+# emojis found are the ones emoji.emoji_list() finds
+class EmojiTable:
+    def __init__(self, emojis, components, version=None):
+        self.emojis = frozenset(emojis)
+        self.components = frozenset(components)
+        self.version = version
+        self.tree = {}
+        for emoji_char in emojis:
+            node = self.tree
+            for c in emoji_char:
+                node = node.setdefault(c, {})
+            node[''] = True  # A sequence ends here
+        self.first_chars = frozenset(self.tree)
+
+    # Function to split a text into (chars, is_emoji) tokens, ZWJ characters
+    # joining non-RGI sequences dropped (emoji.tokenize with keep_zwj=False)
+    def tokens(self, text):
+        tree = self.tree
+        result = []
+        ignore = set()  # ZWJ characters of non-RGI sequences
+        i = 0
+        length = len(text)
+        while i < length:
+            consumed = False
+            char = text[i]
+            if i in ignore:
+                i += 1
+                continue
+            elif char in tree:
+                j = i + 1
+                node = tree[char]
+                while j < length and text[j] in node:
+                    if j in ignore:
+                        break
+                    node = node[text[j]]
+                    j += 1
+                if '' in node:
+                    result.append((text[i:j], True))
+                    i = j - 1
+                    consumed = True
+            elif char == ZWJ and result and result[-1][0] in self.emojis and i > 0 and text[i - 1] in tree:
+                # A ZWJ after an emoji: scan the emoji again, stopping at the ZWJ
+                ignore.add(i)
+                if result[-1][0] in self.components:
+                    # ZWJ+COMPONENT or ZWJ+EMOJI+COMPONENT
+                    i -= sum(len(chars) for chars, _ in result[-2:])
+                    if text[i] == ZWJ:
+                        i += 1
+                        del result[-1]
+                    else:
+                        del result[-2:]
+                else:
+                    i -= len(result[-1][0])
+                    del result[-1]
+                continue
+            elif result:
+                yield from result
+                result = []
+
+            if not consumed and char != '︎' and char != '️':
+                result.append((char, False))
+            i += 1
+        yield from result
+
+    # Function to list the emojis of a text, in order
+    def find(self, text):
+        return [chars for run in EMOJI_RUN.findall(text) for chars, is_emoji in self.tokens(run) if is_emoji]
+
+    # Function to check whether a text contains an emoji
+    def contains(self, text):
+        return any(is_emoji for run in EMOJI_RUN.findall(text) for _, is_emoji in self.tokens(run))
+
+
+# Function to get the emoji table, loaded on first use (built from the
+# `emoji` package when the precompiled file is missing)
+def emoji_table():
+    global _table
+    if _table is None:
+        try:
+            with open(EMOJI_TABLE, encoding='utf-8') as f:
+                table = json.load(f)
+        except FileNotFoundError:
+            table = build_table()
+        _table = EmojiTable(table['emojis'], table['components'], table.get('version'))
+    return _table
+
+# Function to extract all emojis from a text
+def extract_emojis(text):
+    return emoji_table().find(str(text))
+
+# Function to check if a text contains emojis
+def contains_emoji(text):
+    return emoji_table().contains(str(text))
+
+
+if __name__ == '__main__':
+    table = build_table()
+    save_table(table)
+    print(f"Saved {len(table['emojis'])} emojis of emoji {table['version']} to '{EMOJI_TABLE}'.")
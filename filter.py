@@ -1,32 +1,261 @@
+import argparse
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
 import pandas as pd
-import emoji
 
-# Function to check if a text contains emojis
-def contains_emoji(text):
-    text = str(text)  # Ensure text is a string
-    return bool(emoji.emoji_list(text))  # Returns True if emojis are found
+from cache_utils import COMPRESSION_EXTENSIONS, cache_path, is_fresh, read_meta, source_name, write_meta
+from emoji_table import contains_emoji, emoji_table
+from shards import is_sharded, list_shards, map_shards
+from streaming import BLOCK_SIZE, CountingReader, Quarantine, quarantine_path, stream_process
+
+# Build a regex character class from the codepoints an emoji can start with.
+# Keycap emojis start with an ASCII digit/#/*, so for those we use their first
+# non-ASCII codepoint (U+FE0F / U+20E3) instead - otherwise every tweet with a
+# digit would pass the pre-screen. Built on first use.
+@lru_cache(maxsize=None)
+def emoji_prescreen():
+    codepoints = set()
+    for emoji_char in emoji_table().emojis:
+        for c in emoji_char:
+            if ord(c) >= 128:
+                codepoints.add(ord(c))
+                break
+
+    # Merge consecutive codepoints into ranges to keep the class small
+    ranges = []
+    for cp in sorted(codepoints):
+        if ranges and cp == ranges[-1][1] + 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    char_class = ''.join(
+        re.escape(chr(lo)) if lo == hi else f'{re.escape(chr(lo))}-{re.escape(chr(hi))}'
+        for lo, hi in ranges
+    )
+    return re.compile(f'[{char_class}]')
+
+# Same result as contains_emoji, but rejects emoji-free text with the regex
+# pre-screen before falling back to the full emoji lookup
+def has_emoji(text):
+    text = str(text)
+    if emoji_prescreen().search(text) is None:
+        return False
+    return emoji_table().contains(text)
+
+# Function to filter one chunk (runs inside the worker processes in parallel mode)
+def filter_chunk(chunk):
+    return chunk[chunk['text'].apply(has_emoji)]
+
+# Bytes of CSV the pyarrow reader parses per block (one chunk per block)
+ARROW_BLOCK_SIZE = 16 << 20
 
-# Read the CSV file in chunks with error handling
-chunk_size = 10000  # Adjust based on your system's memory
-filtered_rows = []
+# Read the CSV file as pandas chunks with pyarrow's multithreaded parser. Every
+# column is declared as a string, so no types are inferred and values reach the
+# output unchanged. Malformed lines go to `quarantine` and parsing continues.
+# `source` is the input path or an open (e.g. decompressing) reader of it.
+def read_chunks_arrow(input_path, quarantine, source=None):
+    import pyarrow as pa
+    import pyarrow.csv as pv
 
-try:
-    for chunk in pd.read_csv('Bitcointweets.csv', chunksize=chunk_size, on_bad_lines='skip', engine='python'):
+    header = pd.read_csv(input_path, nrows=0).columns
+    reader = pv.open_csv(
+        input_path if source is None else source,
+        read_options=pv.ReadOptions(use_threads=True, block_size=ARROW_BLOCK_SIZE),
+        parse_options=pv.ParseOptions(newlines_in_values=True, invalid_row_handler=quarantine),
+        convert_options=pv.ConvertOptions(column_types={col: pa.string() for col in header},
+                                          strings_can_be_null=True, quoted_strings_can_be_null=False),
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+# Read the CSV file in chunks with the given engine. The python engine skips
+# malformed lines and stops at the first line it cannot parse at all.
+def read_chunks(input_path, chunk_size, engine='python', quarantine=None, source=None):
+    if engine == 'arrow':
+        yield from read_chunks_arrow(input_path, quarantine, source)
+        return
+    try:
+        yield from pd.read_csv(input_path if source is None else source, chunksize=chunk_size, on_bad_lines='skip', engine='python')
+    except pd.errors.ParserError as e:
+        print(f"ParserError: {e}")
+        print("Skipping problematic rows and continuing...")
+
+# Read the CSV file in chunks and filter them on a single core
+def filter_serial(input_path, chunk_size, engine='python', quarantine=None, source=None):
+    filtered_rows = []
+    rows_read = 0
+    for chunk in read_chunks(input_path, chunk_size, engine, quarantine, source):
+        rows_read += len(chunk)
         # Filter rows with emojis in the 'text' column
-        filtered_chunk = chunk[chunk['text'].apply(contains_emoji)]
-        filtered_rows.append(filtered_chunk)
-except pd.errors.ParserError as e:
-    print(f"ParserError: {e}")
-    print("Skipping problematic rows and continuing...")
-
-# Combine all filtered chunks into a single DataFrame
-if filtered_rows:
-    filtered_df = pd.concat(filtered_rows)
-    # Save the filtered data to a new CSV file
-    filtered_df.to_csv('filtered_file.csv', index=False)
-    print(f"Filtered data saved to 'filtered_file.csv'. Found {len(filtered_df)} rows with emojis.")
-else:
-    print("No rows were processed due to errors.")
+        filtered_rows.append(filter_chunk(chunk))
+    return filtered_rows, rows_read
+
+# Read the CSV file in chunks in this process and filter them in a process pool.
+# At most `workers * 2` chunks are in flight, and results are written in input
+# order as soon as they are ready, so memory stays bounded by the window.
+def filter_parallel(input_path, output_path, chunk_size, workers, engine='python', quarantine=None, source=None):
+    rows_read = 0
+    rows_written = 0
+    out = None
+    pending = deque()
+
+    def write_next():
+        nonlocal out, rows_written
+        filtered_chunk = pending.popleft().result()
+        if out is None:
+            out = open(output_path, 'w', newline='', encoding='utf-8')
+            filtered_chunk.to_csv(out, index=False)
+        else:
+            filtered_chunk.to_csv(out, index=False, header=False)
+        rows_written += len(filtered_chunk)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in read_chunks(input_path, chunk_size, engine, quarantine, source):
+            rows_read += len(chunk)
+            pending.append(executor.submit(filter_chunk, chunk))
+            if len(pending) >= workers * 2:
+                write_next()
+        while pending:
+            write_next()
+
+    if out is not None:
+        out.close()
+    return rows_written if out is not None else None, rows_read
+
+
+# Keep only the tweets of `input_path` that contain emojis and save them to
+# `output_path`. The default python engine skips malformed lines and lets
+# pandas infer column types (a count column with gaps is written as '10.0').
+# The opt-in arrow engine (needs pyarrow) parses in parallel threads, keeps
+# every value as read ('10') and writes malformed lines to
+# <output>.quarantine.csv instead of dropping them. With `stream`, the input is
+# memory-mapped and each block's output is appended and checkpointed, so memory
+# stays flat and an interrupted run resumes where it stopped (see streaming.py);
+# an output ending in .parquet is then written as a directory of Parquet parts.
+# A compressed input is decompressed on the fly and its throughput counts the
+# decompressed bytes. Returns the number of rows read. A directory or glob of
+# input shards goes to filter_shards, with `output_path` as the output directory.
+def run_filter(input_path='Bitcointweets.csv', output_path='filtered_file.csv', chunk_size=10000, workers=1,
+               engine='python', stream=False, block_size=BLOCK_SIZE, resume=True):
+    if is_sharded(input_path):
+        return filter_shards(input_path, output_path, chunk_size, workers, engine, stream, block_size, resume)
+    workers = workers or os.cpu_count()
+    quarantine = Quarantine(input_path, quarantine_path(output_path)) if engine == 'arrow' and not stream else None
+    source = CountingReader(input_path) if input_path.endswith(COMPRESSION_EXTENSIONS) and not stream else None
+    start = time.perf_counter()
+    resumed_rows, resumed_offset = 0, 0
+
+    if stream:
+        rows_read, rows_written, quarantined, (resumed_rows, resumed_offset) = stream_process(
+            input_path, output_path, filter_chunk, block_size, workers, engine,
+            quarantine_path(output_path), resume)
+        print(f"Filtered data saved to '{output_path}'. Found {rows_written} rows with emojis.")
+        if engine == 'arrow':
+            print(f"Quarantined {quarantined} malformed lines in '{quarantine_path(output_path)}'.")
+    elif workers > 1:
+        rows_written, rows_read = filter_parallel(input_path, output_path, chunk_size, workers, engine, quarantine,
+                                                  source)
+        if rows_written is not None:
+            print(f"Filtered data saved to '{output_path}'. Found {rows_written} rows with emojis.")
+        else:
+            print("No rows were processed due to errors.")
+    else:
+        filtered_rows, rows_read = filter_serial(input_path, chunk_size, engine, quarantine, source)
+
+        # Combine all filtered chunks into a single DataFrame
+        if filtered_rows:
+            filtered_df = pd.concat(filtered_rows)
+            # Save the filtered data to a new CSV file
+            filtered_df.to_csv(output_path, index=False)
+            print(f"Filtered data saved to '{output_path}'. Found {len(filtered_df)} rows with emojis.")
+        else:
+            print("No rows were processed due to errors.")
+
+    elapsed = time.perf_counter() - start
+    if quarantine is not None:
+        quarantine.close()
+        print(f"Quarantined {quarantine.rows} malformed lines in '{quarantine.path}'.")
+    if source is not None:
+        source.close()
+    # Throughput covers this run only; a resumed run read the rest before
+    rows = rows_read - resumed_rows
+    megabytes = ((os.path.getsize(input_path) if source is None else source.bytes_read) - resumed_offset) / 1e6
+    resumed = f" after resuming at row {resumed_rows} ({rows_read} in total)" if resumed_rows else ""
+    print(f"Processed {rows} rows ({megabytes:,.1f} MB) in {elapsed:.1f}s{resumed} "
+          f"({rows / max(elapsed, 1e-9):,.0f} rows/sec, {megabytes / max(elapsed, 1e-9):,.1f} MB/s, {engine} parser).")
+    return rows_read
+
+# Function to get the filtered file of one shard in `output_dir` and the
+# metadata recording which version of the shard it was filtered from
+def shard_output_paths(shard, output_dir):
+    name = source_name(shard)
+    return os.path.join(output_dir, f'{name}.csv'), cache_path(f'{name}.filtered.meta.json')
+
+# Function to check whether a shard's filtered file is up to date
+def shard_filtered(shard, output_dir):
+    output, meta = shard_output_paths(shard, output_dir)
+    return (os.path.exists(output) and is_fresh(meta, shard)
+            and read_meta(meta).get('output') == os.path.abspath(output))
+
+# Function to filter one shard into `output_dir` unless its filtered file is
+# up to date, returning the rows read (runs in the shard workers)
+def filter_shard(shard, output_dir, chunk_size, engine, stream, block_size, resume):
+    output, meta = shard_output_paths(shard, output_dir)
+    if shard_filtered(shard, output_dir):
+        return read_meta(meta)['rows']
+    rows = run_filter(shard, output, chunk_size, 1, engine, stream, block_size, resume)
+    write_meta(meta, shard, output=os.path.abspath(output), rows=rows)
+    return rows
+
+# Filter a directory or glob of shards (see shards.py; .csv.gz and .csv.zst are
+# decompressed on the fly) into one filtered CSV per shard in `output_dir`,
+# which the analyses read as a sharded source. Shards run in `workers`
+# processes, and shards filtered since they last changed are skipped, so a new
+# month or year costs only its own shards. Returns the number of rows read.
+def filter_shards(input_path, output_dir, chunk_size=10000, workers=1, engine='python', stream=False,
+                  block_size=BLOCK_SIZE, resume=True):
+    shards = list_shards(input_path)
+    if stream and any(shard.endswith(COMPRESSION_EXTENSIONS) for shard in shards):
+        raise ValueError("--stream memory-maps its input and cannot read compressed shards.")
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    stale = sum(not shard_filtered(shard, output_dir) for shard in shards)
+    rows = map_shards(partial(filter_shard, output_dir=output_dir, chunk_size=chunk_size, engine=engine,
+                              stream=stream, block_size=block_size, resume=resume),
+                      shards, fresh=partial(shard_filtered, output_dir=output_dir), workers=workers or os.cpu_count())
+    elapsed = time.perf_counter() - start
+    print(f"Filtered {stale} of {len(shards)} shards into '{output_dir}' ({sum(rows)} rows) in {elapsed:.1f}s.")
+    return sum(rows)
+
+# Function to add the filter options to a command-line parser (shared with pipeline.py)
+def add_filter_arguments(parser):
+    parser.add_argument('--input', default='Bitcointweets.csv',
+                        help="CSV file, or a directory or glob of (.gz/.zst) shards")
+    parser.add_argument('--output', default='filtered_file.csv',
+                        help="Output file (output directory for sharded input)")
+    parser.add_argument('--chunk-size', type=int, default=10000)  # Adjust based on your system's memory
+    parser.add_argument('--engine', choices=['python', 'arrow'], default='python',
+                        help="CSV parser: pandas' python engine, or pyarrow (multithreaded, keeps values as "
+                             "read, quarantines bad lines)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes (0 = one per CPU, 1 = single core)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Append each block to the output and checkpoint it; resumes an interrupted run")
+    parser.add_argument('--block-mb', type=int, default=BLOCK_SIZE >> 20, help="Input MB per block in --stream mode")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint of an interrupted --stream run")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Keep only the tweets that contain emojis.")
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+    run_filter(args.input, args.output, args.chunk_size, args.workers, args.engine, args.stream,
+               args.block_mb << 20, not args.restart)
 
 
 
@@ -0,0 +1,9 @@
+# Author and influence columns of the tweet dumps, shared by the influence
+# analyses and twitter.py. Kept free of imports so the extractor starts
+# without loading the analysis modules.
+
+# Each column is used when the source has it
+AUTHOR_COLUMN = 'user_name'
+FOLLOWERS_COLUMN = 'user_followers'
+ENGAGEMENT_COLUMNS = ['likes', 'retweets', 'replies']
+INFLUENCE_COLUMNS = [AUTHOR_COLUMN, FOLLOWERS_COLUMN, 'user_friends', 'user_verified'] + ENGAGEMENT_COLUMNS
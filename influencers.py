@@ -0,0 +1,180 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import cache_path, is_fresh, source_name, tmp_path, write_meta
+from emoji_index import select_pairs
+from influence_columns import AUTHOR_COLUMN, ENGAGEMENT_COLUMNS, FOLLOWERS_COLUMN, INFLUENCE_COLUMNS
+from sentiment_scores import EMA_SPAN, SENTIMENT_MAP
+from shards import is_sharded
+from tweet_store import TWEETS_CSV, load_tweet_rows, load_tweets, tweet_columns
+
+# Function to list the influence columns a source CSV has
+def available_influence_columns(source=TWEETS_CSV):
+    columns = set(tweet_columns(source))
+    return [col for col in INFLUENCE_COLUMNS if col in columns]
+
+# Function to read a column as numbers (anything unparseable counts as 0)
+def numeric(tweets, col):
+    if col not in tweets.columns:
+        return np.zeros(len(tweets))
+    return pd.to_numeric(tweets[col], errors='coerce').fillna(0).clip(lower=0).to_numpy(dtype=float)
+
+# Per-tweet influence weights:
+#   'followers'  - log(1 + followers), so reach counts without one account drowning out the rest
+#   'engagement' - log(1 + likes + retweets + replies)
+#   'combined'   - the follower weight scaled up by engagement
+#   'equal'      - every tweet counts once, as in the unweighted analyses
+# Without the needed columns every tweet gets weight 1.
+def influence_weights(tweets, scheme='followers'):
+    followers = np.log1p(numeric(tweets, FOLLOWERS_COLUMN))
+    engagement = np.log1p(sum(numeric(tweets, col) for col in ENGAGEMENT_COLUMNS))
+    if scheme not in ('followers', 'engagement', 'combined', 'equal'):
+        raise ValueError(f"Unknown weighting scheme '{scheme}'.")
+    if scheme == 'equal' or (FOLLOWERS_COLUMN not in tweets.columns and scheme != 'engagement'):
+        weights = np.ones(len(tweets))
+    elif scheme == 'followers':
+        weights = followers
+    elif scheme == 'engagement':
+        weights = engagement if any(col in tweets.columns for col in ENGAGEMENT_COLUMNS) else np.ones(len(tweets))
+    else:
+        weights = followers * (1 + engagement)
+    return weights
+
+# Influence-weighted daily sentiment: the weight of the tweets of each label per
+# day, the weighted mean score and its EMA and momentum (as in the rollup). The
+# EMA starts at the first day given; days before `start` only warm it up and
+# are left out, like the days before a window of the rollup. One bincount per
+# column, no Python loops.
+def weighted_daily_sentiment(tweets, weights, span=EMA_SPAN, start=None):
+    day_codes, days = pd.factorize(tweets['Date'].dt.normalize(), sort=True)
+    sentiment = tweets['Sentiment'].astype(object)
+    scores = sentiment.map(SENTIMENT_MAP).astype(float).fillna(0).to_numpy()
+    labels = list(SENTIMENT_MAP)
+    label_codes = pd.Categorical(sentiment, categories=labels).codes
+
+    n_days, n_labels = len(days), len(labels)
+    known = label_codes >= 0
+    by_label = np.bincount(day_codes[known] * n_labels + label_codes[known], weights=weights[known],
+                           minlength=n_days * n_labels).reshape(n_days, n_labels)
+    total = np.bincount(day_codes, weights=weights, minlength=n_days)
+    score_sum = np.bincount(day_codes, weights=weights * scores, minlength=n_days)
+
+    daily = pd.DataFrame(by_label, columns=[f'Weighted_{label}' for label in labels])
+    daily.insert(0, 'Date', days)
+    daily['Weight_Total'] = total
+    daily['Weighted_Score'] = score_sum / np.where(total > 0, total, np.nan)
+    daily['Weighted_EMA'] = daily['Weighted_Score'].ewm(span=span, adjust=False).mean()
+    daily['Weighted_Momentum'] = daily['Weighted_EMA'].diff()
+    if start is not None:
+        daily = daily[daily['Date'] >= pd.Timestamp(start)].reset_index(drop=True)
+    return daily
+
+# Influence-weighted daily use of the `top` emojis with the largest total
+# weight, as a days x emojis frame. `emoji_index` is (rows, emoji_ids, vocab).
+def weighted_daily_emojis(tweets, weights, emoji_index, top=20):
+    emoji_rows, emoji_ids, vocab = emoji_index
+    positions, ids = select_pairs(emoji_rows, emoji_ids, tweets['row_id'])
+    pair_weights = weights[positions]
+    totals = np.bincount(ids, weights=pair_weights, minlength=len(vocab))
+    top_ids = np.argsort(-totals, kind='stable')[:top]
+    top_ids = top_ids[totals[top_ids] > 0]
+
+    day_codes, days = pd.factorize(tweets['Date'].dt.normalize(), sort=True)
+    column = np.full(len(vocab), -1)
+    column[top_ids] = np.arange(len(top_ids))
+    keep = column[ids] >= 0
+    counts = np.bincount(day_codes[positions[keep]] * len(top_ids) + column[ids[keep]],
+                         weights=pair_weights[keep], minlength=len(days) * len(top_ids))
+    return pd.DataFrame(counts.reshape(len(days), len(top_ids)), index=days, columns=[vocab[i] for i in top_ids])
+
+
+# Tweets grouped by author: the row ids of author i are rows[ptr[i]:ptr[i + 1]]
+# (in CSV order), next to per-author tweet counts, followers and engagement.
+class AuthorIndex:
+    def __init__(self, names, rows, ptr, followers, engagement):
+        self.names = np.asarray(names, dtype=object)
+        self.rows = np.asarray(rows)
+        self.ptr = np.asarray(ptr)
+        self.followers = np.asarray(followers)
+        self.engagement = np.asarray(engagement)
+        self.tweets = np.diff(self.ptr)
+        self._ids = None
+
+    # Function to get an author's id from their name (None if unknown)
+    def author_id(self, name):
+        if self._ids is None:
+            self._ids = {author: i for i, author in enumerate(self.names)}
+        return self._ids.get(name)
+
+    # Function to get the ids of the `n` authors with the most followers,
+    # tweets or engagement. Ties keep the order authors first appear in.
+    def top(self, n, by='followers'):
+        values = {'followers': self.followers, 'tweets': self.tweets, 'engagement': self.engagement}[by]
+        return np.argsort(-values, kind='stable')[:n]
+
+    # Function to get the sorted row ids of the given authors' tweets
+    def rows_of(self, author_ids):
+        author_ids = np.atleast_1d(author_ids)
+        if len(author_ids) == 0:
+            return np.empty(0, dtype=self.rows.dtype)
+        return np.sort(np.concatenate([self.rows[self.ptr[i]:self.ptr[i + 1]] for i in author_ids]))
+
+    # Function to summarize the authors as a frame
+    def frame(self):
+        return pd.DataFrame({'author': self.names, 'tweets': self.tweets, 'followers': self.followers,
+                             'engagement': self.engagement})
+
+# Function to build the author index from tweets in load_tweets() order (all rows)
+def build_author_index(tweets):
+    codes, names = pd.factorize(tweets[AUTHOR_COLUMN], sort=False)
+    valid = codes >= 0
+    order = np.flatnonzero(valid)[np.argsort(codes[valid], kind='stable')]
+    ptr = np.searchsorted(codes[order], np.arange(len(names) + 1))
+    followers = np.zeros(len(names))
+    np.maximum.at(followers, codes[valid], numeric(tweets, FOLLOWERS_COLUMN)[valid])
+    engagement = np.bincount(codes[valid], weights=sum(numeric(tweets, col) for col in ENGAGEMENT_COLUMNS)[valid]
+                             if any(col in tweets.columns for col in ENGAGEMENT_COLUMNS) else None,
+                             minlength=len(names))
+    return AuthorIndex(np.asarray(names, dtype=object), order.astype(np.int64), ptr, followers, engagement)
+
+# Function to get the paths of the saved author index and its metadata
+def author_index_paths(source=TWEETS_CSV):
+    name = source_name(source)
+    return cache_path(f'{name}.authors.npz'), cache_path(f'{name}.authors.meta.json')
+
+# Load the per-author index of the filtered tweets. Only the author and
+# influence columns are read, and only when the index is missing or the source
+# changed. Raises ValueError when the source has no author column. The index of
+# a directory or glob of shards is built from their columnar stores each time
+# (authors span shards, so there is no per-shard index to merge).
+def load_author_index(source=TWEETS_CSV):
+    index_file, meta = author_index_paths(source)
+    if not is_sharded(source) and not os.path.exists(source):
+        raise FileNotFoundError(f"Filtered file '{source}' not found.")
+
+    if not is_sharded(source) and os.path.exists(index_file) and is_fresh(meta, source):
+        with np.load(index_file) as f:
+            return AuthorIndex(f['names'], f['rows'], f['ptr'], f['followers'], f['engagement'])
+
+    columns = available_influence_columns(source)
+    if AUTHOR_COLUMN not in columns:
+        raise ValueError(f"'{source}' has no '{AUTHOR_COLUMN}' column to index authors by.")
+    index = build_author_index(load_tweets(columns, source))
+    if is_sharded(source):
+        return index
+    tmp = tmp_path(index_file)
+    with open(tmp, 'wb') as f:
+        np.savez(f, names=index.names.astype(str), rows=index.rows, ptr=index.ptr, followers=index.followers,
+                 engagement=index.engagement)
+    os.replace(tmp, index_file)
+    write_meta(meta, source, authors=len(index.names))
+    return index
+
+# Load the tweets of the `n` top authors (by followers, tweets or engagement)
+# straight from their row ranges in the author index, reading only those rows
+# of the store
+def load_influencer_tweets(n, by='followers', columns=None, source=TWEETS_CSV, index=None):
+    index = index or load_author_index(source)
+    return load_tweet_rows(index.rows_of(index.top(n, by)), columns, source)
@@ -0,0 +1,287 @@
+import argparse
+import atexit
+import csv
+import functools
+import json
+import os
+import resource
+import threading
+import time
+
+# Set to a .json (JSON lines) or .csv path to record a trace of every span;
+# unset, spans cost one environment lookup
+TRACE_ENV = 'EMOJI_TRACE'
+# 'cprofile' or 'pyinstrument' to profile the spans that ask for it (the stages)
+PROFILE_ENV = 'EMOJI_PROFILE'
+# Shared by the processes of one run (pipeline.py sets it for its workers)
+RUN_ENV = 'EMOJI_TRACE_RUN'
+
+# Functions whose cumulative time is reported for every profiled span
+WATCHED = ['read_csv', 'to_datetime', 'emoji_list', 'groupby', 'merge', 'read_parquet', 'to_parquet', 'savefig']
+
+# Columns of a CSV trace (the rest of a record goes into 'details' as JSON)
+CSV_COLUMNS = ['run', 'time', 'pid', 'name', 'parent', 'depth', 'status', 'seconds', 'cpu_seconds', 'rows',
+               'rows_per_sec', 'rss_mb', 'peak_rss_mb']
+
+_records = []
+_local = threading.local()
+_lock = threading.Lock()
+_notes = set()
+
+# Function to get the trace path (None when tracing is off)
+def trace_path():
+    return os.environ.get(TRACE_ENV) or None
+
+# Function to get the id of the current run, shared with forked workers
+def run_id():
+    if not os.environ.get(RUN_ENV):
+        os.environ[RUN_ENV] = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    return os.environ[RUN_ENV]
+
+# Function to get the resident memory of this process in MB (Linux; else the peak)
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+# Function to get the peak resident memory of this process in MB
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Function to get this thread's stack of open spans
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+# Function to print a note once per process
+def _note(message):
+    if message not in _notes:
+        _notes.add(message)
+        print(message)
+
+
+# Starts the profiler of a span and turns its result into a summary: the 10
+# functions with the most own time and the cumulative time of WATCHED
+# functions. The full profile is saved next to the trace.
+class _Profile:
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.profiler = None
+        if kind == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                _note("pyinstrument is not installed; profiling with cProfile instead.")
+                self.kind = 'cprofile'
+            else:
+                self.profiler = Profiler()
+        if self.kind == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+        elif self.kind != 'pyinstrument':
+            raise ValueError(f"Unknown profiler '{kind}' in ${PROFILE_ENV} (use cprofile or pyinstrument).")
+
+    def start(self):
+        if self.kind == 'cprofile':
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    # Function to stop profiling, save the profile and summarize it
+    def stop(self):
+        base = f"{os.path.splitext(trace_path())[0]}.{self.name.replace(':', '_').replace('/', '_')}.{os.getpid()}"
+        if self.kind == 'pyinstrument':
+            self.profiler.stop()
+            with open(f'{base}.html', 'w') as f:
+                f.write(self.profiler.output_html())
+            return {'profile': f'{base}.html'}
+
+        import pstats
+        self.profiler.disable()
+        self.profiler.dump_stats(f'{base}.prof')
+        stats = pstats.Stats(self.profiler).stats
+        top = sorted(stats.items(), key=lambda item: -item[1][2])[:10]
+        hotspots = {name: 0.0 for name in WATCHED}
+        for (_, _, function), (_, _, _, cumulative, _) in stats.items():
+            if function in hotspots:
+                hotspots[function] += cumulative
+        return {'profile': f'{base}.prof',
+                'top': [{'function': f'{os.path.basename(file)}:{line}({function})', 'seconds': round(own, 4)}
+                        for (file, line, function), (_, _, own, _, _) in top],
+                'hotspots': {name: round(seconds, 4) for name, seconds in hotspots.items() if seconds}}
+
+
+# Times a block of work into the trace: wall and CPU seconds, rows handled
+# (set `.rows` inside the block when it is known only there), resident and
+# peak memory after the block, and the enclosing span. With profile=True and
+# $EMOJI_PROFILE set, the block is profiled too (unless an enclosing span
+# already is). Does nothing when $EMOJI_TRACE is unset.
+#
+#     with span('read_csv') as s:
+#         df = pd.read_csv(path)
+#         s.rows = len(df)
+class span:
+    def __init__(self, name, rows=None, profile=False, **attrs):
+        self.name = name
+        self.rows = rows
+        self.profile = profile
+        self.attrs = attrs
+        self.active = False
+
+    def __enter__(self):
+        self.active = trace_path() is not None
+        if not self.active:
+            return self
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        self._profile = None
+        kind = os.environ.get(PROFILE_ENV)
+        if self.profile and kind and not any(s._profile for s in stack[:-1]):
+            self._profile = _Profile(kind, self.name)
+            self._profile.start()
+        self.started = time.time()
+        self._cpu = time.process_time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.active:
+            return False
+        seconds = time.perf_counter() - self._start
+        cpu_seconds = time.process_time() - self._cpu
+        details = self._profile.stop() if self._profile is not None else {}
+        stack = _stack()
+        stack.pop()
+        record = {
+            'run': run_id(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'pid': os.getpid(), 'name': self.name, 'parent': self.parent.name if self.parent else None,
+            'depth': len(stack), 'status': 'ok' if exc_type is None else 'error',
+            'seconds': round(seconds, 6), 'cpu_seconds': round(cpu_seconds, 6), 'rows': self.rows,
+            'rows_per_sec': round(self.rows / seconds) if self.rows and seconds > 0 else None,
+            'rss_mb': round(rss_mb(), 1), 'peak_rss_mb': round(peak_rss_mb(), 1),
+        }
+        record.update(self.attrs)
+        record.update(details)
+        with _lock:
+            _records.append(record)
+        if not stack:
+            flush()
+        return False
+
+# Function to count the rows of a result (None when it has no length); for a
+# tuple such as the emoji index, the rows of its first item
+def count_rows(result):
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+# Decorator that runs a function in a span named after it (or `name`).
+# `rows` maps the result to the rows handled, e.g. rows=count_rows.
+def traced(name=None, rows=None, profile=False):
+    def decorate(func):
+        label = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if trace_path() is None:
+                return func(*args, **kwargs)
+            with span(label, profile=profile) as s:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    s.rows = rows(result)
+                return result
+        return wrapper
+    return decorate
+
+# Function to append the finished spans to the trace file. Processes of a run
+# append to the same file, one locked write each.
+def flush():
+    path = trace_path()
+    with _lock:
+        records = _records[:]
+        _records.clear()
+    if not records or path is None:
+        return
+
+    import fcntl
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(f, CSV_COLUMNS + ['details'])
+            if f.tell() == 0:
+                writer.writeheader()
+            for record in records:
+                row = {col: record.get(col) for col in CSV_COLUMNS}
+                extra = {k: v for k, v in record.items() if k not in CSV_COLUMNS}
+                row['details'] = json.dumps(extra, ensure_ascii=False) if extra else ''
+                writer.writerow(row)
+        else:
+            f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+        f.flush()
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+atexit.register(flush)
+
+
+# Function to read a trace file (JSON lines or CSV) as a frame
+def read_trace(path):
+    import pandas as pd
+
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    return pd.read_json(path, lines=True)
+
+# Function to summarize the spans of a trace per name: calls, total and mean
+# seconds, rows per second and the largest peak RSS, slowest first. `run` is a
+# run id, 'last' or None for every run.
+def summarize(trace, run='last'):
+    if run == 'last':
+        run = trace['run'].iloc[-1]
+    if run is not None:
+        trace = trace[trace['run'] == run]
+    summary = trace.groupby('name').agg(calls=('seconds', 'size'), seconds=('seconds', 'sum'),
+                                        mean_seconds=('seconds', 'mean'), rows=('rows', 'sum'),
+                                        peak_rss_mb=('peak_rss_mb', 'max'))
+    summary['rows_per_sec'] = (summary['rows'] / summary['seconds']).where(summary['rows'] > 0).round()
+    return summary.sort_values('seconds', ascending=False)
+
+# Function to total the WATCHED hotspots of the profiled spans of a trace
+def summarize_hotspots(trace, run='last'):
+    import pandas as pd
+
+    if 'hotspots' not in trace.columns:
+        return pd.DataFrame()
+    if run == 'last':
+        run = trace['run'].iloc[-1]
+    if run is not None:
+        trace = trace[trace['run'] == run]
+    rows = trace.dropna(subset=['hotspots'])
+    hotspots = pd.DataFrame([h for h in rows['hotspots']], index=rows['name']).fillna(0)
+    return hotspots
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize a trace written with $EMOJI_TRACE.')
+    parser.add_argument('trace', help='trace file (.json lines or .csv)')
+    parser.add_argument('--run', default='last', help="run id, 'last' (default) or 'all'")
+    args = parser.parse_args()
+
+    trace = read_trace(args.trace)
+    if 'hotspots' not in trace.columns and 'details' in trace.columns:
+        trace['hotspots'] = [json.loads(d).get('hotspots') if isinstance(d, str) else None
+                             for d in trace['details']]
+    run = None if args.run == 'all' else args.run
+    print(summarize(trace, run).to_string())
+    hotspots = summarize_hotspots(trace, run)
+    if not hotspots.empty:
+        print("\nCumulative seconds in watched functions per profiled span:")
+        print(hotspots.to_string())
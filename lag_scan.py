@@ -0,0 +1,330 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from datasets import Datasets
+from render import show_figure
+from whales import top_share_mask
+
+# Inputs this analysis reads from Datasets (loaded up front by pipeline.py)
+INPUTS = ['rollup', 'emoji_cube', 'btc_minutes', 'vcrix']
+
+# Resample intervals and lags of the scan, from minutes to weeks. A lag is used
+# at every interval it is a whole multiple of; features and targets only at
+# intervals no finer than their own resolution (tweets are dated by day).
+INTERVALS = ['1min', '5min', '15min', '1h', '4h', '1D', '3D', '7D']
+LAGS = ['0min', '1min', '5min', '15min', '30min', '1h', '2h', '4h', '6h', '12h',
+        '1D', '2D', '3D', '4D', '5D', '6D', '7D', '14D', '21D', '28D']
+
+# Lag orders (in steps of the interval) of the Granger-style regressions
+GRANGER_ORDERS = [1, 2, 3, 5, 7]
+
+# Number of most common emojis turned into daily count features
+TOP_EMOJIS = 50
+
+# Pairs with fewer overlapping steps than this are left out of the results
+MIN_OVERLAP = 20
+
+# Function to describe a series for the scan: (name, series with a datetime
+# index, how to aggregate it when resampling, its native resolution)
+def series_spec(name, series, how, resolution):
+    return name, series.astype(float), how, pd.Timedelta(resolution)
+
+# Function to build the sentiment and emoji features from the daily rollup and
+# the emoji cube, plus BTC volume and whale volume from the minutes
+def build_features(rollup, cube, minutes, start, end, top_n=TOP_EMOJIS):
+    rollup = rollup.set_index('Date')
+    features = [series_spec(col, rollup[col], 'sum', '1D') for col in ['Positive', 'Neutral', 'Negative', 'Total']]
+    features.append(series_spec('Sentiment_Score', rollup['Sentiment_Score'], 'mean', '1D'))
+    features.append(series_spec('Sentiment_EMA', rollup['Sentiment_EMA'], 'last', '1D'))
+    features.append(series_spec('SentimentMomentum', rollup['SentimentMomentum'], 'sum', '1D'))
+
+    # Daily count of each of the most common emojis in the window
+    for emoji_char in cube.top_k(top_n, start, end)['emoji']:
+        features.append(series_spec(f'emoji {emoji_char}', cube.series(emoji_char, start, end), 'sum', '1D'))
+
+    minutes = minutes.set_index('date')
+    volume_usd = minutes['Volume BTC'] * minutes['close']
+    features.append(series_spec('btc_volume', minutes['Volume BTC'], 'sum', '1min'))
+    whale = pd.Series(np.where(top_share_mask(volume_usd.to_numpy()), volume_usd.to_numpy(), 0.0), index=minutes.index)
+    features.append(series_spec('whale_volume_usd', whale, 'sum', '1min'))
+    return features
+
+# Function to build the targets: BTC log returns and absolute returns (from the
+# minute closes, so they exist at every interval) and the VCRIX level and change
+def build_targets(minutes, vcrix):
+    close = minutes.set_index('date')['close']
+    vcrix = vcrix.assign(date=pd.to_datetime(vcrix['date'])).set_index('date')['vcrix']
+    return [
+        series_spec('btc_return', np.log(close), 'log_return', '1min'),
+        series_spec('btc_abs_return', np.log(close), 'abs_log_return', '1min'),
+        series_spec('vcrix', vcrix, 'last', '1D'),
+        series_spec('vcrix_change', vcrix, 'diff', '1D'),
+    ]
+
+# Function to resample the given specs onto one grid of `interval` steps from
+# `start` to `end`, as a (steps, series) array with NaN where a step has no data
+def resample_specs(specs, interval, start, end):
+    grid = pd.date_range(pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta('1D') - pd.Timedelta(interval),
+                         freq=interval)
+    columns = []
+    for _, series, how, _ in specs:
+        series = series[(series.index >= grid[0]) & (series.index < grid[-1] + pd.Timedelta(interval))]
+        resampled = series.resample(pd.Timedelta(interval), origin=grid[0])
+        if how == 'sum':
+            values = resampled.sum(min_count=1)
+        elif how == 'mean':
+            values = resampled.mean()
+        elif how == 'last':
+            values = resampled.last()
+        elif how == 'diff':
+            values = resampled.last().reindex(grid).diff()
+        else:  # log_return / abs_log_return of a log price
+            values = resampled.last().reindex(grid).diff()
+            values = values.abs() if how == 'abs_log_return' else values
+        columns.append(values.reindex(grid).to_numpy(dtype=float))
+    return grid, np.column_stack(columns) if columns else np.empty((len(grid), 0))
+
+# Function to standardize each column over its valid values: (values with NaN
+# set to 0, 0/1 mask of valid values)
+def standardize(values):
+    mask = np.isfinite(values)
+    count = np.maximum(mask.sum(axis=0), 1)
+    filled = np.where(mask, values, 0.0)
+    mean = filled.sum(axis=0) / count
+    centered = np.where(mask, values - mean, 0.0)
+    std = np.sqrt((centered ** 2).sum(axis=0) / count)
+    return centered / np.where(std > 0, std, 1.0), mask.astype(float)
+
+# Cross-correlation of every feature column with every target column at lags
+# 0..max_lag steps (the feature leads the target), computed with FFTs instead
+# of one dot product per lag. Columns are standardized once over all their
+# valid steps and missing steps are left out of both the sums and the overlap
+# counts. Features are processed in batches so memory stays at about
+# `max_cells` floats. Returns (corr, overlap), each of shape (F, G, max_lag + 1).
+def cross_correlation(features, targets, max_lag, max_cells=1 << 25):
+    steps = len(features)
+    nfft = 1 << int(np.ceil(np.log2(max(2 * steps, 2))))
+    x, x_mask = standardize(features)
+    y, y_mask = standardize(targets)
+    fy = np.fft.rfft(y, nfft, axis=0)
+    fy_mask = np.fft.rfft(y_mask, nfft, axis=0)
+    max_lag = min(max_lag, steps - 1)
+
+    n_features, n_targets = features.shape[1], targets.shape[1]
+    corr = np.empty((n_features, n_targets, max_lag + 1))
+    overlap = np.empty((n_features, n_targets, max_lag + 1), dtype=np.int64)
+    batch = max(1, max_cells // max(nfft * n_targets, 1))
+    for lo in range(0, n_features, batch):
+        hi = min(lo + batch, n_features)
+        fx = np.conj(np.fft.rfft(x[:, lo:hi], nfft, axis=0))
+        fx_mask = np.conj(np.fft.rfft(x_mask[:, lo:hi], nfft, axis=0))
+        # sum_t x[t] * y[t + k] for every (feature, target) pair at once
+        sums = np.fft.irfft(fx[:, :, None] * fy[:, None, :], nfft, axis=0)[:max_lag + 1]
+        counts = np.rint(np.fft.irfft(fx_mask[:, :, None] * fy_mask[:, None, :], nfft, axis=0)[:max_lag + 1])
+        overlap[lo:hi] = counts.transpose(1, 2, 0)
+        corr[lo:hi] = np.clip(sums / np.maximum(counts, 1), -1, 1).transpose(1, 2, 0)
+    return corr, overlap
+
+# Granger-style test of every feature against one target: does adding the
+# feature's last `order` values to an autoregression of the target on its own
+# last `order` values reduce the residual sum of squares? All features are
+# fitted at once with batched least squares (normal equations solved per
+# feature); steps with a missing value get zero weight. Returns (F statistic,
+# valid steps) per feature.
+def granger_batch(features, target, order):
+    steps, n_features = features.shape
+    n = steps - order
+    if n <= 2 * order + 1:
+        return np.full(n_features, np.nan), np.zeros(n_features, dtype=np.int64)
+
+    y = target[order:]
+    y_lags = np.column_stack([target[order - i:steps - i] for i in range(1, order + 1)])
+    x_lags = np.stack([features[order - i:steps - i] for i in range(1, order + 1)], axis=2)  # (n, F, order)
+
+    design = np.concatenate([
+        np.broadcast_to(np.ones((n, 1, 1)), (n, n_features, 1)),
+        np.broadcast_to(y_lags[:, None, :], (n, n_features, order)),
+        x_lags,
+    ], axis=2).transpose(1, 0, 2)  # (F, n, 2 * order + 1)
+    weights = (np.isfinite(design).all(axis=2) & np.isfinite(y)[None, :]).astype(float)
+    design = np.where(np.isfinite(design), design, 0.0)
+    y = np.where(np.isfinite(y), y, 0.0)
+
+    # Weighted normal equations of the full model; the restricted model (target
+    # lags only) uses the leading block of the same matrices
+    weighted = design * weights[:, :, None]
+    gram = weighted.transpose(0, 2, 1) @ design
+    moment = weighted.transpose(0, 2, 1) @ y
+    yy = weights @ (y * y)
+    ridge = 1e-10 * np.eye(gram.shape[1])
+
+    def rss(k):
+        beta = np.linalg.solve(gram[:, :k, :k] + ridge[:k, :k], moment[:, :k, None])[:, :, 0]
+        return yy - np.einsum('fi,fi->f', beta, moment[:, :k])
+
+    rss_full = np.maximum(rss(2 * order + 1), 1e-300)
+    rss_restricted = rss(order + 1)
+    valid = weights.sum(axis=1)
+    dof = valid - (2 * order + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f_stat = ((rss_restricted - rss_full) / order) / (rss_full / dof)
+    return np.where(dof > 0, np.maximum(f_stat, 0), np.nan), valid.astype(np.int64)
+
+# Function to get the p-value of an F statistic (needs scipy; NaN without it)
+def f_pvalue(f_stat, dfn, dfd):
+    try:
+        from scipy.stats import f
+    except ImportError:
+        return np.full(np.shape(f_stat), np.nan)
+    return f.sf(f_stat, dfn, dfd)
+
+# Function to scan one interval (one cell of the grid): cross-correlations at
+# every lag that is a multiple of the interval, and Granger F statistics.
+# Runs in a worker process in parallel scans.
+def scan_interval(interval, features, targets, start, end, lags=LAGS, orders=GRANGER_ORDERS):
+    step = pd.Timedelta(interval)
+    features = [spec for spec in features if spec[3] <= step]
+    targets = [spec for spec in targets if spec[3] <= step]
+    lag_steps = sorted({int(pd.Timedelta(lag) / step) for lag in lags if pd.Timedelta(lag) % step == pd.Timedelta(0)})
+    if not features or not targets or not lag_steps:
+        return pd.DataFrame(), pd.DataFrame()
+
+    _, x = resample_specs(features, interval, start, end)
+    _, y = resample_specs(targets, interval, start, end)
+    corr, overlap = cross_correlation(x, y, max(lag_steps))
+    lag_steps = [k for k in lag_steps if k < corr.shape[2]]
+
+    f_idx, g_idx, k_idx = np.meshgrid(np.arange(len(features)), np.arange(len(targets)), lag_steps, indexing='ij')
+    correlations = pd.DataFrame({
+        'interval': interval,
+        'feature': np.array([spec[0] for spec in features], dtype=object)[f_idx.ravel()],
+        'target': np.array([spec[0] for spec in targets], dtype=object)[g_idx.ravel()],
+        'lag': pd.to_timedelta(k_idx.ravel() * step.value, unit='ns'),
+        'steps': k_idx.ravel(),
+        'corr': corr[f_idx, g_idx, k_idx].ravel(),
+        'n': overlap[f_idx, g_idx, k_idx].ravel(),
+    })
+    correlations = correlations[correlations['n'] >= MIN_OVERLAP]
+
+    granger = []
+    x_std, _ = standardize(x)
+    x_std[~np.isfinite(x)] = np.nan
+    for g, (target_name, *_) in enumerate(targets):
+        y_std, _ = standardize(y[:, [g]])
+        y_std = np.where(np.isfinite(y[:, g]), y_std[:, 0], np.nan)
+        for order in orders:
+            f_stat, valid = granger_batch(x_std, y_std, order)
+            granger.append(pd.DataFrame({
+                'interval': interval,
+                'feature': [spec[0] for spec in features],
+                'target': target_name,
+                'order': order,
+                'lag': order * step,
+                'F': f_stat,
+                'n': valid,
+                'p_value': f_pvalue(f_stat, order, valid - (2 * order + 1)),
+            }))
+    granger = pd.concat(granger, ignore_index=True)
+    return correlations.reset_index(drop=True), granger[granger['n'] >= MIN_OVERLAP].reset_index(drop=True)
+
+# Scan every interval of the grid, `workers` intervals at a time in separate
+# processes (workers=0 means one per CPU; nested inside a pipeline worker the
+# scan runs in-process). Returns (correlations, granger) frames.
+def lag_scan(features, targets, start, end, intervals=INTERVALS, lags=LAGS, orders=GRANGER_ORDERS, workers=0):
+    workers = workers or os.cpu_count()
+    if multiprocessing.current_process().daemon:
+        workers = 1
+    args = [(interval, features, targets, start, end, lags, orders) for interval in intervals]
+    if workers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(args))) as executor:
+            results = list(executor.map(scan_interval, *zip(*args)))
+    else:
+        results = [scan_interval(*a) for a in args]
+    correlations = pd.concat([r[0] for r in results], ignore_index=True)
+    granger = pd.concat([r[1] for r in results], ignore_index=True)
+    return correlations, granger
+
+
+# Run the analysis on the shared inputs (loaded on demand when run on its own)
+def run(data=None, intervals=INTERVALS, workers=0, out=None):
+    data = data or Datasets()
+
+    # Step 1: Load the datasets
+    try:
+        rollup = data.rollup()
+        cube = data.emoji_cube()
+        minutes = data.btc_minutes()
+        vcrix = data.vcrix()
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return
+
+    # Step 2: Build the features and targets
+    features = build_features(rollup, cube, minutes, data.start, data.end)
+    targets = build_targets(minutes, vcrix)
+
+    # Step 3: Scan every interval, lag and feature/target pair
+    start = time.perf_counter()
+    correlations, granger = lag_scan(features, targets, data.start, data.end, intervals, workers=workers)
+    elapsed = time.perf_counter() - start
+    print(f"Scanned {len(correlations)} feature/target/lag correlations and {len(granger)} Granger tests "
+          f"over {len(intervals)} intervals in {elapsed:.1f}s.")
+    if out:
+        correlations.to_csv(f'{out}_correlations.csv', index=False)
+        granger.to_csv(f'{out}_granger.csv', index=False)
+        print(f"Results saved to '{out}_correlations.csv' and '{out}_granger.csv'.")
+    if correlations.empty:
+        print("Warning: No feature/target pairs overlap within the date range.")
+        return
+
+    # Step 4: Print the strongest lagged correlations and Granger statistics
+    lagged = correlations[correlations['steps'] > 0]
+    print("Strongest lagged correlations (feature leads target):")
+    print(lagged.reindex(lagged['corr'].abs().sort_values(ascending=False).index).head(20).to_string(index=False))
+    print("Largest Granger F statistics:")
+    print(granger.sort_values('F', ascending=False).head(20).to_string(index=False))
+
+    # Step 5: Plot daily correlations with BTC returns by lag for the strongest features
+    # (matplotlib is only imported to draw, so the scan workers never load it)
+    daily = correlations[(correlations['interval'] == '1D') & (correlations['target'] == 'btc_return')]
+    if daily.empty:
+        return
+    table = daily.pivot_table(index='feature', columns='steps', values='corr')
+    table = table.loc[table.abs().max(axis=1).sort_values(ascending=False).index[:25]]
+    limit = max(np.nanmax(np.abs(table.to_numpy())), 1e-9)
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+    image = ax.imshow(table.to_numpy(), cmap='RdBu_r', vmin=-limit, vmax=limit, aspect='auto')
+    ax.set_xticks(range(len(table.columns)))
+    ax.set_xticklabels([f'{k}d' for k in table.columns])
+    # Emojis are shown by number (the default font has no emoji glyphs), as in Emoji_Count.py
+    emoji_features = [name for name in table.index if name.startswith('emoji ')]
+    ax.set_yticks(range(len(table.index)))
+    ax.set_yticklabels([f'emoji #{emoji_features.index(name) + 1}' if name in emoji_features else name
+                        for name in table.index])
+    ax.set_xlabel('Lag (feature leads BTC daily return)')
+    ax.set_title(f'Lagged Correlation with BTC Daily Returns ({data.start} to {data.end})')
+    fig.colorbar(image, ax=ax, label='Correlation')
+    fig.tight_layout()
+    show_figure('lag_scan')
+
+    print("Mapping of emoji numbers in the chart:")
+    for i, name in enumerate(emoji_features, 1):
+        print(f"emoji #{i}: {name[len('emoji '):]}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scan lagged correlations and Granger statistics "
+                                                 "of sentiment and emoji features against BTC and VCRIX.")
+    parser.add_argument('--intervals', nargs='+', default=INTERVALS)
+    parser.add_argument('--workers', type=int, default=0, help="Intervals scanned in parallel (0 = one per CPU)")
+    parser.add_argument('--out', help="Write <out>_correlations.csv and <out>_granger.csv")
+    args = parser.parse_args()
+    run(intervals=args.intervals, workers=args.workers, out=args.out)
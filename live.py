@@ -0,0 +1,405 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import Counter, deque
+from urllib.parse import parse_qs, urlsplit
+
+from emoji_table import extract_emojis
+from sentiment_scores import EMA_SPAN, SENTIMENT_MAP
+
+# Events waiting to be applied; a full queue makes the sources wait, so memory
+# stays bounded however fast the feeds are
+QUEUE_SIZE = 2000
+
+# Completed days and minute bars kept in memory
+DAY_HISTORY = 30
+BAR_HISTORY = 1440
+
+# Default port of the query API
+API_PORT = 8766
+
+# Bytes read from a followed file at a time
+READ_SIZE = 1 << 16
+
+# Function to get the day ('YYYY-MM-DD') of an ISO date string or a unix time
+def event_day(value):
+    if isinstance(value, (int, float)):
+        return time.strftime('%Y-%m-%d', time.gmtime(value))
+    return str(value)[:10]
+
+# Function to get the minute ('YYYY-MM-DD HH:MM') of an ISO date string or a unix time
+def event_minute(value):
+    if isinstance(value, (int, float)):
+        return time.strftime('%Y-%m-%d %H:%M', time.gmtime(value))
+    return str(value)[:16].replace('T', ' ')
+
+
+# The daily sentiment score, its EMA and momentum as in the rollup, updated
+# one tweet at a time. Finished days are folded into the EMA when the first
+# tweet of a later day arrives; the current day's EMA and momentum are the
+# values the rollup would give if the day ended now. Tweets of days already
+# folded in are counted as late and left out.
+class SentimentTracker:
+    def __init__(self, span=EMA_SPAN, history=DAY_HISTORY):
+        self.alpha = 2 / (span + 1)
+        self.days = deque(maxlen=history)
+        self.ema = None  # EMA up to the last finished day
+        self.closed_day = None
+        self.day = None
+        self.late = 0
+        self._reset()
+
+    def _reset(self):
+        self.counts = dict.fromkeys(list(SENTIMENT_MAP) + ['Other'], 0)
+        self.total = 0
+        self.score_sum = 0.0
+
+    # Function to continue from the saved rollup's last days and EMA
+    def seed(self, rollup):
+        for row in rollup.tail(self.days.maxlen).itertuples():
+            self.days.append({'date': row.Date.strftime('%Y-%m-%d'), 'tweets': int(row.Total),
+                              'score': float(row.Sentiment_Score), 'ema': float(row.Sentiment_EMA),
+                              'momentum': float(row.SentimentMomentum)})
+        if len(rollup):
+            self.ema = float(rollup['Sentiment_EMA'].iloc[-1])
+            self.closed_day = rollup['Date'].iloc[-1].strftime('%Y-%m-%d')
+
+    # Function to get the EMA and momentum of a day with the given mean score
+    def _step(self, score):
+        if self.ema is None:
+            return score, float('nan')
+        ema = self.ema + self.alpha * (score - self.ema)
+        return ema, ema - self.ema
+
+    # Function to fold the current day into the EMA
+    def _close_day(self):
+        score = self.score_sum / self.total
+        ema, momentum = self._step(score)
+        self.days.append({'date': self.day, 'tweets': self.total, 'score': score, 'ema': ema, 'momentum': momentum})
+        self.ema = ema
+        self.closed_day = self.day
+        self._reset()
+
+    def add(self, day, sentiment):
+        if self.closed_day is not None and day <= self.closed_day or self.day is not None and day < self.day:
+            self.late += 1
+            return
+        if self.day is not None and day > self.day and self.total:
+            self._close_day()
+        self.day = day
+        self.counts[sentiment if sentiment in SENTIMENT_MAP else 'Other'] += 1
+        self.total += 1
+        self.score_sum += SENTIMENT_MAP.get(sentiment, 0)
+
+    # Function to describe the current day and the finished days
+    def state(self):
+        current = None
+        if self.total:
+            score = self.score_sum / self.total
+            ema, momentum = self._step(score)
+            current = {'date': self.day, 'tweets': self.total, 'counts': dict(self.counts), 'score': score,
+                       'ema': ema, 'momentum': momentum}
+        return {'current': current, 'days': list(self.days), 'late': self.late}
+
+
+# Emoji use over the whole stream and on the current day
+class EmojiTracker:
+    def __init__(self):
+        self.total = Counter()
+        self.today = Counter()
+        self.day = None
+
+    def add(self, day, text):
+        if self.day is None or day > self.day:
+            self.day = day
+            self.today = Counter()
+        emojis = extract_emojis(text)
+        self.total.update(emojis)
+        if day == self.day:
+            self.today.update(emojis)
+
+    # Function to get the `k` most used emojis ('total' or 'today')
+    def top(self, k=10, scope='total'):
+        counts = self.today if scope == 'today' else self.total
+        return [{'emoji': emoji_char, 'count': count} for emoji_char, count in counts.most_common(k)]
+
+
+# One-minute price bars built from ticks. A bar is finished when the first
+# tick of a later minute arrives; ticks of finished minutes count as late.
+class BarTracker:
+    def __init__(self, history=BAR_HISTORY):
+        self.bars = deque(maxlen=history)
+        self.bar = None
+        self.late = 0
+
+    def add(self, minute, price, volume=0.0):
+        bar = self.bar
+        if bar is not None and minute == bar['minute']:
+            bar['high'] = max(bar['high'], price)
+            bar['low'] = min(bar['low'], price)
+            bar['close'] = price
+            bar['volume'] += volume
+            bar['ticks'] += 1
+            return
+        if bar is not None and minute < bar['minute']:
+            self.late += 1
+            return
+        if bar is not None:
+            self.bars.append(bar)
+        self.bar = {'minute': minute, 'open': price, 'high': price, 'low': price, 'close': price,
+                    'volume': volume, 'ticks': 1}
+
+    # Function to get the last `n` bars, the one in progress included
+    def last(self, n=60):
+        bars = list(self.bars)[-n:] + ([dict(self.bar)] if self.bar else [])
+        return bars[-n:]
+
+
+# Everything the live mode keeps up to date, with throughput and latency counters
+class LiveState:
+    def __init__(self, span=EMA_SPAN):
+        self.sentiment = SentimentTracker(span)
+        self.emojis = EmojiTracker()
+        self.bars = BarTracker()
+        self.tweets = 0
+        self.ticks = 0
+        self.bad_lines = 0
+        self.latency_ms = 0.0  # Moving average of the time from reading a line to applying it
+        self.max_latency_ms = 0.0
+        self.started = time.perf_counter()
+
+    # Function to apply one tweet ({'Date', 'text', 'Sentiment'})
+    def add_tweet(self, event):
+        day = event_day(event['Date'])
+        self.sentiment.add(day, event.get('Sentiment'))
+        self.emojis.add(day, event.get('text', ''))
+        self.tweets += 1
+
+    # Function to apply one tick ({'date' or 'unix', 'close' or 'price', optional 'volume'})
+    def add_tick(self, event):
+        when = event['date'] if 'date' in event else event['unix']
+        price = float(event['close'] if 'close' in event else event['price'])
+        volume = float(event.get('volume', event.get('Volume BTC', 0.0)))
+        self.bars.add(event_minute(when), price, volume)
+        self.ticks += 1
+
+    # Function to apply one line of a feed, read at `received` (perf_counter)
+    def apply(self, kind, line, received):
+        try:
+            event = json.loads(line)
+            if kind == 'tweets':
+                self.add_tweet(event)
+            else:
+                self.add_tick(event)
+        except (ValueError, KeyError, TypeError):
+            self.bad_lines += 1
+            return
+        latency = (time.perf_counter() - received) * 1000
+        self.latency_ms += 0.01 * (latency - self.latency_ms)
+        self.max_latency_ms = max(self.max_latency_ms, latency)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        return {'tweets': self.tweets, 'ticks': self.ticks, 'bad_lines': self.bad_lines,
+                'seconds': elapsed, 'events_per_second': (self.tweets + self.ticks) / elapsed if elapsed else 0.0,
+                'latency_ms': self.latency_ms, 'max_latency_ms': self.max_latency_ms,
+                'late_tweets': self.sentiment.late, 'late_ticks': self.bars.late}
+
+
+# Yield the lines of a file as they are written (like `tail -f`, from the
+# start of the file). With follow=False it stops at the end of the file.
+async def tail_lines(path, follow=True, poll=0.05):
+    with open(path, 'rb') as f:
+        pending = b''
+        while True:
+            block = f.read(READ_SIZE)
+            if not block:
+                if not follow:
+                    break
+                await asyncio.sleep(poll)
+                continue
+            lines = (pending + block).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield line
+            await asyncio.sleep(0)  # Let the other sources and the API run
+        if pending.strip():
+            yield pending
+
+# Yield the lines a TCP feed sends until it closes the connection
+async def socket_lines(host, port):
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    try:
+        while line := await reader.readline():
+            if line.strip():
+                yield line
+    finally:
+        writer.close()
+
+# Function to open a source: 'tcp://host:port' or the path of a file
+def open_source(source, follow=True):
+    if source.startswith('tcp://'):
+        host, port = urlsplit(source).netloc.rsplit(':', 1)
+        return socket_lines(host, int(port))
+    return tail_lines(source, follow)
+
+# Function to move the lines of a source onto the queue, stamped with their arrival time
+async def produce(lines, kind, queue):
+    async for line in lines:
+        await queue.put((kind, line, time.perf_counter()))
+
+# Function to apply queued events to the state, one at a time
+async def consume(queue, state):
+    while True:
+        kind, line, received = await queue.get()
+        state.apply(kind, line, received)
+        queue.task_done()
+
+
+# Function to turn NaN into null so the answers are valid JSON
+def json_safe(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {k: json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [json_safe(v) for v in value]
+    return value
+
+# Function to answer a query on the current state:
+#   /sentiment            current day and finished days
+#   /emojis?top=10&scope=today|total
+#   /bars?n=60            last minute bars
+#   /stats                throughput, latency and late events
+#   /                     everything above in one answer
+def query(state, path):
+    url = urlsplit(path)
+    params = {k: v[0] for k, v in parse_qs(url.query).items()}
+    route = url.path.rstrip('/')
+    if route == '/sentiment':
+        return state.sentiment.state()
+    if route == '/emojis':
+        return state.emojis.top(int(params.get('top', 10)), params.get('scope', 'total'))
+    if route == '/bars':
+        return state.bars.last(int(params.get('n', 60)))
+    if route == '/stats':
+        return state.stats()
+    if route == '':
+        sentiment = state.sentiment.state()
+        return {'sentiment': sentiment['current'], 'emojis': state.emojis.top(10),
+                'bar': state.bars.bar, 'stats': state.stats()}
+    raise KeyError(route)
+
+# Function to serve the query API over HTTP on the running event loop
+async def serve_api(state, host='127.0.0.1', port=API_PORT):
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():  # Skip the headers
+                pass
+            method, path, _ = request.decode('latin-1').split(' ', 2)
+            try:
+                status, body = '200 OK', json.dumps(json_safe(query(state, path)), ensure_ascii=False)
+            except (KeyError, ValueError):
+                status, body = '404 Not Found', json.dumps({'error': f'unknown query {path}'})
+            body = body.encode('utf-8')
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+            await writer.drain()
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+# Consume the tweet and tick sources into `state` while serving the query API.
+# Returns when every source has ended (files are followed unless follow=False).
+async def run_live(state, tweet_sources=(), tick_sources=(), host='127.0.0.1', port=API_PORT, follow=True):
+    queue = asyncio.Queue(QUEUE_SIZE)
+    server = await serve_api(state, host, port) if port else None
+    consumer = asyncio.create_task(consume(queue, state))
+    try:
+        await asyncio.gather(*[produce(open_source(s, follow), 'tweets', queue) for s in tweet_sources],
+                             *[produce(open_source(s, follow), 'ticks', queue) for s in tick_sources])
+        await queue.join()
+    finally:
+        consumer.cancel()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+    return state
+
+
+# Function to read a CSV as JSON lines in time order: tweets ('Date', 'text',
+# 'Sentiment') or BTC minutes ('date', 'close', 'Volume BTC' as 'volume')
+def feed_lines(path, kind):
+    import pandas as pd
+
+    if kind == 'tweets':
+        df = pd.read_csv(path, usecols=['Date', 'text', 'Sentiment'], dtype=str, keep_default_na=False)
+    else:
+        df = pd.read_csv(path, usecols=['unix', 'date', 'close', 'Volume BTC']).sort_values('unix')
+        df = df.drop(columns='unix').rename(columns={'Volume BTC': 'volume'})
+    return [json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n' for record in df.to_dict('records')]
+
+# Function to serve a CSV as a line-delimited TCP feed, a local stand-in for a
+# live source. Each client gets every line, `rate` lines per second (0 = as
+# fast as it reads them).
+async def serve_feed(path, kind, host='127.0.0.1', port=9001, rate=0):
+    lines = feed_lines(path, kind)
+    batch = max(1, rate // 100) if rate else 1000
+
+    async def handle(reader, writer):
+        try:
+            for i in range(0, len(lines), batch):
+                writer.write(b''.join(lines[i:i + batch]))
+                await writer.drain()
+                if rate:
+                    await asyncio.sleep(batch / rate)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"Serving {len(lines)} {kind} from '{path}' at tcp://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Live sentiment, emoji and price state from streaming feeds.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='consume feeds and serve the query API')
+    run.add_argument('--tweets', nargs='*', default=[], help='JSON-lines files to follow or tcp://host:port feeds')
+    run.add_argument('--ticks', nargs='*', default=[], help='JSON-lines files to follow or tcp://host:port feeds')
+    run.add_argument('--host', default='127.0.0.1')
+    run.add_argument('--port', type=int, default=API_PORT, help='query API port (0 = no API)')
+    run.add_argument('--no-follow', action='store_true', help='stop at the end of the files instead of following them')
+    run.add_argument('--seed', action='store_true', help='continue the EMA of the saved sentiment rollup')
+    feed = commands.add_parser('feed', help='serve a CSV as a line-delimited TCP feed (a local stand-in)')
+    feed.add_argument('csv')
+    feed.add_argument('--kind', choices=['tweets', 'ticks'], default='tweets')
+    feed.add_argument('--host', default='127.0.0.1')
+    feed.add_argument('--port', type=int, default=9001)
+    feed.add_argument('--rate', type=int, default=0, help='lines per second (0 = unlimited)')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'feed':
+            asyncio.run(serve_feed(args.csv, args.kind, args.host, args.port, args.rate))
+        else:
+            state = LiveState()
+            if args.seed:
+                from sentiment_rollup import load_rollup
+                state.sentiment.seed(load_rollup())
+            if args.port:
+                print(f"Query API at http://{args.host}:{args.port}/ (sentiment, emojis, bars, stats)")
+            asyncio.run(run_live(state, args.tweets, args.ticks, args.host, args.port, not args.no_follow))
+            print(json.dumps(json_safe(query(state, '/')), ensure_ascii=False, indent=2))
+    except KeyboardInterrupt:
+        pass
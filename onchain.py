@@ -0,0 +1,267 @@
+import argparse
+import glob
+import hashlib
+import http.client
+import io
+import os
+import queue
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import cache_path, tmp_path
+
+# Where the on-chain metrics come from: a CSV/Parquet snapshot (or a glob of
+# them) or the base URL of a metrics server. Unset means simulated metrics.
+ONCHAIN_SOURCE_ENV = 'ONCHAIN_SOURCE'
+
+# Daily metrics a provider returns, next to a 'date' column
+METRICS = ['Exchange_Inflow', 'Exchange_Outflow', 'Realized_Cap', 'MVRV_Ratio']
+
+# Function to keep the 'date' column (as midnight timestamps) and the known
+# metric columns of a frame, sorted by date; metrics it lacks are left out
+def normalize_metrics(df):
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date']).dt.normalize()
+    columns = ['date'] + [m for m in METRICS if m in df.columns]
+    return df[columns].sort_values('date').reset_index(drop=True)
+
+# Function to drop the metric columns that have no value at all, so a metric
+# the source never returned does not look present
+def drop_empty_metrics(df):
+    return df.drop(columns=[m for m in METRICS if m in df.columns and df[m].isna().all()])
+
+# Function to turn a sorted list of days into inclusive (start, end) ranges of
+# at most `max_days` consecutive days each
+def date_ranges(days, max_days=90):
+    ranges = []
+    for day in pd.DatetimeIndex(days).sort_values():
+        if ranges and day - ranges[-1][1] == pd.Timedelta(days=1) and (day - ranges[-1][0]).days < max_days:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [(start, end) for start, end in ranges]
+
+
+# Interface of an on-chain metrics source: fetch(start, end) returns one row
+# per day in the inclusive range that the source has data for, with a 'date'
+# column and any of METRICS
+class MetricsProvider(ABC):
+    @abstractmethod
+    def fetch(self, start, end):
+        pass
+
+
+# Metrics read from local snapshot files (CSV or Parquet, or a glob of them).
+# Later files win when two snapshots cover the same day.
+class FileMetricsProvider(MetricsProvider):
+    def __init__(self, path):
+        self.path = path
+        self._df = None
+
+    # Function to read every snapshot once
+    def _load(self):
+        if self._df is None:
+            paths = sorted(glob.glob(self.path))
+            if not paths:
+                raise FileNotFoundError(f"No on-chain metrics snapshot matches '{self.path}'")
+            frames = [pd.read_parquet(p) if p.endswith('.parquet') else pd.read_csv(p) for p in paths]
+            df = normalize_metrics(pd.concat(frames, ignore_index=True))
+            self._df = df.drop_duplicates('date', keep='last').reset_index(drop=True)
+        return self._df
+
+    def fetch(self, start, end):
+        df = self._load()
+        return df[(df['date'] >= pd.Timestamp(start)) & (df['date'] <= pd.Timestamp(end))].reset_index(drop=True)
+
+
+# Metrics served over HTTP by `GET <base>/metrics?start=YYYY-MM-DD&end=YYYY-MM-DD`,
+# answered with CSV. Long ranges are split into batches of `batch_days` that
+# are fetched `workers` at a time over a pool of keep-alive connections.
+class HTTPMetricsProvider(MetricsProvider):
+    def __init__(self, base_url, batch_days=90, workers=4, timeout=30):
+        parts = urlsplit(base_url)
+        self.base_url = base_url
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.batch_days = batch_days
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = queue.LifoQueue()
+        self.requests_made = 0
+        self._lock = threading.Lock()
+
+    # Function to take an idle connection from the pool, or open a new one
+    def _connection(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            return cls(self.netloc, timeout=self.timeout)
+
+    # Function to fetch one batch. A connection the server closed is reopened once.
+    def _get(self, start, end):
+        query = urlencode({'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')})
+        conn = self._connection()
+        for attempt in range(2):
+            try:
+                conn.request('GET', f'{self.prefix}/metrics?{query}')
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                if attempt:
+                    raise
+        with self._lock:
+            self.requests_made += 1
+        if response.status != 200:
+            conn.close()
+            raise ValueError(f"Metrics server returned {response.status} for {start:%Y-%m-%d}..{end:%Y-%m-%d}")
+        self._pool.put(conn)
+        return pd.read_csv(io.BytesIO(body))
+
+    # Function to fetch the given (start, end) batches concurrently
+    def fetch_ranges(self, ranges):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            frames = list(pool.map(lambda r: self._get(*r), ranges))
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]')})
+        return normalize_metrics(pd.concat(frames, ignore_index=True))
+
+    def fetch(self, start, end):
+        days = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq='D')
+        return self.fetch_ranges(date_ranges(days, self.batch_days))
+
+    # Function to close the pooled connections
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+# Keeps every day fetched from `provider` in cache/onchain.<name>.parquet and
+# only asks the provider for days in the range that were never fetched. Days
+# the provider had no data for are stored as empty rows, so they are not
+# asked for again either; metric columns without any value are not stored.
+class CachedMetricsProvider(MetricsProvider):
+    def __init__(self, provider, name):
+        self.provider = provider
+        self.path = cache_path(f'onchain.{name}.parquet')
+
+    # Function to read the cached days
+    def cached(self):
+        if not os.path.exists(self.path):
+            return pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]')})
+        return drop_empty_metrics(pd.read_parquet(self.path))
+
+    def fetch(self, start, end):
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        cached = self.cached()
+        wanted = pd.date_range(start, end, freq='D')
+        missing = wanted.difference(pd.DatetimeIndex(cached['date']))
+
+        if len(missing):
+            if hasattr(self.provider, 'fetch_ranges'):
+                fetched = self.provider.fetch_ranges(date_ranges(missing, getattr(self.provider, 'batch_days', 90)))
+            else:
+                fetched = pd.concat([self.provider.fetch(s, e) for s, e in date_ranges(missing, len(missing))],
+                                    ignore_index=True)
+            fetched = fetched[fetched['date'].isin(missing)]
+            # Mark the days the provider had nothing for as fetched
+            fetched = pd.merge(pd.DataFrame({'date': missing}), fetched, on='date', how='left')
+            cached = drop_empty_metrics(normalize_metrics(pd.concat([cached, fetched], ignore_index=True)))
+            tmp = tmp_path(self.path)
+            cached.to_parquet(tmp, index=False)
+            os.replace(tmp, self.path)
+
+        result = cached[(cached['date'] >= start) & (cached['date'] <= end)]
+        return result.dropna(how='all', subset=[m for m in METRICS if m in result.columns]).reset_index(drop=True)
+
+
+# Function to build the provider for a source: a URL gets an HTTP provider
+# behind the on-disk cache, anything else is read as snapshot files
+def metrics_provider(source):
+    if source.startswith(('http://', 'https://')):
+        name = hashlib.blake2b(source.encode(), digest_size=6).hexdigest()
+        return CachedMetricsProvider(HTTPMetricsProvider(source), name)
+    return FileMetricsProvider(source)
+
+# Function to load the metrics for a date range from the configured source
+# (the ONCHAIN_SOURCE environment variable unless given); None when unset
+def load_onchain(start, end, source=None):
+    source = source or os.environ.get(ONCHAIN_SOURCE_ENV)
+    if not source:
+        return None
+    return metrics_provider(source).fetch(start, end)
+
+# Function to simulate the metrics for days with the given close prices, as
+# the analyses did before real data was available (10M BTC in circulation)
+def simulate_metrics(dates, close, seed=42):
+    np.random.seed(seed)  # For reproducibility
+    close = np.asarray(close, dtype=float)
+    metrics = pd.DataFrame({'date': dates})
+    metrics['Exchange_Inflow'] = np.random.uniform(0, close.max() * 0.1, len(close))
+    metrics['Exchange_Outflow'] = np.random.uniform(0, close.max() * 0.1, len(close))
+    market_cap = close * 10000000
+    metrics['Realized_Cap'] = market_cap * np.random.uniform(0.8, 1.2, len(close))  # Simulated variation
+    metrics['MVRV_Ratio'] = market_cap / metrics['Realized_Cap']
+    return metrics
+
+
+# Function to build a local stand-in of a metrics server that answers from `provider`
+def make_server(provider, host='127.0.0.1', port=8765):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep connections open between requests
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            if url.path.rstrip('/').split('/')[-1] != 'metrics' or not {'start', 'end'} <= params.keys():
+                self.send_error(400, 'Expected /metrics?start=YYYY-MM-DD&end=YYYY-MM-DD')
+                return
+            df = provider.fetch(params['start'][0], params['end'][0])
+            body = df.to_csv(index=False, date_format='%Y-%m-%d').encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve or fetch daily on-chain metrics.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='serve snapshot files over HTTP as a local stand-in')
+    serve.add_argument('snapshot', help='CSV/Parquet snapshot file or glob')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    fetch = commands.add_parser('fetch', help='fetch metrics into the cache and print them')
+    fetch.add_argument('--source', default=os.environ.get(ONCHAIN_SOURCE_ENV),
+                       help=f'snapshot path or server URL (default: ${ONCHAIN_SOURCE_ENV})')
+    fetch.add_argument('--start', default='2019-05-27')
+    fetch.add_argument('--end', default='2019-11-23')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        server = make_server(FileMetricsProvider(args.snapshot), args.host, args.port)
+        print(f"Serving on-chain metrics from '{args.snapshot}' at http://{args.host}:{args.port}/metrics")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+    else:
+        if not args.source:
+            parser.error(f'--source or ${ONCHAIN_SOURCE_ENV} is required')
+        print(metrics_provider(args.source).fetch(args.start, args.end))
@@ -0,0 +1,116 @@
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import tmp_path
+
+# Layout file written next to the partition files
+LAYOUT_FILE = '_layout.json'
+
+# Function to start a fresh partitioned dataset in a temporary directory next to `out_dir`
+def start_partitions(out_dir, date_col, freq='M'):
+    tmp_dir = tmp_path(out_dir)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    with open(os.path.join(tmp_dir, LAYOUT_FILE), 'w') as f:
+        json.dump({'date_col': date_col, 'freq': freq}, f)
+    return tmp_dir
+
+# Function to swap a finished temporary dataset into place. If another process
+# finished the same dataset first in the meantime, its copy is kept.
+def finish_partitions(tmp_dir, out_dir):
+    shutil.rmtree(out_dir, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, out_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# Write the rows of `df` into one Parquet file per period (month by default) of
+# the date column. `part` tells apart the files of successive chunks that fall
+# into the same period, so a large input can be written chunk by chunk.
+def write_partitions(df, out_dir, part=0):
+    with open(os.path.join(out_dir, LAYOUT_FILE)) as f:
+        layout = json.load(f)
+    periods = df[layout['date_col']].dt.to_period(layout['freq']).astype(str)
+    for period, rows in df.groupby(periods, sort=False):
+        rows.to_parquet(os.path.join(out_dir, f'{period}.{part:05d}.parquet'), index=False)
+
+# Function to list the partition files whose period overlaps [start, end].
+# Rows without a date are only included when no range is given.
+def select_partitions(out_dir, start=None, end=None):
+    with open(os.path.join(out_dir, LAYOUT_FILE)) as f:
+        layout = json.load(f)
+
+    selected = []
+    for path in sorted(glob.glob(os.path.join(out_dir, '*.parquet'))):
+        label = os.path.basename(path).split('.')[0]
+        if label == 'NaT':
+            if start is None and end is None:
+                selected.append(path)
+            continue
+        period = pd.Period(label, freq=layout['freq'])
+        if start is not None and period.end_time < start:
+            continue
+        if end is not None and period.start_time > end:
+            continue
+        selected.append(path)
+    return selected, layout
+
+# Read the rows of a partitioned dataset with start <= date <= end (both
+# inclusive, either may be None). Only the partitions overlapping the range are
+# opened and only `columns` are read from them. With `sort_by` the rows come
+# back in that column's order (e.g. the original file order).
+def read_range(out_dir, start=None, end=None, columns=None, sort_by=None):
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    paths, layout = select_partitions(out_dir, start, end)
+    date_col = layout['date_col']
+
+    read_columns = None
+    if columns is not None:
+        read_columns = list(columns)
+        for col in [date_col, sort_by]:
+            if col is not None and col not in read_columns:
+                read_columns.append(col)
+
+    frames = [pd.read_parquet(path, columns=read_columns) for path in paths]
+    if not frames:
+        any_paths = glob.glob(os.path.join(out_dir, '*.parquet'))
+        frames = [pd.read_parquet(any_paths[0], columns=read_columns).iloc[:0]] if any_paths else [pd.DataFrame(columns=read_columns)]
+    df = pd.concat(frames, ignore_index=True)
+
+    # Categories can differ between files, which makes concat fall back to object
+    for col in frames[0].select_dtypes('category').columns:
+        df[col] = df[col].astype('category')
+
+    if start is not None:
+        df = df[df[date_col] >= start]
+    if end is not None:
+        df = df[df[date_col] <= end]
+    if sort_by is not None:
+        df = df.sort_values(sort_by, kind='stable')
+    df = df.reset_index(drop=True)
+    return df if columns is None else df[list(columns)]
+
+# Read only the rows whose `key_col` value is in `keys` (e.g. row ids), with
+# `columns` plus the key, sorted by the key. The filter is pushed down into the
+# Parquet scan, so row groups outside the keys' range are skipped by their
+# statistics and only matching rows are converted to pandas.
+def read_rows(out_dir, key_col, keys, columns=None):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    paths, _ = select_partitions(out_dir)
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + [key_col]))
+    if not paths:
+        return pd.DataFrame(columns=read_columns)
+    # Partitions can disagree on a column's type (e.g. all-null in one month)
+    schema = pa.unify_schemas([pq.read_schema(path) for path in paths], promote_options='permissive')
+    dataset = ds.dataset(paths, schema=schema, format='parquet')
+    table = dataset.to_table(columns=read_columns, filter=ds.field(key_col).isin(pa.array(np.asarray(keys))))
+    return table.to_pandas().sort_values(key_col, kind='stable').reset_index(drop=True)
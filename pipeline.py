@@ -0,0 +1,154 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import traceback
+from contextlib import redirect_stdout
+
+from instrument import PROFILE_ENV, TRACE_ENV, run_id, span
+from render import CHARTS_DIR_ENV, CHARTS_FORMATS_ENV
+from shards import SHARD_WORKERS_ENV
+
+# Analysis stages by name, and the module that implements each of them
+STAGES = {
+    'btc_chart': 'btcChart',
+    'btc_vcrix': 'BTC_VCRI',
+    'emoji_count': 'Emoji_Count',
+    'emoji_sentiment': 'MostFrq_baseoneSentiment',
+    'lag_scan': 'lag_scan',
+    'sentiment_momentum': 'sentiment_momentum',
+    'twitter_vs_btc': 'Twitter_vs_Btcprice',
+    'onchain': 'VolumeBTCVCRIX',
+    'weekend': 'weekdaysorweekends',
+}
+
+# Shared inputs of the running pipeline; forked workers inherit them as-is
+_DATA = None
+
+# Run one stage in this process with its printed output going to
+# <out_dir>/<stage>.log. Returns the stage's timing and the peak resident size
+# of the process: in a worker that is the stage plus the shared inputs, in a
+# serial run the peak of every stage so far. (tracemalloc would slow the stage
+# down several times over, lazy imports included, and skew its timing.)
+def run_stage(name, data, out_dir):
+    module = importlib.import_module(STAGES[name])
+    status = 'ok'
+    start = time.perf_counter()
+    with open(os.path.join(out_dir, f'{name}.log'), 'w') as log, redirect_stdout(log):
+        try:
+            with span(f'stage:{name}', profile=True):
+                module.run(data)
+        except Exception:
+            traceback.print_exc(file=log)
+            status = 'failed'
+    elapsed = time.perf_counter() - start
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {'stage': name, 'status': status, 'seconds': elapsed, 'max_rss_mb': max_rss}
+
+# Function used by the worker processes (the shared inputs come from the fork)
+def _run_stage_in_worker(args):
+    name, out_dir = args
+    return run_stage(name, _DATA, out_dir)
+
+# Load the inputs of the selected stages once, then run the stages, `jobs` at
+# a time. Workers are forked after the inputs are loaded, so every stage reads
+# the same in-memory frames instead of loading its own copy.
+def run_pipeline(stages, data, out_dir='charts', formats=('png',), jobs=1):
+    global _DATA
+    os.makedirs(out_dir, exist_ok=True)
+    os.environ['MPLBACKEND'] = 'Agg'
+    os.environ[CHARTS_DIR_ENV] = os.path.abspath(out_dir)
+    os.environ[CHARTS_FORMATS_ENV] = ','.join(formats)
+
+    modules = [importlib.import_module(STAGES[name]) for name in stages]
+    inputs = []
+    for module in modules:
+        inputs += [name for name in module.INPUTS if name not in inputs]
+    data.preload(inputs)
+    _DATA = data
+
+    if jobs > 1 and len(stages) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        with multiprocessing.get_context('fork').Pool(jobs, maxtasksperchild=1) as pool:
+            results = pool.map(_run_stage_in_worker, [(name, out_dir) for name in stages], chunksize=1)
+    else:
+        results = [run_stage(name, data, out_dir) for name in stages]
+    return results
+
+# Function to print the per-input and per-stage report
+def print_report(data, results, elapsed):
+    print(f"{'input':24} {'load (s)':>10}")
+    for name, seconds in data.load_times.items():
+        print(f"{name:24} {seconds:10.2f}")
+    print()
+    print(f"{'stage':24} {'status':8} {'time (s)':>10} {'RSS (MB)':>10}")
+    for result in results:
+        print(f"{result['stage']:24} {result['status']:8} {result['seconds']:10.2f} {result['max_rss_mb']:10.0f}")
+    max_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+    print(f"\nTotal {elapsed:.2f}s, max RSS {max_rss:.0f} MB")
+
+
+if __name__ == '__main__':
+    from btc_bars import BTC_CSV
+    from datasets import STUDY_END, STUDY_START, VCRIX_CSV, Datasets
+    from filter import add_filter_arguments, run_filter
+    from tweet_store import TWEETS_CSV
+
+    parser = argparse.ArgumentParser(description="Run the emoji sentiment study.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    filter_parser = commands.add_parser('filter', help="Keep only the tweets that contain emojis")
+    add_filter_arguments(filter_parser)
+
+    commands.add_parser('list', help="List the analysis stages")
+
+    run_parser = commands.add_parser('run', help="Run analysis stages (all by default)")
+    run_parser.add_argument('stages', nargs='*', help="Stage names (see 'list')")
+    run_parser.add_argument('--jobs', type=int, default=0, help="Stages run at once (0 = one per CPU)")
+    run_parser.add_argument('--out', default='charts', help="Output directory for the charts and logs")
+    run_parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'])
+    run_parser.add_argument('--start', default=STUDY_START)
+    run_parser.add_argument('--end', default=STUDY_END)
+    run_parser.add_argument('--tweets', default=TWEETS_CSV, help="Filtered tweets: a CSV, or a directory or glob of shards")
+    run_parser.add_argument('--btc', default=BTC_CSV, help="BTC minutes: a CSV, or a directory or glob of shards")
+    run_parser.add_argument('--vcrix', default=VCRIX_CSV, help="Daily VCRIX: a CSV, or a directory or glob of shards")
+    run_parser.add_argument('--shard-workers', type=int, default=0,
+                            help="Processes for new or changed shards (0 = one per CPU)")
+    run_parser.add_argument('--trace', help="Append timings of every stage and step to this .json/.csv trace")
+    run_parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'],
+                            help="Profile every stage (needs --trace; profiles are saved next to it)")
+    args = parser.parse_args()
+
+    if args.command == 'filter':
+        run_filter(args.input, args.output, args.chunk_size, args.workers, args.engine, args.stream,
+                   args.block_mb << 20, not args.restart)
+    elif args.command == 'list':
+        for name, module in STAGES.items():
+            print(f"{name:24} {module}.py")
+    else:
+        unknown = [name for name in args.stages if name not in STAGES]
+        if unknown:
+            parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+        if args.trace:
+            os.environ[TRACE_ENV] = os.path.abspath(args.trace)
+            run_id()  # One run id for every worker
+        if args.profile:
+            if not args.trace:
+                parser.error("--profile needs --trace")
+            os.environ[PROFILE_ENV] = args.profile
+
+        if args.shard_workers:
+            os.environ[SHARD_WORKERS_ENV] = str(args.shard_workers)
+
+        start = time.perf_counter()
+        data = Datasets(args.start, args.end, args.tweets, args.btc, args.vcrix)
+        results = run_pipeline(args.stages or list(STAGES), data, args.out, args.format, args.jobs or os.cpu_count())
+        print_report(data, results, time.perf_counter() - start)
+        if args.trace:
+            print(f"Trace appended to '{args.trace}' (summary: python instrument.py {args.trace}).")
+        if any(result['status'] != 'ok' for result in results):
+            sys.exit(1)
@@ -0,0 +1,106 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Set by `python render.py` for every chart script it runs: when the output
+# directory is set, charts are written to files instead of being shown
+CHARTS_DIR_ENV = 'EMOJI_CHARTS_DIR'
+CHARTS_FORMATS_ENV = 'EMOJI_CHARTS_FORMATS'
+
+# Resolution of the saved charts
+SAVE_DPI = 150
+
+# Scripts that draw a chart, in the order they are listed in the output
+CHART_SCRIPTS = [
+    'btcChart.py',
+    'BTC_VCRI.py',
+    'Emoji_Count.py',
+    'lag_scan.py',
+    'MostFrq_baseoneSentiment.py',
+    'sentiment_momentum.py',
+    'Twitter_vs_Btcprice.py',
+    'VolumeBTCVCRIX.py',
+    'weekdaysorweekends.py',
+]
+
+# Function to check whether charts should be saved to files instead of shown
+def batch_mode():
+    return bool(os.environ.get(CHARTS_DIR_ENV))
+
+# Function to switch to a GUI backend for interactive runs only. In batch mode
+# the Agg backend stays in place and no GUI toolkit is imported.
+def use_gui_backend(backend):
+    if not batch_mode():
+        import matplotlib.pyplot as plt
+        plt.switch_backend(backend)
+
+# Function to display the current figure, or in batch mode save it as
+# <charts dir>/<name>.<format> for every requested format and close it
+def show_figure(name):
+    import matplotlib.pyplot as plt
+    if not batch_mode():
+        plt.show()
+        return
+
+    from instrument import span
+
+    out_dir = os.environ[CHARTS_DIR_ENV]
+    os.makedirs(out_dir, exist_ok=True)
+    fig = plt.gcf()
+    with span(f'plot:{name}'):
+        for fmt in os.environ.get(CHARTS_FORMATS_ENV, 'png').split(','):
+            fig.savefig(os.path.join(out_dir, f'{name}.{fmt}'), format=fmt, dpi=SAVE_DPI)
+    plt.close(fig)
+
+# Function to run one chart script headless in its own process, keeping its
+# printed output in <charts dir>/<name>.log. Scripts run from the current
+# directory (where the data lives) and are looked up next to this file.
+def render_script(script, out_dir, formats):
+    env = dict(os.environ, MPLBACKEND='Agg', **{CHARTS_DIR_ENV: os.path.abspath(out_dir),
+                                                CHARTS_FORMATS_ENV: ','.join(formats)})
+    path = script if os.path.exists(script) else os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    name = os.path.splitext(os.path.basename(script))[0]
+    start = time.perf_counter()
+    with open(os.path.join(out_dir, f'{name}.log'), 'w') as log:
+        result = subprocess.run([sys.executable, path], env=env, stdout=log, stderr=subprocess.STDOUT)
+    return script, result.returncode, time.perf_counter() - start
+
+# Function to build the shared caches once before the scripts run side by side
+def warm_caches():
+    from btc_bars import load_btc_bars, load_btc_levels, load_btc_minutes
+    from emoji_index import load_emoji_index
+    from sentiment_rollup import load_rollup
+    from tweet_store import load_tweets
+
+    for load in [load_tweets, load_emoji_index, load_rollup, load_btc_bars, load_btc_minutes, load_btc_levels]:
+        try:
+            load()
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Skipping cache warm-up for {load.__name__}: {e}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render every chart to files without a display.")
+    parser.add_argument('scripts', nargs='*', default=CHART_SCRIPTS)
+    parser.add_argument('--out', default='charts', help="Output directory for the charts and logs")
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'])
+    parser.add_argument('--jobs', type=int, default=0, help="Scripts rendered at once (0 = one per CPU)")
+    parser.add_argument('--no-warm', action='store_true', help="Do not build the shared caches first")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    if not args.no_warm:
+        warm_caches()
+
+    jobs = args.jobs or os.cpu_count()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(lambda script: render_script(script, args.out, args.format), args.scripts))
+
+    for script, returncode, elapsed in results:
+        status = 'ok' if returncode == 0 else f'failed (exit code {returncode})'
+        print(f"{script:32} {status:24} {elapsed:6.1f}s")
+    if any(returncode != 0 for _, returncode, _ in results):
+        sys.exit(1)
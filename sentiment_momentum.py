@@ -1,46 +1,87 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-
-# Step 1: Load the Twitter dataset
-try:
-    df = pd.read_csv('filtered_file.csv', low_memory=False)
-except FileNotFoundError:
-    print("File 'twitter_data.csv' not found.")
-    exit()
-
-# Step 2: Convert 'Date' to datetime and filter by date range
-df['Date'] = pd.to_datetime(df['Date'])
-df = df[(df['Date'] >= '2019-05-27') & (df['Date'] <= '2019-11-23')]
-
-# Step 3: Convert sentiment to numerical scores
-sentiment_map = {'Positive': 1, 'Neutral': 0, 'Negative': -1}
-df['Sentiment_Score'] = df['Sentiment'].map(sentiment_map).fillna(0)  # Default to 0 for unknown sentiments
-
-# Step 4: Aggregate sentiment score by date (e.g., average sentiment per day)
-daily_sentiment = df.groupby(df['Date'].dt.date)['Sentiment_Score'].mean().reset_index()
-daily_sentiment['Date'] = pd.to_datetime(daily_sentiment['Date'])
-
-# Step 5: Compute Exponential Moving Average (EMA) of sentiment
-# Using a 7-day window (adjust as needed)
-window_size = 7
-daily_sentiment['Sentiment_EMA'] = daily_sentiment['Sentiment_Score'].ewm(span=window_size, adjust=False).mean()
-
-# Step 6: Compute Sentiment Momentum (difference between current and lagged EMA)
-daily_sentiment['SentimentMomentum'] = daily_sentiment['Sentiment_EMA'].diff()
-
-# Step 7: Plot Sentiment Momentum
-plt.figure(figsize=(12, 5))
-plt.plot(daily_sentiment['Date'], daily_sentiment['SentimentMomentum'], label="Sentiment Momentum", color="purple")
-plt.axhline(y=0, color="black", linestyle="--", label="Zero Line")
-plt.xlabel("Date")
-plt.ylabel("Momentum")
-plt.title("Sentiment Momentum Indicator (2019-05-27 to 2019-11-23)")
-plt.legend()
-plt.xticks(rotation=45)
-plt.grid(True, linestyle='--', linewidth=0.5)
-plt.tight_layout()
-plt.show()
-
-# Step 8: Optional - Print the data for inspection
-print(daily_sentiment[['Date', 'Sentiment_EMA', 'SentimentMomentum']])
\ No newline at end of file
+from datasets import Datasets
+from influencers import FOLLOWERS_COLUMN, influence_weights, weighted_daily_sentiment
+from render import show_figure
+from sentiment_rollup import EMA_SPAN
+
+# Inputs this analysis reads from Datasets (loaded up front by pipeline.py)
+INPUTS = ['rollup', 'emoji_cube', 'influence_history']
+
+
+# Function to get the influence-weighted momentum: the same EMA and momentum
+# of the daily score, with each tweet weighted by log(1 + followers) of its
+# author (None when the tweets have no follower counts). The EMA runs over the
+# days before the date range too, so it compares with the rollup's.
+def weighted_momentum(data):
+    try:
+        tweets = data.influence_history()
+    except FileNotFoundError:
+        return None
+    if FOLLOWERS_COLUMN not in tweets.columns:
+        return None
+    return weighted_daily_sentiment(tweets, influence_weights(tweets, 'followers'), start=data.start)
+
+# Function to get the emoji momentum - the same EMA and momentum applied to
+# each of the `n` top emojis' daily share of all emoji uses, read straight
+# from the emoji x day x sentiment cube
+def emoji_momentum(data, n=5):
+    cube = data.emoji_cube()
+    top = cube.top_k(n, data.start, data.end)['emoji']
+    daily_emojis = cube.daily_counts(top, data.start, data.end)
+    shares = daily_emojis.div(cube.by_sentiment(None, data.start, data.end).sum(axis=1), axis=0)
+    return shares.ewm(span=EMA_SPAN, adjust=False).mean().diff()
+
+
+# Run the analysis on the shared inputs (loaded on demand when run on its own)
+def run(data=None):
+    data = data or Datasets()
+
+    # Step 1: Load the daily sentiment rollup of the Twitter dataset (2019-05-27 to 2019-11-23)
+    # Sentiment scores are Positive = 1, Neutral = 0, Negative = -1 (0 for unknown sentiments)
+    try:
+        daily_sentiment = data.rollup()
+    except FileNotFoundError:
+        print("File 'twitter_data.csv' not found.")
+        return
+
+    # Steps 2-5 are kept up to date in the rollup: average sentiment score per day,
+    # its 7-day Exponential Moving Average (EMA) carried over from all earlier days,
+    # and Sentiment Momentum (difference between current and lagged EMA).
+    # New tweets are added with `python sentiment_rollup.py new_tweets.csv`.
+
+    # Influence-weighted momentum, when the data has follower counts
+    weighted = weighted_momentum(data)
+
+    # Step 6: Plot Sentiment Momentum (matplotlib is only imported to draw)
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 5))
+    plt.plot(daily_sentiment['Date'], daily_sentiment['SentimentMomentum'], label="Sentiment Momentum", color="purple")
+    if weighted is not None:
+        plt.plot(weighted['Date'], weighted['Weighted_Momentum'], label="Influence-Weighted Momentum",
+                 color="teal", alpha=0.7)
+    plt.axhline(y=0, color="black", linestyle="--", label="Zero Line")
+    plt.xlabel("Date")
+    plt.ylabel("Momentum")
+    plt.title("Sentiment Momentum Indicator (2019-05-27 to 2019-11-23)")
+    plt.legend()
+    plt.xticks(rotation=45)
+    plt.grid(True, linestyle='--', linewidth=0.5)
+    plt.tight_layout()
+    show_figure('sentiment_momentum')
+
+    # Step 7: Optional - Print the data for inspection
+    print(daily_sentiment[['Date', 'Sentiment_EMA', 'SentimentMomentum']])
+    if weighted is not None:
+        print(weighted[['Date', 'Weighted_EMA', 'Weighted_Momentum']])
+
+    # Step 8: Emoji momentum of the top 5 emojis
+    try:
+        top_emoji_momentum = emoji_momentum(data, 5)
+    except FileNotFoundError:
+        return
+    print("Emoji Momentum (change in the 7-day EMA of each top emoji's daily share):")
+    print(top_emoji_momentum.tail())
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,273 @@
+import os
+import sys
+from functools import partial
+
+import pandas as pd
+
+from cache_utils import cache_path, file_hash, is_fresh, read_meta, source_name, tmp_path, write_json, write_meta
+from instrument import traced
+from sentiment_scores import EMA_SPAN, SENTIMENT_MAP
+from shards import combine_shards, is_sharded, list_shards, map_shards
+from tweet_store import TWEETS_CSV, load_tweets
+
+# Columns of the daily counts (scores and EMA span are in sentiment_scores.py)
+COUNT_COLUMNS = ['Positive', 'Neutral', 'Negative', 'Other', 'Total', 'Score_Sum']
+
+# Function to get the paths of the saved rollup and its metadata
+def rollup_paths(source=TWEETS_CSV):
+    name = source_name(source)
+    return cache_path(f'{name}.rollup.parquet'), cache_path(f'{name}.rollup.meta.json')
+
+# Function to get the paths of the saved hourly rollup and its metadata
+def hourly_rollup_paths(source=TWEETS_CSV):
+    name = source_name(source)
+    return cache_path(f'{name}.hourly_rollup.parquet'), cache_path(f'{name}.hourly_rollup.meta.json')
+
+# Function to get the path of the saved counts of the batches ingested into a
+# source's daily (or per-`freq`) rollup. They are kept apart from the rollup,
+# so they can be added again when the rollup is rebuilt.
+def batch_counts_path(source=TWEETS_CSV, freq='D'):
+    return cache_path(f'{source_name(source)}.batch_counts_{freq}.parquet')
+
+# Function to count the tweets of each sentiment per day (or per `freq`, e.g.
+# 'h' for hours) and sum their scores
+@traced('rollup:groupby')
+def daily_counts(tweets, freq='D'):
+    day = tweets['Date'].dt.normalize() if freq == 'D' else tweets['Date'].dt.floor(freq)
+    sentiment = tweets['Sentiment'].astype(object)
+    label = sentiment.where(sentiment.isin(list(SENTIMENT_MAP)), 'Other')
+
+    counts = pd.crosstab(day, label).reindex(columns=COUNT_COLUMNS[:4], fill_value=0)
+    counts['Total'] = counts.sum(axis=1)
+    counts['Score_Sum'] = sentiment.map(SENTIMENT_MAP).astype(float).fillna(0).groupby(day).sum()
+    counts.index.name = 'Date'
+    counts.columns.name = None
+    return counts.reset_index()
+
+# Function to add new per-day counts into the rollup (days may overlap)
+def merge_counts(rollup, counts):
+    if rollup is None or rollup.empty:
+        merged = counts.set_index('Date')[COUNT_COLUMNS]
+    else:
+        merged = rollup.set_index('Date')[COUNT_COLUMNS].add(counts.set_index('Date')[COUNT_COLUMNS], fill_value=0)
+    merged = merged.sort_index()
+    merged[COUNT_COLUMNS[:5]] = merged[COUNT_COLUMNS[:5]].astype('int64')
+    return merged.reset_index()
+
+# Function to load the counts of every ingested batch (a 'Batch' column holds
+# the batch id, '' for batches without one); None before the first batch
+def load_batch_counts(source=TWEETS_CSV, freq='D'):
+    path = batch_counts_path(source, freq)
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+# Function to add the counts of a new batch to the saved batch counts
+def save_batch_counts(counts, source, batch_id, freq='D'):
+    path = batch_counts_path(source, freq)
+    counts = pd.concat([load_batch_counts(source, freq), counts.assign(Batch=batch_id or '')], ignore_index=True)
+    tmp = tmp_path(path)
+    counts.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+# Function to add the saved batch counts to counts built from the source.
+# Returns the merged counts and the ids of the batches added.
+def replay_batches(counts, source, freq='D'):
+    batch_counts = load_batch_counts(source, freq)
+    if batch_counts is None:
+        return counts, []
+    merged = merge_counts(counts, batch_counts.groupby('Date')[COUNT_COLUMNS].sum().reset_index())
+    return merged, [batch for batch in batch_counts['Batch'].unique().tolist() if batch]
+
+# Function to get the paths of the saved per-day (or per-`freq`) counts of one
+# file and their metadata
+def counts_paths(source, freq='D'):
+    name = source_name(source)
+    return cache_path(f'{name}.counts_{freq}.parquet'), cache_path(f'{name}.counts_{freq}.meta.json')
+
+# Function to check whether the saved counts of a file are up to date
+def counts_fresh(source, freq='D'):
+    counts_file, meta = counts_paths(source, freq)
+    return os.path.exists(counts_file) and is_fresh(meta, source)
+
+# Function to load the per-day (or per-`freq`) counts of one shard, saved
+# until the shard changes (runs in the shard workers)
+def load_counts(source, freq='D'):
+    counts_file, meta = counts_paths(source, freq)
+    if counts_fresh(source, freq):
+        return pd.read_parquet(counts_file)
+    counts = merge_counts(None, daily_counts(load_tweets(['Date', 'Sentiment'], source), freq))
+    tmp = tmp_path(counts_file)
+    counts.to_parquet(tmp, index=False)
+    os.replace(tmp, counts_file)
+    write_meta(meta, source, freq=freq)
+    return counts
+
+# Function to merge the counts of every shard of a sharded source (see
+# shards.py); only new or changed shards are read, in parallel
+def sharded_counts(source, freq='D'):
+    shards = list_shards(source)
+    counts = map_shards(partial(load_counts, freq=freq), shards, fresh=lambda shard: counts_fresh(shard, freq))
+    return combine_shards(counts, merge_counts)
+
+# Recompute the daily mean, EMA and momentum from `from_date` on. Days before
+# it keep their saved values, and the EMA carries on from the last of them, so
+# the work is proportional to the number of days touched.
+def update_ema(rollup, from_date, span=EMA_SPAN):
+    rollup = rollup.copy()
+    rollup['Sentiment_Score'] = rollup['Score_Sum'] / rollup['Total']
+    if 'Sentiment_EMA' not in rollup.columns:
+        rollup['Sentiment_EMA'] = float('nan')
+        rollup['SentimentMomentum'] = float('nan')
+
+    start = int(rollup['Date'].searchsorted(from_date))
+    scores = rollup['Sentiment_Score'].iloc[start:]
+    if start > 0:
+        # Seed the EMA with the last saved value, exactly as if it had never stopped
+        previous = rollup['Sentiment_EMA'].iloc[start - 1]
+        scores = pd.concat([pd.Series([previous]), scores], ignore_index=True)
+    ema = scores.ewm(span=span, adjust=False).mean().to_numpy()
+    momentum = pd.Series(ema).diff().to_numpy()
+    if start > 0:
+        ema, momentum = ema[1:], momentum[1:]
+
+    rollup.loc[rollup.index[start:], 'Sentiment_EMA'] = ema
+    rollup.loc[rollup.index[start:], 'SentimentMomentum'] = momentum
+    return rollup
+
+# Function to update the list of batches in a fresh artifact's metadata,
+# keeping the stored fingerprint instead of hashing the source again
+def write_batches(meta, batches):
+    meta_data = read_meta(meta)
+    meta_data['batches'] = batches
+    write_json(meta, meta_data)
+
+# Function to save the rollup with the fingerprint of its source, the EMA span
+# and the list of batches it already contains. `ingested` saves a rollup the
+# source has not changed under, so its stored fingerprint is kept.
+def save_rollup(rollup, source, batches, ingested=False):
+    rollup_file, meta = rollup_paths(source)
+    tmp = tmp_path(rollup_file)
+    rollup.to_parquet(tmp, index=False)
+    os.replace(tmp, rollup_file)
+    if ingested:
+        write_batches(meta, batches)
+    else:
+        write_meta(meta, source, ema_span=EMA_SPAN, batches=batches)
+
+# Function to check whether a saved rollup was built from the current version
+# of the source, with the same values for `expected` meta keys (e.g. ema_span)
+def rollup_fresh(rollup_file, meta, source, **expected):
+    return (os.path.exists(rollup_file) and is_fresh(meta, source)
+            and all(read_meta(meta).get(key) == value for key, value in expected.items()))
+
+# Function to build the rollup from scratch from every filtered tweet, plus
+# the batches ingested so far
+def build_rollup(source=TWEETS_CSV):
+    counts, batches = replay_batches(merge_counts(None, daily_counts(load_tweets(['Date', 'Sentiment'], source))), source)
+    rollup = update_ema(counts, counts['Date'].min())
+    save_rollup(rollup, source, batches)
+    return rollup
+
+# Load the per-day rollup (built on first use), optionally limited to
+# start <= Date <= end. Columns: Positive/Neutral/Negative/Other/Total counts,
+# Score_Sum, Sentiment_Score (daily mean), Sentiment_EMA and SentimentMomentum.
+# The rollup is rebuilt when the source changes or EMA_SPAN does, and keeps the
+# batches ingested so far. The rollup of
+# a directory or glob of shards is merged from the saved counts of each shard,
+# and its EMA runs over all of them.
+def load_rollup(source=TWEETS_CSV, start=None, end=None):
+    rollup_file, meta = rollup_paths(source)
+    if is_sharded(source):
+        counts = sharded_counts(source)
+        rollup = update_ema(counts, counts['Date'].min())
+    elif not os.path.exists(source):
+        raise FileNotFoundError(f"Filtered file '{source}' not found.")
+    elif rollup_fresh(rollup_file, meta, source, ema_span=EMA_SPAN):
+        rollup = pd.read_parquet(rollup_file)
+    else:
+        rollup = build_rollup(source)
+
+    if start is not None:
+        rollup = rollup[rollup['Date'] >= pd.Timestamp(start)]
+    if end is not None:
+        rollup = rollup[rollup['Date'] <= pd.Timestamp(end)]
+    return rollup.reset_index(drop=True)
+
+# Function to save the hourly rollup with the fingerprint of its source and
+# the list of batches it already contains (`ingested` as for save_rollup)
+def save_hourly_rollup(rollup, source, batches, ingested=False):
+    rollup_file, meta = hourly_rollup_paths(source)
+    tmp = tmp_path(rollup_file)
+    rollup.to_parquet(tmp, index=False)
+    os.replace(tmp, rollup_file)
+    if ingested:
+        write_batches(meta, batches)
+    else:
+        write_meta(meta, source, batches=batches)
+
+# Load the per-hour counts (the rollup's count columns, without the EMA; built
+# on first use), optionally limited to start <= Date <= end. 'Date' is the
+# start of the hour. Rebuilt (with the ingested batches) when the source
+# changes; sharded sources are merged from per-shard counts.
+def load_hourly_rollup(source=TWEETS_CSV, start=None, end=None):
+    rollup_file, meta = hourly_rollup_paths(source)
+    if is_sharded(source):
+        rollup = sharded_counts(source, 'h')
+    elif not os.path.exists(source):
+        raise FileNotFoundError(f"Filtered file '{source}' not found.")
+    elif rollup_fresh(rollup_file, meta, source):
+        rollup = pd.read_parquet(rollup_file)
+    else:
+        counts = merge_counts(None, daily_counts(load_tweets(['Date', 'Sentiment'], source), 'h'))
+        rollup, batches = replay_batches(counts, source, 'h')
+        save_hourly_rollup(rollup, source, batches)
+
+    if start is not None:
+        rollup = rollup[rollup['Date'] >= pd.Timestamp(start)]
+    if end is not None:
+        rollup = rollup[rollup['Date'] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+    return rollup.reset_index(drop=True)
+
+# Add a batch of new tweets (with 'Date' and 'Sentiment') to the saved rollup,
+# and to the hourly rollup when it was built. Only the batch is scanned; the
+# EMA is recomputed from its earliest day on. `batch_id` (e.g. the hash of the
+# batch file) makes re-ingesting a no-op. The batch's counts are saved too, so
+# they are added again when the source changes and the rollups are rebuilt.
+# Sharded sources take new data as new shards instead.
+def ingest_batch(tweets, source=TWEETS_CSV, batch_id=None):
+    if is_sharded(source):
+        raise ValueError(f"Cannot ingest a batch into the sharded source '{source}'; add it as a new shard.")
+    rollup = load_rollup(source)
+    batches = read_meta(rollup_paths(source)[1])['batches']
+    if batch_id is not None and batch_id in batches:
+        return rollup
+
+    tweets = tweets.assign(Date=pd.to_datetime(tweets['Date']))
+    counts = daily_counts(tweets)
+    if counts.empty:
+        return rollup
+    hourly_counts = daily_counts(tweets, 'h')
+    save_batch_counts(counts, source, batch_id)
+    save_batch_counts(hourly_counts, source, batch_id, 'h')
+    rollup = update_ema(merge_counts(rollup, counts), counts['Date'].min())
+    save_rollup(rollup, source, batches + ([batch_id] if batch_id is not None else []), ingested=True)
+
+    hourly_file, hourly_meta_path = hourly_rollup_paths(source)
+    if rollup_fresh(hourly_file, hourly_meta_path, source):
+        hourly_batches = read_meta(hourly_meta_path)['batches']
+        if batch_id is None or batch_id not in hourly_batches:
+            hourly = merge_counts(pd.read_parquet(hourly_file), hourly_counts)
+            save_hourly_rollup(hourly, source, hourly_batches + ([batch_id] if batch_id is not None else []),
+                               ingested=True)
+    return rollup
+
+
+if __name__ == '__main__':
+    # Usage: python sentiment_rollup.py new_tweets.csv [more_tweets.csv ...]
+    if len(sys.argv) < 2:
+        print("Usage: python sentiment_rollup.py NEW_TWEETS.csv [...]")
+        exit()
+
+    for batch_file in sys.argv[1:]:
+        batch = pd.read_csv(batch_file, usecols=['Date', 'Sentiment'], low_memory=False)
+        rollup = ingest_batch(batch, batch_id=file_hash(batch_file))
+        print(f"Ingested {len(batch)} tweets from '{batch_file}'. Rollup covers {len(rollup)} days.")
@@ -0,0 +1,8 @@
+# Sentiment scoring shared by the rollups and the live mode. Kept free of
+# pandas so the live mode starts without importing it.
+
+# Numerical score of each sentiment; any other label scores 0 and is counted as 'Other'
+SENTIMENT_MAP = {'Positive': 1, 'Neutral': 0, 'Negative': -1}
+
+# Span (in days) of the sentiment EMA
+EMA_SPAN = 7
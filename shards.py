@@ -0,0 +1,81 @@
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_utils import source_name
+
+# Files read from a directory of shards; the compression of each shard is
+# inferred from its extension (.gz needs nothing extra, .zst the zstandard package)
+SHARD_PATTERNS = ['*.csv', '*.csv.gz', '*.csv.zst']
+
+# Side files that the filter writes next to its output shards and that are not shards
+# themselves (see streaming.quarantine_path)
+SIDE_FILE_SUFFIXES = ('.quarantine.csv',)
+
+# Worker processes used for the shards (unset or 0 = one per CPU)
+SHARD_WORKERS_ENV = 'EMOJI_SHARD_WORKERS'
+
+# Function to check whether a source names several files: a directory or a
+# glob (e.g. 'tweets/*.csv.gz') rather than one existing file
+def is_sharded(source):
+    source = str(source)
+    return os.path.isdir(source) or (glob.has_magic(source) and not os.path.exists(source))
+
+# Function to list the shard files of a source, sorted by path. Rows are
+# numbered across the shards in this order, so name shards so that they sort
+# by time (e.g. tweets-2019-01.csv.gz). Raises FileNotFoundError when nothing
+# matches, and ValueError when two shards would share cached data.
+def list_shards(source):
+    if os.path.isdir(source):
+        paths = [path for pattern in SHARD_PATTERNS for path in glob.glob(os.path.join(source, pattern))]
+    else:
+        paths = glob.glob(source)
+    paths = sorted(path for path in paths if os.path.isfile(path) and not path.endswith(SIDE_FILE_SUFFIXES))
+    if not paths:
+        raise FileNotFoundError(f"No shards match '{source}'.")
+
+    # Cached data of a shard is named after its file name (see cache_utils.source_name)
+    names = {}
+    for path in paths:
+        name = source_name(path)
+        if name in names:
+            raise ValueError(f"Shards '{names[name]}' and '{path}' have the same name; their cached data would clash.")
+        names[name] = path
+
+    if any(path.endswith('.zst') for path in paths):
+        try:
+            import zstandard  # noqa: F401  (needed by pandas for .zst files)
+        except ImportError:
+            raise ImportError("Reading .zst shards needs the zstandard package (pip install zstandard).") from None
+    return paths
+
+# Function to get the number of worker processes for `n` shards (`workers`
+# overrides $EMOJI_SHARD_WORKERS)
+def shard_workers(n, workers=None):
+    workers = workers or int(os.environ.get(SHARD_WORKERS_ENV) or 0) or os.cpu_count()
+    return max(min(workers, n), 1)
+
+# Run `func` on every shard and return the results in shard order. Shards for
+# which `fresh(shard)` is true (their cached result is up to date) are loaded
+# in this process; the others are processed in a pool of worker processes, so
+# the wall-clock time grows with the new shards per core. Daemon processes
+# (pipeline workers) cannot start a pool and process them one by one.
+def map_shards(func, shards, fresh=None, workers=None):
+    stale = [shard for shard in shards if fresh is None or not fresh(shard)]
+    results = {}
+    workers = shard_workers(len(stale), workers)
+    if len(stale) > 1 and workers > 1 and not multiprocessing.current_process().daemon:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results.update(zip(stale, executor.map(func, stale)))
+    return [results[shard] if shard in results else func(shard) for shard in shards]
+
+# Function to fold the partial results of the shards into one with an
+# associative `combine(earlier, later)`, merging neighbours pairwise so each
+# result is copied about log2(shards) times rather than once per shard
+def combine_shards(partials, combine):
+    partials = list(partials)
+    while len(partials) > 1:
+        paired = [combine(partials[i], partials[i + 1]) for i in range(0, len(partials) - 1, 2)]
+        partials = paired + partials[len(partials) - len(partials) % 2:]
+    return partials[0]
@@ -0,0 +1,354 @@
+import csv
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import COMPRESSION_EXTENSIONS, read_meta, write_json
+
+# Bytes of input handed to the parser at a time
+BLOCK_SIZE = 16 << 20
+
+# Function to get the quarantine file written next to the output
+def quarantine_path(output_path):
+    return f'{os.path.splitext(output_path.rstrip(os.sep))[0]}.quarantine.csv'
+
+# Function to get the checkpoint file of a streaming run
+def checkpoint_path(output_path):
+    return f'{output_path.rstrip(os.sep)}.checkpoint.json'
+
+# Function to open a file for reading bytes, decompressed on the fly when its
+# extension says it is compressed (.gz, .bz2, .xz, .zst, or a .zip of one file)
+def open_decompressed(path):
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        import bz2
+        return bz2.open(path, 'rb')
+    if path.endswith('.xz'):
+        import lzma
+        return lzma.open(path, 'rb')
+    if path.endswith('.zst'):
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    if path.endswith('.zip'):
+        import zipfile
+        archive = zipfile.ZipFile(path)
+        return archive.open(archive.namelist()[0])
+    return open(path, 'rb')
+
+# Reads a file (decompressed, see open_decompressed) and counts the bytes it
+# hands out, so throughput is reported per byte parsed, not per compressed byte
+class CountingReader(io.RawIOBase):
+    def __init__(self, path):
+        self._raw = open_decompressed(path)
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._raw.read(len(buffer))
+        buffer[:len(data)] = data
+        self.bytes_read += len(data)
+        return len(data)
+
+    def close(self):
+        self._raw.close()
+        super().close()
+
+# Collects the malformed lines pyarrow reports (wrong number of fields) into a
+# CSV with their byte offset in the input, CSV row number (header = 1), field
+# counts and raw text. The offset is found by searching the row's text in the
+# memory-mapped input from the previous hit onwards, as bad rows arrive in order.
+# A compressed input is decompressed into a temporary file at the first bad
+# row, so its offsets count bytes of the decompressed text.
+# `state` (from sync()) reopens the file of an interrupted run at that point.
+class Quarantine:
+    def __init__(self, input_path, path, state=None):
+        self.input_path = input_path
+        self.path = path
+        self.rows = 0
+        self.row_base = 0  # Rows before the text being parsed, when it is parsed in blocks
+        self.cursor = 0
+        self._lock = threading.Lock()  # The parser may call us from several threads
+        self._file = None
+        self._map = None
+        if state is None:
+            self._out = open(path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._out)
+            self._writer.writerow(['offset', 'row', 'expected_columns', 'actual_columns', 'text'])
+        else:
+            self._out = open(path, 'r+', newline='', encoding='utf-8')
+            self._out.truncate(state['size'])
+            self._out.seek(state['size'])
+            self._writer = csv.writer(self._out)
+            self.rows = state['rows']
+
+    # Function to map the (decompressed) input on the first bad row
+    def _open_input(self):
+        if self.input_path.endswith(COMPRESSION_EXTENSIONS):
+            self._file = tempfile.TemporaryFile()
+            with open_decompressed(self.input_path) as f:
+                shutil.copyfileobj(f, self._file, 1 << 20)
+            self._file.flush()
+        else:
+            self._file = open(self.input_path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    # Function to find `needle` as a whole line at or after `start` (-1 if absent)
+    def _find_line(self, needle, start):
+        pos = self._map.find(needle, start)
+        while pos >= 0:
+            end = pos + len(needle)
+            if (pos == 0 or self._map[pos - 1:pos] == b'\n') and self._map[end:end + 1] in (b'\n', b'\r', b''):
+                return pos
+            pos = self._map.find(needle, pos + 1)
+        return -1
+
+    def __call__(self, row):
+        needle = row.text.encode('utf-8')
+        with self._lock:
+            if self._map is None:
+                self._open_input()
+            offset = self._find_line(needle, self.cursor)
+            if offset < 0:
+                offset = self._find_line(needle, 0)
+            if offset >= 0:
+                self.cursor = offset + len(needle)
+            number = self.row_base + row.number if row.number is not None else None
+            self._writer.writerow([offset, number, row.expected_columns, row.actual_columns, row.text])
+            self.rows += 1
+        return 'skip'
+
+    # Function to flush the file and describe what has been written so far
+    def sync(self):
+        self._out.flush()
+        return {'size': self._out.tell(), 'rows': self.rows}
+
+    def close(self):
+        self._out.close()
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+
+# Function to count the double quotes in data[start:end] without copying it
+def count_quotes(data, start, end):
+    return int(np.count_nonzero(np.frombuffer(data, np.uint8, end - start, start) == ord('"')))
+
+# Function to find the end of the CSV record that contains byte `pos`: the
+# first newline after it that is not inside a quoted value. `start` must be a
+# record boundary, so quotes are balanced where the count begins.
+def record_end(data, start, pos):
+    end = data.find(b'\n', pos)
+    if end < 0:
+        return len(data)
+    quotes = count_quotes(data, start, end)
+    while quotes % 2:
+        next_end = data.find(b'\n', end + 1)
+        if next_end < 0:
+            return len(data)
+        quotes += count_quotes(data, end, next_end)
+        end = next_end
+    return end + 1
+
+# Function to let the OS drop the mapped pages of data[start:end] that are
+# already parsed, so the resident size does not grow with the input
+def release_pages(data, start, end):
+    if isinstance(data, mmap.mmap) and hasattr(mmap, 'MADV_DONTNEED'):
+        first = start - start % mmap.PAGESIZE
+        last = end - end % mmap.PAGESIZE
+        if last > first:
+            data.madvise(mmap.MADV_DONTNEED, first, last - first)
+
+# Yield (start, end) byte ranges of about `block_size` that each hold whole CSV
+# records, from `offset` (a record boundary past the header) to the end of `data`
+def iter_blocks(data, offset, block_size=BLOCK_SIZE):
+    while offset < len(data):
+        end = record_end(data, offset, min(offset + block_size, len(data)))
+        yield offset, end
+        offset = end
+
+# Function to split the header line off a memory-mapped CSV: (column names, first data byte)
+def read_header(data):
+    end = record_end(data, 0, 0)
+    return list(pd.read_csv(io.BytesIO(data[:end]), nrows=0).columns), end
+
+# Function to parse one block of whole records into a frame of strings. With
+# the arrow engine, malformed lines go to `quarantine` (or are skipped without
+# one); pandas skips them.
+def parse_block(data, start, end, columns, quarantine=None, engine='arrow'):
+    if engine != 'arrow':
+        return pd.read_csv(io.BytesIO(data[start:end]), names=columns, header=None, dtype=str,
+                           on_bad_lines='skip')
+
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    # The streaming reader reports row numbers for malformed lines; read_csv does not
+    reader = pv.open_csv(
+        pa.py_buffer(memoryview(data)[start:end]),
+        read_options=pv.ReadOptions(column_names=columns, use_threads=True),
+        parse_options=pv.ParseOptions(newlines_in_values=True,
+                                      invalid_row_handler=quarantine or (lambda row: 'skip')),
+        convert_options=pv.ConvertOptions(column_types={col: pa.string() for col in columns},
+                                          strings_can_be_null=True, quoted_strings_can_be_null=False),
+    )
+    return reader.read_all().to_pandas()
+
+
+# Appends chunks to a CSV file. The file size is part of the checkpoint, so a
+# resumed run can cut off anything written after the last checkpoint.
+class CSVSink:
+    def __init__(self, path, state=None):
+        self.path = path
+        if state is None:
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+        else:
+            self._file = open(path, 'r+', newline='', encoding='utf-8')
+            self._file.truncate(state['size'])
+            self._file.seek(state['size'])
+
+    def write(self, chunk):
+        chunk.to_csv(self._file, index=False, header=self._file.tell() == 0)
+
+    # Function to flush to disk and describe what has been written so far
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'size': self._file.tell()}
+
+    def close(self):
+        self._file.close()
+
+
+# Writes each chunk as one Parquet file (a row group) in the directory `path`,
+# which pandas and pyarrow read as one dataset. Every column is stored as a
+# string so the parts share one schema. Parts past the checkpoint are removed.
+class ParquetSink:
+    def __init__(self, path, state=None):
+        self.path = path
+        self.parts = state['parts'] if state else 0
+        if state is None:
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+        for name in os.listdir(path):
+            if name.startswith('part-') and int(name[5:10]) >= self.parts:
+                os.remove(os.path.join(path, name))
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if chunk.empty:
+            return
+        schema = pa.schema([(str(col), pa.string()) for col in chunk.columns])
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        pq.write_table(table, os.path.join(self.path, f'part-{self.parts:05d}.parquet'))
+        self.parts += 1
+
+    def sync(self):
+        return {'parts': self.parts}
+
+    def close(self):
+        pass
+
+# Function to open the sink for an output name ('.parquet' = Parquet directory)
+def open_sink(output_path, state=None):
+    if output_path.rstrip(os.sep).endswith('.parquet'):
+        return ParquetSink(output_path.rstrip(os.sep), state)
+    return CSVSink(output_path, state)
+
+
+# Stream `input_path` through `transform` (a picklable function from a frame
+# of string columns to the frame to keep) into `output_path`, one block of
+# whole records at a time. After every block is written the output is synced
+# and a checkpoint with the input byte offset is saved; when a checkpoint of
+# the same input exists, the run resumes from it. The input is memory-mapped,
+# so memory stays bounded by the blocks in flight (`workers * 2` in parallel).
+# Blocks are parsed with pyarrow (engine='arrow'), whose malformed lines go to
+# `quarantine_file` when given, or with pandas (any other engine).
+# Returns (rows read, rows written, quarantined rows, (rows read, byte offset)
+# where this run started); the totals include the rows of a resumed run, so
+# throughput is computed from what this run added past its start.
+def stream_process(input_path, output_path, transform, block_size=BLOCK_SIZE, workers=1, engine='arrow',
+                   quarantine_file=None, resume=True):
+    checkpoint = checkpoint_path(output_path)
+    stat = os.stat(input_path)
+    source = {'input': os.path.abspath(input_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    state = read_meta(checkpoint) if resume else None
+    if state is not None and (state['source'] != source or not os.path.exists(output_path)
+                              or (quarantine_file is not None and engine == 'arrow') != (state['quarantine'] is not None)):
+        state = None
+    if state:
+        print(f"Resuming '{input_path}' at byte {state['offset']:,} ({state['rows_read']} rows already read).")
+
+    sink = open_sink(output_path, state and state['sink'])
+    quarantine = None
+    if quarantine_file is not None and engine == 'arrow':
+        quarantine = Quarantine(input_path, quarantine_file, state and state['quarantine'])
+    rows_read = state['rows_read'] if state else 0
+    rows_written = state['rows_written'] if state else 0
+    resumed = (rows_read, state['offset'] if state else 0)
+    parsed = rows_read  # Rows parsed, including blocks still in flight
+
+    with open(input_path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+        columns, first = read_header(data) if stat.st_size else ([], 0)
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        pending = deque()
+
+        # Write the oldest block in flight, then checkpoint the input up to its end
+        def write_next():
+            nonlocal rows_read, rows_written
+            end, rows, quarantine_state, result = pending.popleft()
+            result = result.result() if executor is not None else result
+            sink.write(result)
+            rows_read += rows
+            rows_written += len(result)
+            write_json(checkpoint, {
+                'source': source, 'offset': end, 'rows_read': rows_read, 'rows_written': rows_written,
+                'sink': sink.sync(), 'quarantine': quarantine_state,
+            })
+
+        try:
+            for start, end in iter_blocks(data, state['offset'] if state else first, block_size):
+                if quarantine is not None:
+                    quarantine.row_base = parsed + quarantine.rows + 1  # + 1 for the header
+                    quarantine.cursor = start
+                chunk = parse_block(data, start, end, columns, quarantine, engine)
+                parsed += len(chunk)
+                release_pages(data, start, end)
+                quarantine_state = quarantine.sync() if quarantine is not None else None
+                pending.append((end, len(chunk), quarantine_state,
+                                executor.submit(transform, chunk) if executor else transform(chunk)))
+                if len(pending) >= (workers * 2 if executor else 1):
+                    write_next()
+            while pending:
+                write_next()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            sink.close()
+            if quarantine is not None:
+                quarantine.close()
+            if isinstance(data, mmap.mmap):
+                try:
+                    data.close()
+                except BufferError:  # A parser error still references the map; it is freed with it
+                    pass
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return rows_read, rows_written, quarantine.rows if quarantine is not None else 0, resumed
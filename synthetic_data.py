@@ -0,0 +1,120 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Emojis drawn into synthetic tweets, most popular first (usage follows a Zipf
+# law over this list). Includes multi-codepoint ones: flags, ZWJ sequences,
+# keycaps and emojis with a variation selector.
+EMOJIS = [
+    '🚀', '😂', '🔥', '💰', '📈', '🤣', '👍', '💎', '🙌', '😍', '📉', '😭', '🤔', '💯', '✅',
+    '❤️', '👀', '🌙', '🐂', '🐻', '💸', '🤑', '😎', '🙏', '⚡', '👇', '🎉', '😱', '💪', '🤝',
+    '🇺🇸', '🇯🇵', '🇰🇷', '👨‍💻', '🏳️‍🌈', '1️⃣', '#️⃣', '©', '⬆️', '⬇️', '⚠️', '☕', '🪙', '🧠', '🦍',
+]
+WORDS = ['bitcoin', 'btc', 'price', 'moon', 'hodl', 'buy', 'sell', 'dip', 'pump', 'dump', 'crypto',
+         'market', 'bull', 'bear', 'today', 'chart', 'long', 'short', 'whale', 'exchange', 'halving',
+         'block', 'wallet', 'mining', 'news', 'rally', 'support', 'resistance', '#BTC', '$BTC']
+SENTIMENTS = ['Positive', 'Neutral', 'Negative']
+
+# Share of raw tweets with at least one emoji, and emojis per emoji tweet
+EMOJI_SHARE = 0.3
+MEAN_EMOJIS = 1.8
+
+# Function to build a pool of tweet texts; rows are later drawn from the pool,
+# so generating 100M rows costs no more Python string work than 10k rows
+def tweet_pool(rng, size=20_000, emoji_share=EMOJI_SHARE):
+    zipf = 1.0 / np.arange(1, len(EMOJIS) + 1)
+    zipf /= zipf.sum()
+    n_words = rng.integers(4, 25, size)
+    n_emojis = np.where(rng.random(size) < emoji_share, 1 + rng.poisson(MEAN_EMOJIS - 1, size), 0)
+
+    texts = []
+    for words, emojis in zip(n_words, n_emojis):
+        tokens = list(rng.choice(WORDS, words))
+        for emoji_char in rng.choice(EMOJIS, emojis, p=zipf):
+            tokens.insert(int(rng.integers(0, len(tokens) + 1)), emoji_char)
+        texts.append(' '.join(tokens))
+    return np.array(texts, dtype=object)
+
+# Write `n_rows` synthetic raw tweets with the columns of Bitcointweets.csv:
+# Date, text, Sentiment plus the author's name, followers and likes
+def write_tweets(path, n_rows, seed=0, start='2019-01-01', days=365, chunk_rows=1_000_000,
+                 emoji_share=EMOJI_SHARE):
+    rng = np.random.default_rng(seed)
+    pool = tweet_pool(rng, emoji_share=emoji_share)
+    authors = np.array([f'user{i}' for i in range(max(n_rows // 20, 1))], dtype=object)
+    followers = np.floor(rng.pareto(1.2, len(authors)) * 100).astype(np.int64)
+    first_day = pd.Timestamp(start)
+
+    for offset in range(0, n_rows, chunk_rows):
+        n = min(chunk_rows, n_rows - offset)
+        author = rng.integers(0, len(authors), n)
+        day = np.sort(rng.integers(0, days, n)) if n_rows <= chunk_rows else \
+            (offset + np.arange(n)) * days // n_rows
+        chunk = pd.DataFrame({
+            'Date': (first_day + pd.to_timedelta(day, unit='D')).strftime('%Y-%m-%d'),
+            'text': pool[rng.integers(0, len(pool), n)],
+            'Sentiment': np.array(SENTIMENTS, dtype=object)[rng.choice(3, n, p=[0.45, 0.35, 0.2])],
+            'user_name': authors[author],
+            'user_followers': followers[author],
+            'likes': rng.poisson(3, n),
+        })
+        chunk.to_csv(path, mode='w' if offset == 0 else 'a', header=offset == 0, index=False)
+
+# Write `n_rows` minutes of synthetic BTC/USD OHLCV in the layout of
+# BTC-2019min.csv: newest minute first, with 'unix', 'date' and 'Volume BTC'
+def write_btc_minutes(path, n_rows, seed=0, start='2019-01-01', chunk_rows=1_000_000):
+    rng = np.random.default_rng(seed + 1)
+    first_minute = pd.Timestamp(start)
+    close = 8000.0
+
+    # Generate from the newest minute backwards so the file can be written in order
+    for n_written in range(0, n_rows, chunk_rows):
+        n = min(chunk_rows, n_rows - n_written)
+        index = n_rows - 1 - n_written - np.arange(n)
+        steps = rng.normal(0, 0.0008, n)
+        closes = close * np.exp(np.cumsum(steps))
+        close = closes[-1]
+        opens = closes * np.exp(rng.normal(0, 0.0003, n))
+        spread = np.abs(rng.normal(0, 0.0005, n)) * closes
+        volume = rng.lognormal(0, 1.2, n)
+        minutes = first_minute + pd.to_timedelta(index, unit='min')
+        chunk = pd.DataFrame({
+            'unix': (minutes - pd.Timestamp('1970-01-01')) // pd.Timedelta(seconds=1),
+            'date': minutes.strftime('%Y-%m-%d %H:%M:%S'),
+            'symbol': 'BTC/USD',
+            'open': opens.round(2),
+            'high': (np.maximum(opens, closes) + spread).round(2),
+            'low': (np.minimum(opens, closes) - spread).round(2),
+            'close': closes.round(2),
+            'Volume BTC': volume.round(6),
+            'Volume USD': (volume * closes).round(2),
+        })
+        chunk.to_csv(path, mode='w' if n_written == 0 else 'a', header=n_written == 0, index=False)
+
+# Write a synthetic daily VCRIX series ('date', 'vcrix')
+def write_vcrix(path, days=730, seed=0, start='2018-06-01'):
+    rng = np.random.default_rng(seed + 2)
+    vcrix = 60 * np.exp(np.cumsum(rng.normal(0, 0.03, days)))
+    dates = pd.date_range(start, periods=days, freq='D')
+    pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'vcrix': vcrix.round(4)}).to_csv(path, index=False)
+
+# Write a full dataset in the directory layout the analysis scripts expect
+def make_dataset(out_dir, tweets=100_000, minutes=525_600, seed=0):
+    os.makedirs(os.path.join(out_dir, 'BTC'), exist_ok=True)
+    os.makedirs(os.path.join(out_dir, 'BTCVCRIX'), exist_ok=True)
+    write_tweets(os.path.join(out_dir, 'Bitcointweets.csv'), tweets, seed)
+    write_btc_minutes(os.path.join(out_dir, 'BTC', 'BTC-2019min.csv'), minutes, seed)
+    write_vcrix(os.path.join(out_dir, 'BTCVCRIX', '2024-01-27 vcrix.csv'), seed=seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic dataset.")
+    parser.add_argument('out_dir')
+    parser.add_argument('--tweets', type=int, default=100_000)
+    parser.add_argument('--minutes', type=int, default=525_600)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    make_dataset(args.out_dir, args.tweets, args.minutes, args.seed)
+    print(f"Synthetic dataset written to '{args.out_dir}'.")
@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import cache_path, is_fresh, read_meta, source_name, write_meta
+from instrument import span
+from partitions import finish_partitions, read_range, read_rows, start_partitions, write_partitions
+from shards import is_sharded, list_shards, map_shards
+
+# Default location of the output of filter.py
+TWEETS_CSV = 'filtered_file.csv'
+
+# Function to get the paths of the partitioned store and its metadata for a source CSV
+def store_paths(source):
+    name = source_name(source)
+    return cache_path(name), cache_path(f'{name}.meta.json')
+
+# Function to get the column names of a tweet CSV (or of the first shard of a
+# sharded source) without reading its rows
+def tweet_columns(source=TWEETS_CSV):
+    if is_sharded(source):
+        source = list_shards(source)[0]
+    return list(pd.read_csv(source, nrows=0).columns)
+
+# Function to parse the filtered CSV once into typed columns. 'row_id' keeps
+# each tweet's position in the CSV, which is what the emoji index refers to.
+def read_tweets_csv(source):
+    with span('tweets:read_csv') as s:
+        df = pd.read_csv(source, low_memory=False)  # Suppress DtypeWarning
+        s.rows = len(df)
+    with span('tweets:to_datetime', rows=len(df)):
+        df['Date'] = pd.to_datetime(df['Date'])
+    df['Sentiment'] = df['Sentiment'].astype('category')
+
+    # Parquet needs one type per column, so mixed object columns become strings
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].astype('string')
+    df['row_id'] = np.arange(len(df), dtype=np.int64)
+    return df
+
+# Function to (re)build the store from the source CSV, one Parquet file per month
+def build_store(source=TWEETS_CSV):
+    store, meta = store_paths(source)
+    df = read_tweets_csv(source)
+    tmp_dir = start_partitions(store, 'Date', freq='M')
+    write_partitions(df, tmp_dir)
+    finish_partitions(tmp_dir, store)
+    write_meta(meta, source, rows=len(df))
+    return df
+
+# Function to apply the same column selection and date range to an in-memory frame
+def select_tweets(df, columns, start, end):
+    if start is not None:
+        df = df[df['Date'] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df['Date'] <= pd.Timestamp(end)]
+    if columns is None:
+        columns = [col for col in df.columns if col != 'row_id']
+    return df[list(columns)].reset_index(drop=True)
+
+# Function to check whether the store of a source file is up to date
+def store_fresh(source):
+    store, meta = store_paths(source)
+    return os.path.isdir(store) and is_fresh(meta, source)
+
+# Function to count the rows of one shard, building its store first when it is
+# missing or out of date (runs in the shard workers)
+def shard_rows(shard):
+    if store_fresh(shard):
+        return read_meta(store_paths(shard)[1])['rows']
+    return len(load_tweets(['row_id'], shard))
+
+# Function to get the first 'row_id' of every shard: the stores of new or
+# changed shards are built in parallel, and rows are numbered across the
+# shards in order
+def shard_offsets(shards):
+    rows = map_shards(shard_rows, shards, fresh=store_fresh)
+    return np.concatenate([[0], np.cumsum(rows[:-1], dtype=np.int64)]).astype(np.int64)
+
+# Load the tweets of a sharded source (a directory or glob of CSV files, see
+# shards.py) as one frame, shard after shard, like load_tweets. 'row_id'
+# counts the rows of all shards, so it matches the sharded emoji index.
+def load_sharded_tweets(columns=None, source=TWEETS_CSV, start=None, end=None):
+    shards = list_shards(source)
+    offsets = shard_offsets(shards)
+    frames = []
+    for shard, offset in zip(shards, offsets):
+        df = load_tweets(columns, shard, start, end)
+        if 'row_id' in df.columns:
+            df['row_id'] += offset
+        frames.append(df)
+
+    df = pd.concat([frame for frame in frames if len(frame)] or frames[:1], ignore_index=True)
+    # Categories can differ between shards, which makes concat fall back to object
+    for col in frames[0].select_dtypes('category').columns:
+        df[col] = df[col].astype('category')
+    return df
+
+# Load the filtered tweets with only the requested columns, optionally limited
+# to start <= Date <= end. The CSV is parsed only when the store is missing or
+# the source file changed since it was built; otherwise only the monthly
+# partitions overlapping the range are read. Rows keep their CSV order; ask for
+# 'row_id' to get each row's position in the CSV. A directory or glob of
+# shards is read with load_sharded_tweets.
+def load_tweets(columns=None, source=TWEETS_CSV, start=None, end=None):
+    if is_sharded(source):
+        return load_sharded_tweets(columns, source, start, end)
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Filtered file '{source}' not found.")
+
+    try:
+        import pyarrow  # noqa: F401  (needed by pandas for Parquet)
+    except ImportError:
+        print("pyarrow is not installed; reading the CSV without the columnar cache.")
+        return select_tweets(read_tweets_csv(source), columns, start, end)
+
+    store, meta = store_paths(source)
+    if not (os.path.isdir(store) and is_fresh(meta, source)):
+        return select_tweets(build_store(source), columns, start, end)
+
+    df = read_range(store, start, end, columns, sort_by='row_id')
+    if columns is None:
+        df = df.drop(columns='row_id')
+    return df
+
+# Load only the tweets with the given 'row_id's (sorted), with the requested
+# columns, straight from the store: no other rows are converted, and only the
+# row groups holding them are decoded. Sharded sources (and installs without
+# pyarrow) fall back to slicing load_tweets().
+def load_tweet_rows(row_ids, columns=None, source=TWEETS_CSV):
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    read_columns = list(dict.fromkeys((tweet_columns(source) if columns is None else list(columns)) + ['row_id']))
+    try:
+        import pyarrow  # noqa: F401  (needed to scan the store)
+        sliced = is_sharded(source)
+    except ImportError:
+        sliced = True
+
+    if sliced or not store_fresh(source):
+        # Also builds a missing store, so later calls read the rows directly
+        df = load_tweets(read_columns, source)
+        df = df.iloc[np.searchsorted(df['row_id'].to_numpy(), row_ids)].reset_index(drop=True)
+    else:
+        df = read_rows(store_paths(source)[0], 'row_id', row_ids, read_columns)
+    if columns is None:
+        return df.drop(columns='row_id')
+    return df[list(columns)]
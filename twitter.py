@@ -1,19 +1,82 @@
+import argparse
+from functools import partial
+
 import pandas as pd
 
-# Initialize an empty list to store filtered chunks
-filtered_chunks = []
+from influence_columns import INFLUENCE_COLUMNS
+from streaming import BLOCK_SIZE, quarantine_path, stream_process
+from tweet_store import tweet_columns
+
+# Function to keep the given columns of a chunk (picklable for worker processes)
+def select_columns(chunk, columns):
+    return chunk[list(columns)]
+
+# Function to add the author and follower/engagement columns the input has to
+# the requested ones, so influence weighting still works on the output
+def with_influence_columns(input_path, columns):
+    header = tweet_columns(input_path)
+    return list(columns) + [col for col in INFLUENCE_COLUMNS if col in header and col not in columns]
+
+# Keep only some columns of a large tweet CSV, reading it in chunks
+def extract_columns(input_path="twitter_data.csv", output_path="filtered_twitter_data.csv",
+                    columns=('date', 'msg'), chunksize=100000, keep_influence=True):  # Adjust chunksize as needed
+    if keep_influence:
+        columns = with_influence_columns(input_path, columns)
+
+    # Initialize an empty list to store filtered chunks
+    filtered_chunks = []
+
+    # Read the CSV file in chunks
+    for chunk in pd.read_csv(input_path, chunksize=chunksize):
+        # Filter the chunk
+        filtered_chunk = chunk[list(columns)]  # Adjust column names as needed
+        # Append the filtered chunk to the list
+        filtered_chunks.append(filtered_chunk)
+
+    # Combine all filtered chunks into a single DataFrame
+    filtered_df = pd.concat(filtered_chunks, ignore_index=True)
+
+    # Save the filtered data to a new CSV file
+    filtered_df.to_csv(output_path, index=False)
 
-# Read the CSV file in chunks
-for chunk in pd.read_csv("twitter_data.csv", chunksize=100000):  # Adjust chunksize as needed
-    # Filter the chunk
-    filtered_chunk = chunk[['date', 'msg']]  # Adjust column names as needed
-    # Append the filtered chunk to the list
-    filtered_chunks.append(filtered_chunk)
+    print(f"Filtered data saved to '{output_path}'.")
+    return filtered_df
 
-# Combine all filtered chunks into a single DataFrame
-filtered_df = pd.concat(filtered_chunks, ignore_index=True)
+# Same as extract_columns, but each block is appended to the output (CSV, or a
+# directory of Parquet parts for a .parquet output) and checkpointed, so memory
+# stays flat and an interrupted run resumes where it stopped. With pyarrow,
+# malformed lines go to <output>.quarantine.csv. Returns the rows written.
+def extract_columns_streaming(input_path="twitter_data.csv", output_path="filtered_twitter_data.csv",
+                              columns=('date', 'msg'), block_size=BLOCK_SIZE, resume=True, keep_influence=True):
+    if keep_influence:
+        columns = with_influence_columns(input_path, columns)
+    try:
+        import pyarrow  # noqa: F401
+        engine = 'arrow'
+    except ImportError:
+        engine = 'python'
+    rows_read, rows_written, quarantined, _ = stream_process(
+        input_path, output_path, partial(select_columns, columns=columns), block_size, engine=engine,
+        quarantine_file=quarantine_path(output_path), resume=resume)
+    print(f"Filtered data saved to '{output_path}'.")
+    if quarantined:
+        print(f"Quarantined {quarantined} malformed lines in '{quarantine_path(output_path)}'.")
+    return rows_written
 
-# Save the filtered data to a new CSV file
-filtered_df.to_csv("filtered_twitter_data.csv", index=False)
 
-print("Filtered data saved to 'filtered_twitter_data.csv'.")
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Keep only some columns of a large tweet CSV.")
+    parser.add_argument('--input', default='twitter_data.csv')
+    parser.add_argument('--output', default='filtered_twitter_data.csv')
+    parser.add_argument('--columns', nargs='+', default=['date', 'msg'])
+    parser.add_argument('--stream', action='store_true',
+                        help="Append each block to the output and checkpoint it; resumes an interrupted run")
+    parser.add_argument('--no-influence', action='store_true',
+                        help="Drop the author and follower/engagement columns instead of keeping them")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint of an interrupted --stream run")
+    args = parser.parse_args()
+    if args.stream:
+        extract_columns_streaming(args.input, args.output, args.columns, resume=not args.restart,
+                                  keep_influence=not args.no_influence)
+    else:
+        extract_columns(args.input, args.output, args.columns, keep_influence=not args.no_influence)
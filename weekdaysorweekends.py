@@ -1,39 +1,72 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-
-# Step 1: Load the Twitter dataset
-try:
-    df = pd.read_csv('filtered_file.csv', low_memory=False)
-except FileNotFoundError:
-    print("File 'twitter_data.csv' not found.")
-    exit()
-
-# Step 2: Convert 'Date' to datetime and filter by date range (2019-05-27 to 2019-11-23)
-df['Date'] = pd.to_datetime(df['Date'])
-df = df[(df['Date'] >= '2019-05-27') & (df['Date'] <= '2019-11-23')]
-
-# Step 3: Convert sentiment to numerical scores
-sentiment_map = {'Positive': 1, 'Neutral': 0, 'Negative': -1}
-df['SentimentScore'] = df['Sentiment'].map(sentiment_map).fillna(0)  # Default to 0 for unknown sentiments
-
-# Step 4: Create a column to identify weekdays (0-4) and weekends (5-6)
-df["DayOfWeek"] = df["Date"].dt.dayofweek
-df["Weekend"] = df["DayOfWeek"].apply(lambda x: "Weekend" if x >= 5 else "Weekday")
-
-# Step 5: Compute average sentiment score for weekdays and weekends
-sentiment_weekend = df.groupby("Weekend")["SentimentScore"].mean()
-
-# Step 6: Bar Chart
-plt.figure(figsize=(6, 4))
-sentiment_weekend.plot(kind="bar", color=["blue", "orange"])
-plt.xlabel("Day Type")
-plt.ylabel("Average Sentiment Score")
-plt.title("Weekend vs. Weekday Sentiment Score (2019-05-27 to 2019-11-23)")
-plt.xticks(rotation=0)  # Ensure labels are horizontal for clarity
-plt.grid(axis='y', linestyle='--', linewidth=0.5)
-plt.tight_layout()
-plt.show()
-
-# Step 7: Optional - Print the results for inspection
-print("Average Sentiment Score by Day Type:")
-print(sentiment_weekend)
\ No newline at end of file
+
+from calendar_buckets import sentiment_breakdown
+from datasets import Datasets
+from influencers import FOLLOWERS_COLUMN, influence_weights
+from render import show_figure
+from sentiment_rollup import SENTIMENT_MAP
+
+# Inputs this analysis reads from Datasets (loaded up front by pipeline.py)
+INPUTS = ['rollup', 'influence']
+
+
+# Function to get the average sentiment score of weekdays and weekends with
+# each tweet weighted by its author's reach, log(1 + followers)
+def weighted_weekend_scores(tweets):
+    weights = pd.Series(influence_weights(tweets, 'followers'))
+    weekend = np.where(tweets['Date'].dt.dayofweek >= 5, "Weekend", "Weekday")
+    scores = tweets['Sentiment'].map(SENTIMENT_MAP).astype(float).fillna(0)
+    weight_sums = weights.groupby(weekend).sum()
+    return (scores * weights).groupby(weekend).sum() / weight_sums.where(weight_sums > 0)
+
+
+# Run the analysis on the shared inputs (loaded on demand when run on its own)
+def run(data=None):
+    data = data or Datasets()
+
+    # Step 1: Load the daily sentiment rollup (2019-05-27 to 2019-11-23)
+    try:
+        rollup = data.rollup()
+    except FileNotFoundError:
+        print("File 'twitter_data.csv' not found.")
+        return
+
+    # Step 2: Sentiment scores are Positive = 1, Neutral = 0, Negative = -1 (0 for unknown
+    # sentiments); the rollup holds each day's tweet count and score sum
+
+    # Step 3: Label each day as weekday (0-4) or weekend (5-6) and
+    # Step 4: compute the average sentiment score of the tweets of weekdays and weekends,
+    # with a 95% bootstrap interval from resampling days
+    breakdown = sentiment_breakdown(rollup, 'weekend')
+    sentiment_weekend = breakdown['Score'].rename('SentimentScore').rename_axis('Weekend')
+
+    # Step 5: Bar Chart (matplotlib is only imported to draw)
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(6, 4))
+    errors = [sentiment_weekend - breakdown['CI_Low'], breakdown['CI_High'] - sentiment_weekend]
+    sentiment_weekend.plot(kind="bar", color=["blue", "orange"], yerr=errors, capsize=4)
+    plt.xlabel("Day Type")
+    plt.ylabel("Average Sentiment Score")
+    plt.title("Weekend vs. Weekday Sentiment Score (2019-05-27 to 2019-11-23)")
+    plt.xticks(rotation=0)  # Ensure labels are horizontal for clarity
+    plt.grid(axis='y', linestyle='--', linewidth=0.5)
+    plt.tight_layout()
+    show_figure('weekdaysorweekends')
+
+    # Step 6: Optional - Print the results for inspection
+    print("Average Sentiment Score by Day Type:")
+    print(sentiment_weekend)
+    print(breakdown[['CI_Low', 'CI_High', 'Tweets']])
+
+    # Step 7: The same averages with each tweet weighted by its author's reach,
+    # log(1 + followers), when the data has follower counts
+    tweets = data.influence()
+    if FOLLOWERS_COLUMN in tweets.columns:
+        print("Influence-Weighted Average Sentiment Score by Day Type:")
+        print(weighted_weekend_scores(tweets))
+
+
+if __name__ == '__main__':
+    run()
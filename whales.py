@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+# Share of the largest minutes that count as whale activity
+WHALE_SHARE = 0.05
+
+# Function to mark the int(n * share) largest values, in O(n) with
+# np.argpartition instead of sorting everything. NaN values rank below every
+# number and are never marked, as they sorted last in the old descending sort.
+def top_share_mask(values, share=WHALE_SHARE):
+    values = np.asarray(values, dtype=float)
+    k = int(len(values) * share)
+    mask = np.zeros(len(values), dtype=bool)
+    if k > 0:
+        missing = np.isnan(values)
+        ranked = np.where(missing, -np.inf, values)
+        mask[np.argpartition(ranked, len(values) - k)[len(values) - k:]] = True
+        mask &= ~missing
+    return mask
+
+# Per-day whale volume and whale minute count from minute rows with 'date' and
+# `value_col`. The whale cutoff is either one global top share of all minutes
+# ('global'), the top share of each day ('day'), or the (1 - share) quantile of
+# the trailing `window` minutes ('rolling', e.g. window='1D'; needs time-sorted rows).
+def daily_whale_volume(minutes, share=WHALE_SHARE, threshold='global', window='1D', value_col='Volume_USD'):
+    values = minutes[value_col].to_numpy(dtype=float)
+    day = minutes['date'].dt.normalize()
+
+    if threshold == 'global':
+        whale = top_share_mask(values, share)
+    elif threshold == 'day':
+        whale = minutes[value_col].groupby(day).transform(lambda v: top_share_mask(v.to_numpy(), share))
+        whale = whale.to_numpy(dtype=bool)
+    elif threshold == 'rolling':
+        cutoff = minutes.set_index('date')[value_col].rolling(window).quantile(1 - share).to_numpy()
+        whale = values > cutoff
+    else:
+        raise ValueError(f"Unknown whale threshold '{threshold}'.")
+
+    day_codes, days = pd.factorize(day, sort=True)
+    result = pd.DataFrame({
+        'date': days,
+        value_col: np.bincount(day_codes[whale], weights=values[whale], minlength=len(days)),
+        'whale_count': np.bincount(day_codes[whale], minlength=len(days)),
+    })
+    return result[result['whale_count'] > 0].reset_index(drop=True)
+
+# One-pass approximate whale detector for chunked input. Each day keeps a
+# histogram of log-spaced value bins (count and sum per bin), so memory is
+# bounded by days x bins no matter how many minutes are fed in. The top-share
+# cutoff is located in the merged histogram and the bin it falls into is split
+# proportionally across days, so the cutoff is within one bin width (~3.7%) of
+# exact; days with many minutes near the cutoff carry the most error.
+class WhaleSketch:
+    def __init__(self, bins_per_decade=64, low=1e-2, high=1e12):
+        self.bins_per_decade = bins_per_decade
+        self.low = low
+        self.n_bins = int(np.ceil(np.log10(high / low) * bins_per_decade)) + 1
+        self.counts = {}
+        self.sums = {}
+
+    # Function to add a chunk of minute rows ('date' and `value_col`)
+    def update(self, chunk, value_col='Volume_USD'):
+        values = chunk[value_col].to_numpy(dtype=float)
+        bins = np.clip(np.floor(np.log10(np.maximum(values, self.low) / self.low) * self.bins_per_decade),
+                       0, self.n_bins - 1).astype(np.int64)
+        day_codes, days = pd.factorize(chunk['date'].dt.normalize())
+        flat = day_codes * self.n_bins + bins
+        size = len(days) * self.n_bins
+        counts = np.bincount(flat, minlength=size).reshape(len(days), self.n_bins)
+        sums = np.bincount(flat, weights=values, minlength=size).reshape(len(days), self.n_bins)
+        for i, day in enumerate(days):
+            if day in self.counts:
+                self.counts[day] += counts[i]
+                self.sums[day] += sums[i]
+            else:
+                self.counts[day] = counts[i]
+                self.sums[day] = sums[i]
+        return self
+
+    # Function to fold another sketch (e.g. from another file or process) into this one
+    def merge(self, other):
+        for day, counts in other.counts.items():
+            if day in self.counts:
+                self.counts[day] = self.counts[day] + counts
+                self.sums[day] = self.sums[day] + other.sums[day]
+            else:
+                self.counts[day] = counts.copy()
+                self.sums[day] = other.sums[day].copy()
+        return self
+
+    # Function to take the top `share` of a histogram: the weight each bin
+    # contributes (1 above the cutoff bin, a fraction in it, 0 below)
+    @staticmethod
+    def _top_weights(counts, share):
+        k = int(counts.sum() * share)
+        weights = np.zeros(len(counts))
+        if k == 0:
+            return weights
+        from_top = np.cumsum(counts[::-1])[::-1]  # minutes in this bin or above
+        cutoff = int(np.flatnonzero(from_top >= k)[-1])
+        weights[cutoff + 1:] = 1.0
+        above = from_top[cutoff + 1] if cutoff + 1 < len(counts) else 0
+        weights[cutoff] = (k - above) / counts[cutoff]
+        return weights
+
+    # Per-day whale volume and (approximate) whale minute count, with either one
+    # global cutoff over all days ('global') or a cutoff per day ('day')
+    def whale_volume(self, share=WHALE_SHARE, threshold='global', value_col='Volume_USD'):
+        days = sorted(self.counts)
+        counts = np.array([self.counts[day] for day in days]).reshape(len(days), self.n_bins)
+        sums = np.array([self.sums[day] for day in days]).reshape(len(days), self.n_bins)
+        if threshold == 'global':
+            weights = np.tile(self._top_weights(counts.sum(axis=0), share), (len(days), 1))
+        elif threshold == 'day':
+            weights = np.array([self._top_weights(day_counts, share) for day_counts in counts])
+        else:
+            raise ValueError(f"Unknown whale threshold '{threshold}'.")
+
+        result = pd.DataFrame({
+            'date': pd.DatetimeIndex(days),
+            value_col: (sums * weights).sum(axis=1),
+            'whale_count': np.rint((counts * weights).sum(axis=1)).astype(np.int64),
+        })
+        return result[result['whale_count'] > 0].reset_index(drop=True)